@@ -0,0 +1,532 @@
+# benchmark.py - 性能基准测试（本地模拟站点）
+"""在本地启动模拟晋江站点（GBK编码的 search.php / onebook.php），测量爬取与下载性能
+
+用法：
+    python benchmark.py [--novels 500] [--chapters 200] [--chapter-size 3000] [--latency 0.02]
+                        [--error-rate 0] [--workers 4] [--parse-workers 0] [--stages crawl,download,startup,memory]
+                        [-o 结果.json] [--compare 上次结果.json]
+
+每个阶段在独立子进程中运行，峰值内存（RSS）互不影响；结果保存为JSON，便于对比不同版本。
+memory 阶段对比搜索结果的内存占用：旧的字典列表、NovelRecord 列表与列式 NovelList（tracemalloc 测量）。
+startup 阶段在全新的解释器中测量启动耗时：导入界面/命令行入口模块、读取设置文件的耗时，
+以及启动时已被导入的重量级模块（应在首次使用时才导入）。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tracemalloc
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+from typing import Dict, List, Optional
+
+SEARCH_PAGE_SIZE = 25
+STARTUP_REPEAT = 7
+STARTUP_MODULES = ("gui_main", "cli")
+# 启动时不应导入的模块（只在打开窗口、发出请求或启用解析进程池时才需要）
+HEAVY_MODULES = ("requests", "urllib3", "bs4", "lxml", "multiprocessing", "gui_crawl", "gui_download")
+BENCH_KEYWORD = "基准"
+BENCH_NOVEL_ID = "1"
+
+# 生成正文用的常用汉字
+_HANZI = ("的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说"
+          "产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点")
+
+
+class FakeSite:
+    """本地模拟站点：搜索页、目录页与章节页均为GBK编码，可配置延迟、错误率与章节长度"""
+
+    def __init__(self, novels: int = 500, chapters: int = 200, chapter_size: int = 3000,
+                 latency: float = 0.02, error_rate: float = 0.0, seed: int = 1):
+        self.novels = novels
+        self.chapters = chapters
+        self.chapter_size = chapter_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        """站点根地址"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeSite":
+        """在后台线程启动服务"""
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 关闭Nagle算法，避免长连接上的小响应出现约40ms的延迟确认等待
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                status, body = site.respond(self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=gbk")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        """停止服务"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def respond(self, path: str):
+        """生成响应 (状态码, 正文字节)"""
+        with self._random_lock:
+            self.requests += 1
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            return 503, b"busy"
+
+        parts = urllib.parse.urlsplit(path)
+        query = urllib.parse.parse_qs(parts.query)
+        if parts.path.endswith("search.php"):
+            return 200, self.search_page(int(query.get("p", ["1"])[0]))
+        if "chapterid" in query:
+            return 200, self.chapter_page(int(query["chapterid"][0]))
+        return 200, self.toc_page(query.get("novelid", [BENCH_NOVEL_ID])[0])
+
+    def search_page(self, page: int) -> bytes:
+        """搜索结果页"""
+        pages = max(1, -(-self.novels // SEARCH_PAGE_SIZE))
+        first = (page - 1) * SEARCH_PAGE_SIZE + 1
+        last = min(page * SEARCH_PAGE_SIZE, self.novels)
+        items = "".join(
+            f'<div class="info"><h3 class="title"><a href="onebook.php?novelid={i}" target="_blank">'
+            f'基准小说第{i}本</a></h3><div class="intro">简介简介简介{i}</div></div>'
+            for i in range(first, last + 1)
+        )
+        html = (f'<html><head><meta charset="gbk"><title>搜索</title></head><body>'
+                f'<div id="search_result">{items}</div><div class="page">共{pages}页</div></body></html>')
+        return html.encode("gbk")
+
+    def toc_page(self, novel_id: str) -> bytes:
+        """目录页"""
+        rows = "".join(
+            f'<tr itemprop="chapter"><td>{c}</td><td><a itemprop="url" '
+            f'href="http://www.jjwxc.net/onebook.php?novelid={novel_id}&chapterid={c}">第{c}章</a></td></tr>'
+            for c in range(1, self.chapters + 1)
+        )
+        return f'<html><body><table id="oneboolt">{rows}</table></body></html>'.encode("gbk")
+
+    @lru_cache(maxsize=4096)
+    def chapter_page(self, chapter_id: int) -> bytes:
+        """章节页（正文按章节号确定性生成）"""
+        if chapter_id > self.chapters:
+            return '<html><body><h2>章节不存在</h2></body></html>'.encode("gbk")
+        rnd = random.Random(chapter_id)
+        lines = []
+        remaining = self.chapter_size
+        while remaining > 0:
+            size = min(remaining, rnd.randint(40, 120))
+            lines.append("".join(rnd.choice(_HANZI) for _ in range(size)))
+            remaining -= size
+        body = "<br>\n".join(lines)
+        html = (f'<html><head><meta charset="gbk"></head><body><div class="noveltext"><h2>第{chapter_id}章 标题</h2>'
+                f'<div class="novelbody"><div style="font-size: 16px;">{body}</div></div></div></body></html>')
+        return html.encode("gbk")
+
+
+def _percentile(samples: List[float], percent: float) -> float:
+    """最近秩百分位数"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """当前进程的峰值常驻内存（MB），不支持的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _timed(obj, name: str, samples: List[float]) -> None:
+    """替换对象的方法，记录每次调用耗时（秒）"""
+    original = getattr(obj, name)
+    lock = threading.Lock()
+
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples.append(elapsed)
+
+    setattr(obj, name, wrapper)
+
+
+def run_stage(stage: str, site_url: str, options: Dict) -> Dict:
+    """在当前进程中运行一个阶段（crawl / download），返回测量结果"""
+    from config import ConfigManager
+    from crawler import NovelCrawler
+    from downloader import NovelDownloader
+    from utils import Utils
+
+    config = ConfigManager()
+    config.BASE_URL = f"{site_url}/search.php"
+    config.CHAPTER_URL = f"{site_url}/onebook.php"
+    config.set_save_path(tempfile.mkdtemp(prefix="novel-bench-"))
+    config.set_cache_options(options["cache"])
+    config.set_download_options(options["workers"], options["rate"])
+    config.set_rate_limits(config.rate_floor, max(options["rate"], config.rate_ceiling))
+    config.crawl_workers = options["workers"]
+    if options.get("parser"):
+        config.set_parser_backend(options["parser"])
+    if options.get("parse_workers"):
+        config.set_parse_workers(options["parse_workers"])
+
+    latencies: List[float] = []
+    _timed(config.http, "get", latencies)
+
+    started = time.perf_counter()
+    if stage == "crawl":
+        novels = NovelCrawler(config, Utils()).crawl_novels(BENCH_KEYWORD, 0, True, workers=options["workers"])
+        items = len(novels)
+        failures = 0
+    else:
+        summary = NovelDownloader(config, Utils()).download_novel_chapters(
+            BENCH_NOVEL_ID, "基准小说", 1, 0, workers=options["workers"]
+        )
+        items = summary["downloaded"]
+        failures = summary["failed"]
+    seconds = time.perf_counter() - started
+    config.set_parse_workers(0)
+
+    # 解析耗时取自运行指标（启用解析进程池时由子进程测得）
+    metrics = config.metrics.snapshot()
+    parse_timing = metrics["timings"].get("parse", {"count": 0, "total_s": 0.0})
+    http_stats = config.http.stats()
+    unit = "pages" if stage == "crawl" else "chapters"
+    parsed = parse_timing["count"]
+    return {
+        "seconds": round(seconds, 3),
+        "requests": len(latencies),
+        unit: parsed,
+        "items": items,
+        "failures": failures,
+        f"{unit}_per_second": round(parsed / seconds, 2) if seconds else 0.0,
+        "parse_ms_per_page": round(parse_timing["total_s"] / parsed * 1000, 3) if parsed else 0.0,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50) * 1000, 2),
+            "p99": round(_percentile(latencies, 99) * 1000, 2),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0
+        },
+        "connections": {"opened": http_stats["opened"], "reused": http_stats["reused"]},
+        "peak_rss_mb": _peak_rss_mb(),
+        "metrics": metrics
+    }
+
+
+_STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+from config import ConfigManager
+config = ConfigManager()
+loading = time.perf_counter()
+config.load_settings({settings!r})
+loaded = time.perf_counter()
+print(json.dumps({{"import": imported - started, "settings": loaded - loading,
+                  "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def _run_python(code: str) -> tuple:
+    """在全新的解释器中运行代码，返回（墙钟耗时, 标准输出）"""
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                               capture_output=True, text=True, check=True)
+    return time.perf_counter() - started, completed.stdout
+
+
+def run_startup(repeat: int = STARTUP_REPEAT) -> Dict:
+    """测量启动耗时（每项重复 repeat 次取中位数）"""
+    from config import ConfigManager
+
+    settings_dir = tempfile.mkdtemp(prefix="novel-bench-")
+    settings_path = ConfigManager().save_settings(os.path.join(settings_dir, "settings.json"))
+    interpreter = [_run_python("pass")[0] for _ in range(repeat)]
+    modules = {}
+    settings_samples: List[float] = []
+    for module in STARTUP_MODULES:
+        walls, imports, heavy = [], [], set()
+        for _ in range(repeat):
+            wall, output = _run_python(_STARTUP_SCRIPT.format(module=module, settings=settings_path,
+                                                              heavy=HEAVY_MODULES))
+            measured = json.loads(output)
+            walls.append(wall)
+            imports.append(measured["import"])
+            settings_samples.append(measured["settings"])
+            heavy.update(measured["heavy"])
+        modules[module] = {
+            "import_ms": round(_percentile(imports, 50) * 1000, 2),
+            "wall_ms": round(_percentile(walls, 50) * 1000, 2),
+            "heavy_modules": sorted(heavy)
+        }
+    return {
+        "interpreter_ms": round(_percentile(interpreter, 50) * 1000, 2),
+        "settings_load_ms": round(_percentile(settings_samples, 50) * 1000, 3),
+        "modules": modules
+    }
+
+
+def _measure(build) -> tuple:
+    """测量 build() 结果占用的内存（字节）与耗时（秒），返回（结果, 字节数, 秒）"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    value = build()
+    seconds = time.perf_counter() - started
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size, seconds
+
+
+def run_memory(count: int) -> Dict:
+    """对比 count 本小说（其中1/10重复，需去重）在三种表示下的内存占用、构建与按ID查找耗时
+
+    三种表示都保留按 novelid 查找的索引并借助它去重，测得的内存包含索引本身。
+    """
+    from config import ConfigManager
+    from novel_record import NovelList, NovelRecord
+
+    # 名称在测量前生成：三种表示都引用同一批名称字符串，只比较结构本身与链接、ID的开销
+    rng = random.Random(1)
+    ids = [rng.randrange(1, 10 ** 7) for _ in range(count)]
+    ids += ids[:count // 10]
+    names = {novel_id: "".join(rng.choice(_HANZI) for _ in range(8)) for novel_id in ids}
+    book_url = ConfigManager.CHAPTER_URL
+
+    def build_dicts():
+        index = {}
+        for novel_id in ids:
+            key = str(novel_id)
+            if key not in index:
+                index[key] = {"名称": names[novel_id], "链接": f"{book_url}?novelid={novel_id}", "novelid": key}
+        return list(index.values()), index
+
+    def build_records():
+        index = {}
+        for novel_id in ids:
+            if novel_id not in index:
+                index[novel_id] = NovelRecord(novel_id, names[novel_id])
+        return list(index.values()), index
+
+    def build_columns():
+        novels = NovelList()
+        for novel_id in ids:
+            novels.add(NovelRecord(novel_id, names[novel_id]))
+        return novels, novels
+
+    probes = ids[::97]
+    results = {}
+    for name, build, find in (
+            ("dicts", build_dicts, lambda index, novel_id: index.get(str(novel_id))),
+            ("records", build_records, lambda index, novel_id: index.get(novel_id)),
+            ("novel_list", build_columns, lambda index, novel_id: index.find(novel_id))):
+        (novels, index), size, seconds = _measure(build)
+        started = time.perf_counter()
+        for novel_id in probes:
+            find(index, novel_id)
+        results[name] = {
+            "novels": len(novels),
+            "bytes": size,
+            "bytes_per_novel": round(size / len(novels), 1),
+            "build_ms": round(seconds * 1000, 1),
+            "lookup_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+        del novels, index
+    for name in ("records", "novel_list"):
+        results[name]["saving"] = round(1 - results[name]["bytes"] / results["dicts"]["bytes"], 3)
+    return results
+
+
+def run_benchmark(options: Dict, stages: List[str]) -> Dict:
+    """启动模拟站点并依次在独立子进程中运行各阶段"""
+    site = FakeSite(options["novels"], options["chapters"], options["chapter_size"],
+                    options["latency"], options["error_rate"]).start()
+    results = {}
+    try:
+        for stage in stages:
+            if stage == "startup":
+                results[stage] = run_startup()
+                continue
+            if stage == "memory":
+                results[stage] = run_memory(options["memory_novels"])
+                continue
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                results[stage] = pool.submit(run_stage, stage, site.url, options).result()
+    finally:
+        site.stop()
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": options,
+        "server": {"requests": site.requests, "injected_errors": site.errors},
+        "stages": results
+    }
+
+
+# 对比时关注的指标：(阶段, 指标路径, 数值越大越好)
+COMPARE_METRICS = [
+    ("crawl", "pages_per_second", True),
+    ("crawl", "parse_ms_per_page", False),
+    ("crawl", "latency_ms.p50", False),
+    ("crawl", "latency_ms.p99", False),
+    ("crawl", "peak_rss_mb", False),
+    ("download", "chapters_per_second", True),
+    ("download", "parse_ms_per_page", False),
+    ("download", "latency_ms.p50", False),
+    ("download", "latency_ms.p99", False),
+    ("download", "peak_rss_mb", False),
+    ("startup", "modules.gui_main.import_ms", False),
+    ("startup", "modules.cli.import_ms", False),
+    ("startup", "settings_load_ms", False),
+    ("memory", "novel_list.bytes_per_novel", False),
+    ("memory", "novel_list.build_ms", False),
+]
+
+
+def _metric(result: Dict, stage: str, path: str) -> Optional[float]:
+    """按路径取指标值"""
+    value = result.get("stages", {}).get(stage)
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def compare_results(old: Dict, new: Dict) -> List[str]:
+    """对比两次结果，返回可读的对比行"""
+    lines = []
+    for stage, path, higher_is_better in COMPARE_METRICS:
+        before, after = _metric(old, stage, path), _metric(new, stage, path)
+        if not before or after is None:
+            continue
+        change = (after - before) / before * 100
+        better = change > 0 if higher_is_better else change < 0
+        mark = "✅" if better else ("⚠️" if abs(change) >= 5 else "")
+        lines.append(f"{stage}.{path}: {before} -> {after}（{change:+.1f}%）{mark}")
+    return lines
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(prog="benchmark.py", description="爬取与下载性能基准测试（本地模拟站点）")
+    parser.add_argument("--novels", type=int, default=500, help="搜索结果小说数（每页25本）")
+    parser.add_argument("--chapters", type=int, default=200, help="下载阶段的章节数")
+    parser.add_argument("--chapter-size", type=int, default=3000, help="每章正文字数")
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟站点每个请求的延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回503的概率（0-1）")
+    parser.add_argument("--workers", type=int, default=4, help="并发线程数")
+    parser.add_argument("--rate", type=float, default=200.0, help="每主机每秒请求数（初始值）")
+    parser.add_argument("--parser", choices=("lxml", "strainer", "html.parser"), help="解析后端")
+    parser.add_argument("--parse-workers", type=int, default=0, help="解析进程数（0：在下载线程中解析）")
+    parser.add_argument("--cache", action="store_true", help="启用响应缓存（默认关闭以测量网络路径）")
+    parser.add_argument("--stages", default="crawl,download,startup,memory",
+                        help="要运行的阶段（crawl / download / startup / memory），逗号分隔")
+    parser.add_argument("--memory-novels", type=int, default=200000, help="memory 阶段的小说数")
+    parser.add_argument("-o", "--output", help="结果JSON文件（默认 benchmark-时间戳.json）")
+    parser.add_argument("--compare", help="与之前的结果JSON对比")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """基准测试主函数"""
+    args = build_parser().parse_args(argv)
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in ("crawl", "download", "startup", "memory")]
+    if unknown:
+        print(f"❌ 未知的阶段：{'、'.join(unknown)}", file=sys.stderr)
+        return 2
+
+    options = {
+        "novels": args.novels,
+        "chapters": args.chapters,
+        "chapter_size": args.chapter_size,
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "workers": args.workers,
+        "rate": args.rate,
+        "parser": args.parser or "",
+        "parse_workers": args.parse_workers,
+        "cache": args.cache,
+        "memory_novels": args.memory_novels
+    }
+    result = run_benchmark(options, stages)
+
+    output = args.output or f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    for stage, data in result["stages"].items():
+        if stage == "startup":
+            for module, entry in data["modules"].items():
+                heavy = "、".join(entry["heavy_modules"]) or "无"
+                print(f"[startup] 导入{module} {entry['import_ms']}ms（进程总耗时{entry['wall_ms']}ms，"
+                      f"空解释器{data['interpreter_ms']}ms），启动时已导入的重量级模块：{heavy}")
+            print(f"[startup] 读取设置文件 {data['settings_load_ms']}ms")
+            continue
+        if stage == "memory":
+            for name, entry in data.items():
+                saving = f"，比字典节省{entry['saving'] * 100:.1f}%" if "saving" in entry else ""
+                print(f"[memory] {name}：{entry['novels']}本，每本{entry['bytes_per_novel']}字节{saving}，"
+                      f"构建{entry['build_ms']}ms，查找{entry['lookup_ms']}ms")
+            continue
+        rate_key = "pages_per_second" if stage == "crawl" else "chapters_per_second"
+        print(f"[{stage}] {data[rate_key]}/秒，解析{data['parse_ms_per_page']}ms/页，"
+              f"延迟p50 {data['latency_ms']['p50']}ms / p99 {data['latency_ms']['p99']}ms，"
+              f"峰值内存{data['peak_rss_mb']}MB，失败{data['failures']}")
+    print(f"结果已保存：{os.path.abspath(output)}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        for line in compare_results(previous, result):
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
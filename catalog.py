@@ -0,0 +1,152 @@
+# catalog.py - 本地小说目录
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from novel_record import NovelList, NovelRecord
+
+
+class NovelCatalog:
+    """本地小说目录（SQLite）
+
+    以 novelid 为键记录所有爬取过的小说（名称、链接、首次/最近出现的关键词与时间），
+    并记录每个关键词的搜索结果及排名；书名建立全文索引（trigram 分词，支持中文子串查询），
+    SQLite 不支持 FTS5 trigram 时退回 LIKE 查询。
+    """
+
+    DB_NAME = "catalog.db"
+
+    def __init__(self, catalog_dir: str):
+        os.makedirs(catalog_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(catalog_dir, self.DB_NAME), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS novels ("
+            " novelid TEXT PRIMARY KEY, name TEXT, link TEXT,"
+            " first_keyword TEXT, last_keyword TEXT, first_seen REAL, last_seen REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS keyword_results ("
+            " keyword TEXT, novelid TEXT, rank INTEGER, seen_at REAL, PRIMARY KEY (keyword, novelid))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS keywords (keyword TEXT PRIMARY KEY, refreshed_at REAL, pages INTEGER)"
+        )
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS novels_fts USING fts5(novelid UNINDEXED, name, tokenize='trigram')"
+            )
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        self._conn.commit()
+
+    def upsert(self, novels: Iterable[NovelRecord], keyword: str, start_rank: int = 0) -> int:
+        """记录一批搜索结果，返回其中新入库的小说数"""
+        now = time.time()
+        added = 0
+        with self._lock:
+            for rank, novel in enumerate(novels, start_rank):
+                novel_id = str(novel.novelid)
+                row = self._conn.execute("SELECT name FROM novels WHERE novelid = ?", (novel_id,)).fetchone()
+                if row is None:
+                    added += 1
+                    self._conn.execute(
+                        "INSERT INTO novels (novelid, name, link, first_keyword, last_keyword, first_seen, last_seen)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (novel_id, novel.name, novel.link, keyword, keyword, now, now)
+                    )
+                else:
+                    self._conn.execute(
+                        "UPDATE novels SET name = ?, link = ?, last_keyword = ?, last_seen = ? WHERE novelid = ?",
+                        (novel.name, novel.link, keyword, now, novel_id)
+                    )
+                if self.fts and (row is None or row[0] != novel.name):
+                    self._conn.execute("DELETE FROM novels_fts WHERE novelid = ?", (novel_id,))
+                    self._conn.execute("INSERT INTO novels_fts (novelid, name) VALUES (?, ?)",
+                                       (novel_id, novel.name))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO keyword_results (keyword, novelid, rank, seen_at) VALUES (?, ?, ?, ?)",
+                    (keyword, novel_id, rank, now)
+                )
+            self._conn.commit()
+        return added
+
+    def known_ids(self, keyword: str, novel_ids: Iterable[str]) -> Set[str]:
+        """给定小说中已在该关键词结果里出现过的ID"""
+        novel_ids = list(novel_ids)
+        if not novel_ids:
+            return set()
+        placeholders = ",".join("?" * len(novel_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT novelid FROM keyword_results WHERE keyword = ? AND novelid IN ({placeholders})",
+                [keyword] + novel_ids
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def mark_refreshed(self, keyword: str, pages: int) -> None:
+        """记录关键词的刷新时间与本次获取的页数"""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO keywords (keyword, refreshed_at, pages) VALUES (?, ?, ?)",
+                               (keyword, time.time(), pages))
+            self._conn.commit()
+
+    def keyword_info(self, keyword: str) -> Optional[Dict]:
+        """关键词的刷新记录（从未爬取时为None）"""
+        with self._lock:
+            row = self._conn.execute("SELECT refreshed_at, pages FROM keywords WHERE keyword = ?",
+                                     (keyword,)).fetchone()
+        if row is None:
+            return None
+        return {"keyword": keyword, "refreshed_at": row[0], "pages": row[1]}
+
+    def search(self, keyword: str, limit: Optional[int] = None) -> NovelList:
+        """本地查询：先按排名返回该关键词爬取过的结果，再追加书名包含关键词的其他小说"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT n.novelid, n.name, n.link FROM keyword_results k JOIN novels n ON n.novelid = k.novelid"
+                " WHERE k.keyword = ? ORDER BY k.rank, k.seen_at DESC",
+                (keyword,)
+            ).fetchall()
+            rows += self._match_titles(keyword)
+
+        result = NovelList()
+        for novel_id, name, _ in rows:
+            if novel_id.isdigit():
+                result.add(NovelRecord(int(novel_id), name))
+            if limit and len(result) >= limit:
+                break
+        return result
+
+    def _match_titles(self, keyword: str) -> List:
+        """书名包含关键词的小说（需持有锁）；trigram 索引只能查询3个字及以上，更短时用 LIKE"""
+        if self.fts and len(keyword) >= 3:
+            phrase = '"' + keyword.replace('"', '""') + '"'
+            return self._conn.execute(
+                "SELECT n.novelid, n.name, n.link FROM novels_fts f JOIN novels n ON n.novelid = f.novelid"
+                " WHERE novels_fts MATCH ? ORDER BY n.last_seen DESC",
+                (phrase,)
+            ).fetchall()
+
+        pattern = "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return self._conn.execute(
+            "SELECT novelid, name, link FROM novels WHERE name LIKE ? ESCAPE '\\' ORDER BY last_seen DESC",
+            (pattern,)
+        ).fetchall()
+
+    def stats(self) -> Dict:
+        """目录统计"""
+        with self._lock:
+            novels = self._conn.execute("SELECT COUNT(*) FROM novels").fetchone()[0]
+            keywords = self._conn.execute("SELECT COUNT(*) FROM keywords").fetchone()[0]
+        return {"novels": novels, "keywords": keywords, "fts": self.fts}
+
+    def close(self) -> None:
+        """关闭数据库"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,373 @@
+# chapter_store.py - 章节存储后端
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+_CHAPTER_FILE_RE = re.compile(r"^(\d+)_.*\.txt$")
+_TEMP_FILE_RE = re.compile(r"^\.\d+_.*\.txt\.tmp$")
+
+
+def _allocated_size(path: str) -> int:
+    """文件实际占用的磁盘空间（按块计算，不支持时取文件大小）"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return 0
+    blocks = getattr(stat, "st_blocks", None)
+    return blocks * 512 if blocks is not None else stat.st_size
+
+
+def _fsync_dir(path: str) -> None:
+    """同步目录项（使重命名落盘）；不支持的平台忽略"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class ChapterStore:
+    """章节存储接口
+
+    write 返回 (位置, 原始字节)，供下载清单记录大小和哈希；write_batch 一次写入多章，整批只同步一次磁盘；
+    read 按章节号随机读取 (标题, 正文)。两种实现的读写结果一致，可互相转换。
+    fsync 为True时写入后同步到磁盘（断电后已返回的章节不丢失）。
+    """
+
+    KIND = ""
+
+    def __init__(self, save_dir: str, fsync: bool = False):
+        self.save_dir = save_dir
+        self.fsync = fsync
+        self.counters = {"written": 0, "write_bytes": 0, "write_seconds": 0.0,
+                         "read": 0, "read_bytes": 0, "read_seconds": 0.0}
+        self._lock = threading.Lock()
+
+    def write(self, chapter_id: int, title: str, content: str) -> Tuple[str, bytes]:
+        """写入章节，返回 (位置, 原始字节)"""
+        return self.write_batch([(chapter_id, title, content)])[0]
+
+    def write_batch(self, chapters: List[Tuple[int, str, str]]) -> List[Tuple[str, bytes]]:
+        """批量写入 [(章节号, 标题, 正文)]，返回各章 (位置, 原始字节)；整批成功或整批失败"""
+        if not chapters:
+            return []
+        started = time.perf_counter()
+        results = self._write_batch(chapters)
+        self._count("written", "write_bytes", "write_seconds", sum(len(data) for _, data in results), started,
+                    len(results))
+        return results
+
+    def read(self, chapter_id: int) -> Optional[Tuple[str, str]]:
+        """读取章节，返回 (标题, 正文)，不存在时返回None"""
+        started = time.perf_counter()
+        data = self._read(chapter_id)
+        if data is None:
+            return None
+        self._count("read", "read_bytes", "read_seconds", len(data), started)
+        title, _, content = data.decode("utf-8").replace("\r\n", "\n").partition("\n\n")
+        return title, content
+
+    def _count(self, name: str, bytes_name: str, seconds_name: str, size: int, started: float,
+               count: int = 1) -> None:
+        """累加读写计数与耗时"""
+        with self._lock:
+            self.counters[name] += count
+            self.counters[bytes_name] += size
+            self.counters[seconds_name] += time.perf_counter() - started
+
+    def verify(self, chapter_id: int, entry: Dict) -> bool:
+        """清单记录对应的章节是否完整存在"""
+        raise NotImplementedError
+
+    def chapter_ids(self) -> List[int]:
+        """已存储的章节号（升序）"""
+        raise NotImplementedError
+
+    def disk_usage(self) -> int:
+        """占用磁盘字节数（按块计算）"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        """存储统计：章节数、磁盘占用与读写吞吐"""
+        with self._lock:
+            counters = dict(self.counters)
+        result = {"kind": self.KIND, "chapters": len(self.chapter_ids()), "disk_bytes": self.disk_usage()}
+        result.update(counters)
+        for name, seconds in (("written", "write_seconds"), ("read", "read_seconds")):
+            result[f"{name}_per_second"] = round(counters[name] / counters[seconds], 1) if counters[seconds] else 0.0
+        return result
+
+    def close(self) -> None:
+        """关闭存储"""
+
+    def _write_batch(self, chapters: List[Tuple[int, str, str]]) -> List[Tuple[str, bytes]]:
+        raise NotImplementedError
+
+    def _read(self, chapter_id: int) -> Optional[bytes]:
+        raise NotImplementedError
+
+
+class FileChapterStore(ChapterStore):
+    """每章一个文本文件：<章节号>_<标题>.txt
+
+    先写入同目录的临时文件 .<文件名>.tmp，再用 os.replace 原子替换，写入中途崩溃不会留下截断的章节文件；
+    批量写入时先写完（并同步）整批临时文件，再统一改名，最后同步一次目录。
+    """
+
+    KIND = "files"
+    STALE_TEMP_SECONDS = 600
+
+    def __init__(self, save_dir: str, fsync: bool = False):
+        super().__init__(save_dir, fsync)
+        os.makedirs(save_dir, exist_ok=True)
+        self._files: Optional[Dict[int, str]] = None
+
+    def _index(self) -> Dict[int, str]:
+        """章节号到文件名的映射（首次使用时扫描目录，顺带清理上次中断遗留的临时文件）"""
+        if self._files is None:
+            files = {}
+            with os.scandir(self.save_dir) as entries:
+                for entry in entries:
+                    match = _CHAPTER_FILE_RE.match(entry.name)
+                    if match and entry.is_file():
+                        files[int(match.group(1))] = entry.name
+                    elif _TEMP_FILE_RE.match(entry.name):
+                        try:
+                            # 较新的临时文件可能正由其他下载进程写入，只清理超过时限的
+                            if time.time() - entry.stat().st_mtime > self.STALE_TEMP_SECONDS:
+                                os.remove(entry.path)
+                        except OSError:
+                            pass
+            self._files = files
+        return self._files
+
+    def _write_batch(self, chapters: List[Tuple[int, str, str]]) -> List[Tuple[str, bytes]]:
+        staged = []
+        try:
+            for chapter_id, title, content in chapters:
+                safe_title = title.replace('/', '_').replace('\\', '_')
+                file_name = f"{chapter_id}_{safe_title}.txt"
+
+                # 按文本模式的换行规则编码，保证清单中的大小和哈希与磁盘文件一致
+                data = f"{title}\n\n{content}".replace("\n", os.linesep).encode("utf-8")
+                temp_path = os.path.join(self.save_dir, f".{file_name}.tmp")
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+                    if self.fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                staged.append((chapter_id, file_name, temp_path, data))
+
+            for _, file_name, temp_path, _ in staged:
+                os.replace(temp_path, os.path.join(self.save_dir, file_name))
+        except BaseException:
+            for _, _, temp_path, _ in staged:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            raise
+
+        if self.fsync:
+            _fsync_dir(self.save_dir)
+        with self._lock:
+            if self._files is not None:
+                for chapter_id, file_name, _, _ in staged:
+                    self._files[chapter_id] = file_name
+        return [(file_name, data) for _, file_name, _, data in staged]
+
+    def _read(self, chapter_id: int) -> Optional[bytes]:
+        with self._lock:
+            file_name = self._index().get(chapter_id)
+        if file_name is None:
+            return None
+        try:
+            with open(os.path.join(self.save_dir, file_name), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def verify(self, chapter_id: int, entry: Dict) -> bool:
+        try:
+            return os.path.getsize(os.path.join(self.save_dir, entry["file"])) == entry["size"]
+        except (OSError, KeyError):
+            return False
+
+    def chapter_ids(self) -> List[int]:
+        with self._lock:
+            return sorted(self._index())
+
+    def disk_usage(self) -> int:
+        with self._lock:
+            names = list(self._index().values())
+        return sum(_allocated_size(os.path.join(self.save_dir, name)) for name in names)
+
+    def remove_all(self) -> None:
+        """删除全部章节文件"""
+        with self._lock:
+            names = list(self._index().values())
+            self._files = {}
+        for name in names:
+            try:
+                os.remove(os.path.join(self.save_dir, name))
+            except OSError:
+                pass
+
+
+class PackedChapterStore(ChapterStore):
+    """单文件章节库（SQLite）
+
+    每本小说一个 chapters.db，章节正文逐章 zlib 压缩，按章节号主键随机读取。
+    """
+
+    KIND = "packed"
+    DB_NAME = "chapters.db"
+    COMPRESS_LEVEL = 6
+
+    def __init__(self, save_dir: str, fsync: bool = False):
+        super().__init__(save_dir, fsync)
+        os.makedirs(save_dir, exist_ok=True)
+        self.path = os.path.join(save_dir, self.DB_NAME)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # FULL：每次提交同步WAL；批量写入时一批一次提交
+        self._conn.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chapters ("
+            " chapter_id INTEGER PRIMARY KEY, title TEXT, body BLOB, size INTEGER, stored_at REAL)"
+        )
+        self._conn.commit()
+
+    def _write_batch(self, chapters: List[Tuple[int, str, str]]) -> List[Tuple[str, bytes]]:
+        now = time.time()
+        rows = []
+        results = []
+        for chapter_id, title, content in chapters:
+            data = f"{title}\n\n{content}".encode("utf-8")
+            rows.append((chapter_id, title, zlib.compress(data, self.COMPRESS_LEVEL), len(data), now))
+            results.append((self.DB_NAME, data))
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO chapters (chapter_id, title, body, size, stored_at) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+        return results
+
+    def _read(self, chapter_id: int) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM chapters WHERE chapter_id = ?", (chapter_id,)).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0])
+
+    def verify(self, chapter_id: int, entry: Dict) -> bool:
+        if entry.get("file") != self.DB_NAME:
+            return False
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM chapters WHERE chapter_id = ?", (chapter_id,)).fetchone()
+        return row is not None and row[0] == entry.get("size")
+
+    def chapter_ids(self) -> List[int]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT chapter_id FROM chapters ORDER BY chapter_id")]
+
+    def disk_usage(self) -> int:
+        return sum(_allocated_size(self.path + suffix) for suffix in ("", "-wal", "-shm"))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.close()
+            self._conn = None
+
+
+STORE_KINDS = {
+    FileChapterStore.KIND: FileChapterStore,
+    PackedChapterStore.KIND: PackedChapterStore
+}
+
+
+def open_store(kind: str, save_dir: str, fsync: bool = False) -> ChapterStore:
+    """按类型打开章节存储（files / packed）"""
+    if kind not in STORE_KINDS:
+        raise ValueError(f"未知的存储类型：{kind}（可选：{'、'.join(STORE_KINDS)}）")
+    return STORE_KINDS[kind](save_dir, fsync)
+
+
+def _store_exists(save_dir: str, kind: str) -> bool:
+    """目录中是否已有该类型的章节存储（只检查，不创建）"""
+    if kind == PackedChapterStore.KIND:
+        return os.path.exists(os.path.join(save_dir, PackedChapterStore.DB_NAME))
+    return os.path.isdir(save_dir) and any(_CHAPTER_FILE_RE.match(name) for name in os.listdir(save_dir))
+
+
+def detect_store_kind(save_dir: str) -> str:
+    """根据目录内容判断现有存储类型（无章节时返回空字符串）"""
+    for kind in (PackedChapterStore.KIND, FileChapterStore.KIND):
+        if _store_exists(save_dir, kind):
+            return kind
+    return ""
+
+
+def convert_store(save_dir: str, target_kind: str, remove_source: bool = False) -> Dict:
+    """把小说目录中的章节转换为另一种存储，并更新下载清单
+
+    返回转换统计：章节数、耗时、源/目标磁盘占用及读写吞吐。
+    """
+    from manifest import ChapterManifest
+
+    source_kind = next(kind for kind in STORE_KINDS if kind != target_kind) if target_kind in STORE_KINDS else ""
+    if not source_kind:
+        raise ValueError(f"未知的存储类型：{target_kind}（可选：{'、'.join(STORE_KINDS)}）")
+    # 打开压缩章节库会新建空库，源存储不存在时直接报错
+    if not _store_exists(save_dir, source_kind):
+        raise ValueError(f"{save_dir} 中没有可转换的 {source_kind} 章节存储")
+
+    manifest = ChapterManifest(save_dir)
+    source = open_store(source_kind, save_dir)
+    target = open_store(target_kind, save_dir)
+    started = time.perf_counter()
+    try:
+        for chapter_id in source.chapter_ids():
+            chapter = source.read(chapter_id)
+            if chapter is None:
+                continue
+            title, content = chapter
+            entry = manifest.get(chapter_id)
+            if entry and entry.get("title"):
+                title = entry["title"]
+            location, data = target.write(chapter_id, title, content)
+            manifest.record_success(chapter_id, title, location, data)
+        manifest.save()
+
+        result = {
+            "source": source.stats(),
+            "target": target.stats(),
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+        if remove_source:
+            if isinstance(source, FileChapterStore):
+                source.remove_all()
+            else:
+                source.close()
+                for suffix in ("", "-wal", "-shm"):
+                    try:
+                        os.remove(source.path + suffix)
+                    except OSError:
+                        pass
+        return result
+    finally:
+        source.close()
+        target.close()
@@ -0,0 +1,137 @@
+# chapter_writer.py - 章节写入阶段（有界队列 + 后台批量写入）
+import queue
+import threading
+import time
+from typing import Dict, List
+
+from chapter_store import ChapterStore
+
+
+class ChapterWriter:
+    """章节写入阶段（每本小说一个写入线程）
+
+    下载端 put() 把解析好的章节放入有界队列后立即返回，队列满时阻塞（背压），磁盘延迟不再拖慢请求；
+    写入线程每次取出队列中已有的章节（最多 batch_size 章）批量写入存储，一批只同步一次磁盘，
+    写入成功后才记入下载清单，因此清单中的章节都已完整落盘。
+    写入失败的章节（含原结果字典与 error）由 take_errors() 取回，交给下载端重试。
+    """
+
+    def __init__(self, store: ChapterStore, manifest=None, metrics=None,
+                 queue_size: int = 64, batch_size: int = 32):
+        self.store = store
+        self.manifest = manifest
+        self.metrics = metrics
+        self.batch_size = max(1, int(batch_size))
+        self.written = 0
+        self.batches = 0
+        self.write_seconds = 0.0
+        self.peak_depth = 0
+        self._queue: queue.Queue = queue.Queue(max(1, int(queue_size)))
+        self._errors: List[Dict] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="chapter-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, result: Dict) -> None:
+        """提交一个解析好的章节（{"chapter_id", "title", "content", ...}），队列满时阻塞"""
+        self._queue.put((result, time.perf_counter()))
+        depth = self._queue.qsize()
+        if depth > self.peak_depth:
+            self.peak_depth = depth
+        if self.metrics is not None:
+            self.metrics.adjust("write_queue_depth", 1)
+
+    def flush(self) -> None:
+        """等待已提交的章节全部写完"""
+        self._queue.join()
+
+    def close(self) -> None:
+        """写完剩余章节后停止写入线程"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def take_errors(self) -> List[Dict]:
+        """取回写入失败的章节"""
+        with self._lock:
+            errors, self._errors = self._errors, []
+        return errors
+
+    def stats(self) -> Dict:
+        """写入统计：章节数、批数、平均每批耗时与队列峰值"""
+        return {
+            "written": self.written,
+            "batches": self.batches,
+            "batch_ms": round(self.write_seconds / self.batches * 1000, 2) if self.batches else 0.0,
+            "peak_depth": self.peak_depth
+        }
+
+    def _run(self) -> None:
+        """写入线程：阻塞等待第一章，再顺带取出已排队的章节组成一批"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                self._write(batch)
+            except Exception as e:
+                # 兜底：任何一批出错都不能让写入线程退出，否则 flush()/put() 会永久阻塞
+                self._fail([result for result, _ in batch], e)
+            finally:
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _fail(self, results: List[Dict], error: Exception) -> None:
+        """记录写入失败的章节（可重试）"""
+        with self._lock:
+            for result in results:
+                self._errors.append(dict(result, ok=False, error=f"写入失败：{str(error)}", retryable=True))
+        if self.metrics is not None:
+            self.metrics.add("write_failures", len(results))
+
+    def _write(self, batch: List) -> None:
+        """写入一批章节并记入清单"""
+        started = time.perf_counter()
+        try:
+            stored = self.store.write_batch([(result["chapter_id"], result["title"], result["content"])
+                                             for result, _ in batch])
+        except Exception as e:
+            self._fail([result for result, _ in batch], e)
+        else:
+            finished = time.perf_counter()
+            for (result, queued_at), (location, data) in zip(batch, stored):
+                # 清单保存失败（如磁盘已满）时该章按写入失败处理，由下载端重试
+                try:
+                    if self.manifest is not None:
+                        self.manifest.record_success(result["chapter_id"], result["title"], location, data)
+                    if self.metrics is not None:
+                        self.metrics.observe("write_latency", finished - queued_at)
+                except Exception as e:
+                    self._fail([result], e)
+                else:
+                    self.written += 1
+        finally:
+            elapsed = time.perf_counter() - started
+            self.batches += 1
+            self.write_seconds += elapsed
+            if self.metrics is not None:
+                self.metrics.observe("write", elapsed)
+                self.metrics.adjust("write_queue_depth", -len(batch))
@@ -0,0 +1,474 @@
+# cli.py - 命令行入口（无图形界面）
+"""无界面的命令行入口，不导入任何 tkinter / GUI 模块
+
+用法：
+    python cli.py crawl 关键词 [--max 50] [--until-fail] [--local | --refresh [页数]] [--json | --jsonl] [-o 结果.json]
+    python cli.py download 小说ID [--name 书名] [--start 1] [--end 0] [--resume] [--json | --jsonl]
+    python cli.py batch (--keyword 关键词 | --input 结果.json) [--jobs 3] [--resume] [--json | --jsonl]
+    python cli.py convert 小说目录 --to packed [--remove-source] [--json]
+    python cli.py export 小说目录 [--format txt|epub] [--full] [--json]
+    python cli.py follow (add 小说ID --name 书名 | remove 小说ID | list | poll | watch) [--json]
+    python cli.py queue (add 小说ID --name 书名 | add --input 结果.json | remove 小说ID | status | retry | work) [--json]
+
+download / batch 加 --export txt|epub 时，每本下载完成后导出整本（只追加新章节）。
+crawl --local 只查询本地小说目录（不发请求）；--refresh 只重新请求前几页，遇到已知小说即停止。
+queue 为保存路径下多进程共享的下载队列：在多个终端（或进程管理器）中各运行一个 queue work，
+它们从同一队列领取章节工作项；进程崩溃后其租约过期，工作项由其他进程接手；queue status 汇总全部进程的进度。
+follow poll 检查一次已到期的关注小说并下载新章节，follow watch 持续轮询直到中断。
+--jsonl 时每发生一个事件（爬完一页、下载完一章）立即输出一行JSON；batch --keyword 边爬取边下载。
+启动时先读取设置文件（与图形界面共用，见 ConfigManager.settings_file），命令行参数优先。
+
+退出码：0 成功；1 无结果或有下载失败；2 参数错误；130 被中断。
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from config import ConfigManager
+from chapter_store import STORE_KINDS, convert_store
+from crawler import NovelCrawler
+from exporter import BookExporter
+from download_queue import DownloadScheduler
+from job_control import BackgroundJob
+from novel_record import NovelRecord, to_json
+from subscriptions import SubscriptionWatcher
+from work_queue import QueueWorker
+from utils import Utils
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+
+def _stderr_logger(quiet: bool):
+    """日志输出到标准错误（quiet 时不输出）"""
+    if quiet:
+        return lambda message: None
+    return lambda message: print(message, file=sys.stderr, flush=True)
+
+
+def _emit(result, args: argparse.Namespace) -> None:
+    """输出结果：--json 时输出JSON，--jsonl 时输出 done 事件行，否则由调用方输出简要文本"""
+    if getattr(args, "output", None):
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2, default=to_json)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2, default=to_json))
+    elif getattr(args, "jsonl", False):
+        print(json.dumps({"event": "done", "result": result}, ensure_ascii=False, default=to_json), flush=True)
+
+
+def _event_printer(args: argparse.Namespace):
+    """--jsonl 时返回逐行输出事件的回调（线程安全），否则返回None"""
+    if not getattr(args, "jsonl", False):
+        return None
+    lock = threading.Lock()
+
+    def emit(event: Dict) -> None:
+        with lock:
+            print(json.dumps(event, ensure_ascii=False, default=to_json), flush=True)
+    return emit
+
+
+def _build_config(args: argparse.Namespace) -> ConfigManager:
+    """根据命令行参数创建配置"""
+    config = ConfigManager()
+    config.load_settings()
+    if args.save_path:
+        config.set_save_path(args.save_path)
+    config.set_download_options(args.workers or config.download_workers,
+                                args.rate or config.host_rate)
+    if args.workers:
+        config.crawl_workers = args.workers
+    if args.no_cache:
+        config.set_cache_options(False)
+    if args.storage:
+        config.set_storage_backend(args.storage)
+    if args.parse_workers:
+        config.set_parse_workers(args.parse_workers)
+    if args.no_fsync:
+        config.set_write_options(False)
+    if getattr(args, "attempts", None):
+        config.set_retry_options(args.attempts)
+    args.config = config
+    return config
+
+
+def _novel(novel_id: str, name: Optional[str] = None) -> NovelRecord:
+    """由命令行给出的小说ID（及名称）创建小说记录"""
+    novel_id = novel_id.strip()
+    if not novel_id.isdigit():
+        raise ValueError(f"小说ID必须是数字：{novel_id}")
+    return NovelRecord(int(novel_id), name or novel_id)
+
+
+def _load_novels(path: str) -> List[NovelRecord]:
+    """读取小说列表：crawl --json 的输出，或每行一个小说ID的文本文件（格式不符时抛出 ValueError）"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    # 只有一个小说ID的文本文件也能按JSON解析为数字
+    if data is None or isinstance(data, int):
+        return [_novel(line) for line in text.splitlines() if line.strip()]
+
+    if isinstance(data, dict):
+        data = data.get("novels", [])
+    if not isinstance(data, list):
+        raise ValueError(f"{path} 不是小说列表：应为 crawl --json 的输出或每行一个小说ID")
+    novels = []
+    for i, item in enumerate(data, 1):
+        novel = NovelRecord.from_dict(item) if isinstance(item, dict) else None
+        if novel is None:
+            raise ValueError(f"{path} 第{i}项不是有效的小说（需要包含数字 novelid 或小说链接）：{item!r}")
+        novels.append(novel)
+    return novels
+
+
+def cmd_crawl(args: argparse.Namespace) -> int:
+    """crawl 子命令"""
+    config = _build_config(args)
+    utils = Utils()
+    crawler = NovelCrawler(config, utils)
+    printer = _event_printer(args)
+    if args.local:
+        novels = crawler.search_catalog(args.keyword, None if args.until_fail else args.max)
+    elif args.refresh:
+        novels = crawler.refresh_keyword(args.keyword, args.refresh, _stderr_logger(args.quiet))
+    else:
+        novels = crawler.crawl_novels(args.keyword, args.max, args.until_fail, _stderr_logger(args.quiet),
+                                      progress=printer)
+
+    _emit({"keyword": args.keyword, "count": len(novels), "novels": novels}, args)
+    if not args.json and not printer:
+        for i, novel in enumerate(novels, 1):
+            print(f"{i}\t{novel.novelid}\t{novel.name}")
+    return EXIT_OK if novels else EXIT_FAILED
+
+
+def _crawled_novels(config: ConfigManager, args: argparse.Namespace) -> Iterator[NovelRecord]:
+    """边爬取边产出小说，供下载队列流水线消费"""
+    crawler = NovelCrawler(config, Utils())
+    printer = _event_printer(args)
+    for event in crawler.iter_crawl(args.keyword, args.max, args.until_fail, _stderr_logger(args.quiet)):
+        if event["event"] == "page":
+            if printer:
+                printer(event)
+            yield from event["items"]
+
+
+def _download_all(config: ConfigManager, novels: Iterable[NovelRecord], args: argparse.Namespace) -> List[Dict]:
+    """通过下载队列下载小说（可边产出边提交），返回各本的下载汇总（与输入顺序一致）"""
+    scheduler = DownloadScheduler(config, Utils(), max_jobs=getattr(args, "jobs", None),
+                                  log_widget=_stderr_logger(args.quiet), progress=_event_printer(args))
+    jobs = []
+    try:
+        for novel in novels:
+            jobs.append(scheduler.submit(novel, args.start, args.end, resume=args.resume,
+                                         export_format=args.export or ""))
+        scheduler.wait()
+    except KeyboardInterrupt:
+        # 优雅退出：等待运行中的任务写完当前章节并保存清单（再次中断则立即退出）
+        print("正在停止，等待当前章节写入完成……", file=sys.stderr, flush=True)
+        scheduler.shutdown()
+        raise
+
+    summaries = []
+    for job in jobs:
+        if job.summary is not None:
+            summary = dict(job.summary)
+            summary["ok"] = summary["downloaded"] > 0 or summary["skipped"] > 0
+            if job.export is not None:
+                summary["export"] = job.export
+        else:
+            summary = {"novel_id": str(job.novel.novelid), "novel_name": job.novel.name,
+                       "ok": False, "error": job.error}
+        summaries.append(summary)
+    return summaries
+
+
+def cmd_download(args: argparse.Namespace) -> int:
+    """download 子命令"""
+    config = _build_config(args)
+    summaries = _download_all(config, [_novel(args.novel_id, args.name)], args)
+    _emit(summaries[0], args)
+    if not args.json and not args.jsonl:
+        print(f"下载 {summaries[0].get('downloaded', 0)} 章 -> {summaries[0].get('save_dir', '')}")
+        for item in summaries[0].get("missing", []):
+            print(f"缺失\t第{item['chapter_id']}章\t{item['error']}（已尝试{item['attempts']}次）")
+    return EXIT_OK if summaries[0]["ok"] else EXIT_FAILED
+
+
+def cmd_batch(args: argparse.Namespace) -> int:
+    """batch 子命令：按关键词爬取后下载全部结果，或下载列表文件中的小说"""
+    config = _build_config(args)
+    if args.input:
+        novels = _load_novels(args.input)
+    else:
+        novels = _crawled_novels(config, args)
+
+    summaries = _download_all(config, novels, args)
+    failed = [s for s in summaries if not s["ok"]]
+    _emit({"count": len(summaries), "failed": len(failed), "novels": summaries}, args)
+    if not args.json and not args.jsonl:
+        print(f"共 {len(summaries)} 本，失败 {len(failed)} 本")
+    return EXIT_OK if summaries and not failed else EXIT_FAILED
+
+
+def cmd_convert(args: argparse.Namespace) -> int:
+    """convert 子命令：在每章一个文件与压缩章节库之间转换"""
+    result = convert_store(args.novel_dir, args.to, args.remove_source)
+    _emit(result, args)
+    if not args.json:
+        for side in ("source", "target"):
+            stats = result[side]
+            print(f"{stats['kind']}\t{stats['chapters']}章\t{stats['disk_bytes'] / 1024:.1f}KB\t"
+                  f"读{stats['read_per_second']}章/秒\t写{stats['written_per_second']}章/秒")
+        print(f"转换耗时 {result['seconds']} 秒")
+    return EXIT_OK if result["target"]["chapters"] else EXIT_FAILED
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    """export 子命令：把小说目录合并导出为整本TXT/EPUB"""
+    novel_dir = args.novel_dir.rstrip("/\\")
+    exporter = BookExporter(novel_dir, args.name or os.path.basename(novel_dir), args.novel_id or "")
+    result = exporter.export(args.format, incremental=not args.full)
+    _emit(result, args)
+    if not args.json:
+        action = "重建" if result["rebuilt"] else "追加"
+        print(f"{action} {result['appended']} 章，共 {result['chapters']} 章 -> {result['path']}")
+    return EXIT_OK if result["chapters"] else EXIT_FAILED
+
+
+def cmd_follow(args: argparse.Namespace) -> int:
+    """follow 子命令：管理关注列表，检查已到期的关注小说并只下载新增章节"""
+    config = _build_config(args)
+    watcher = SubscriptionWatcher(config, Utils(), _stderr_logger(args.quiet))
+    if args.action in ("add", "remove") and not args.novel_id:
+        raise ValueError(f"follow {args.action} 需要指定小说ID")
+
+    if args.action == "add":
+        entry = watcher.follow(args.novel_id, args.name or args.novel_id)
+        _emit(entry, args)
+        return EXIT_OK
+    if args.action == "remove":
+        removed = watcher.unfollow(args.novel_id)
+        _emit({"novel_id": args.novel_id, "removed": removed}, args)
+        return EXIT_OK if removed else EXIT_FAILED
+    if args.action == "list":
+        entries = config.follows.entries()
+        _emit({"count": len(entries), "follows": entries}, args)
+        if not args.json and not args.jsonl:
+            for entry in entries:
+                print(f"{entry['novelid']}\t{entry['name']}\t第{entry['last_chapter']}章\t"
+                      f"间隔{entry['interval'] / 3600:.1f}小时\t"
+                      f"下次{time.strftime('%m-%d %H:%M', time.localtime(entry['next_check']))}")
+        return EXIT_OK
+
+    if args.action == "poll":
+        results = watcher.poll_due()
+    else:
+        job = watcher.start()
+        try:
+            while not job.join(1.0):
+                pass
+        except KeyboardInterrupt:
+            print("正在停止，等待当前章节写入完成……", file=sys.stderr, flush=True)
+            watcher.stop()
+            raise
+        if job.error is not None:
+            raise job.error
+        results = []
+    _emit({"checked": len(results), "updated": sum(1 for r in results if r["outcome"] == "updated"),
+           "results": results}, args)
+    if not args.json and not args.jsonl:
+        for result in results:
+            print(f"{result['novel_id']}\t{result['novel_name']}\t{result['outcome']}\t"
+                  f"新增{result['new']}章\t下载{result['downloaded']}章")
+    return EXIT_OK
+
+
+def cmd_queue(args: argparse.Namespace) -> int:
+    """queue 子命令：管理多进程共享下载队列，或作为工作进程领取并下载"""
+    config = _build_config(args)
+    queue = config.work_queue
+    if args.action in ("add", "remove") and not (args.novel_id or (args.action == "add" and args.input)):
+        raise ValueError(f"queue {args.action} 需要指定小说ID")
+
+    if args.action == "add":
+        novels = _load_novels(args.input) if args.input else [_novel(args.novel_id, args.name)]
+        added = [str(novel.novelid) for novel in novels
+                 if queue.enqueue(novel, args.start, args.end, args.priority, args.export or "")]
+        _emit({"count": len(novels), "queued": added}, args)
+        if not args.json and not args.jsonl:
+            print(f"加入队列 {len(added)} 本（共 {len(novels)} 本，其余仍在进行中）")
+        return EXIT_OK if added else EXIT_FAILED
+    if args.action == "remove":
+        removed = queue.remove(args.novel_id)
+        _emit({"novel_id": args.novel_id, "removed": removed}, args)
+        return EXIT_OK if removed else EXIT_FAILED
+    if args.action == "retry":
+        count = queue.retry_failed(args.novel_id)
+        _emit({"requeued": count}, args)
+        if not args.json and not args.jsonl:
+            print(f"重新排队 {count} 章")
+        return EXIT_OK
+
+    if args.action == "work":
+        logger = _stderr_logger(args.quiet)
+        workers = [QueueWorker(config, Utils(), queue, log_widget=logger) for _ in range(max(1, args.threads))]
+        threads = [BackgroundJob(lambda control, worker=worker: worker.run(control, not args.keep_alive),
+                                 name=worker.worker_id).start() for worker in workers]
+        try:
+            for job in threads:
+                while not job.join(1.0):
+                    pass
+        except KeyboardInterrupt:
+            print("正在停止，等待当前章节写入完成并归还未完成的工作项……", file=sys.stderr, flush=True)
+            for job in threads:
+                job.cancel()
+            for job in threads:
+                job.join()
+            raise
+        for job in threads:
+            if job.error is not None:
+                raise job.error
+
+    status = queue.status()
+    _emit(status, args)
+    if not args.json and not args.jsonl:
+        totals = status["totals"]
+        print(f"小说 {totals['novels_done']}/{totals['novels']} 本完成；章节 完成{totals['done']} "
+              f"下载中{totals['leased']} 等待{totals['queued']} 失败{totals['failed']}；"
+              f"在线工作进程 {totals['workers_alive']}")
+        for novel in status["novels"]:
+            print(f"{novel['novelid']}\t{novel['name']}\t{novel['state']}\t"
+                  f"{novel['done']}/{novel['planned']}章\t失败{novel['failed']}")
+        for worker in status["workers"]:
+            print(f"{worker['worker_id']}\t{'在线' if worker['alive'] else '离线'}\t{worker['state']}\t"
+                  f"下载{worker['downloaded']}章\t{worker['current']}")
+    return EXIT_OK if status["totals"]["failed"] == 0 else EXIT_FAILED
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """构建命令行参数解析器"""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--save-path", help="保存路径")
+    common.add_argument("--workers", type=int, help="并发线程数")
+    common.add_argument("--rate", type=float, help="每主机每秒请求数")
+    common.add_argument("--no-cache", action="store_true", help="不使用响应缓存")
+    common.add_argument("--storage", choices=sorted(STORE_KINDS), help="章节存储类型")
+    common.add_argument("--no-fsync", action="store_true", help="写入章节后不同步磁盘（更快，断电时可能丢失最近写入的章节）")
+    common.add_argument("--parse-workers", type=int, help="解析进程数（默认0：在下载线程中解析）")
+    output = common.add_mutually_exclusive_group()
+    output.add_argument("--json", action="store_true", help="以JSON输出结果")
+    output.add_argument("--jsonl", action="store_true", help="逐行输出进度事件（JSON Lines）")
+    common.add_argument("-o", "--output", help="结果另存为JSON文件")
+    common.add_argument("-q", "--quiet", action="store_true", help="不输出日志")
+    common.add_argument("--metrics", help="结束时写出运行指标（.prom 为 Prometheus 文本格式，其他为JSON）")
+
+    crawl_opts = argparse.ArgumentParser(add_help=False)
+    crawl_opts.add_argument("--max", type=int, default=50, help="最大爬取数量")
+    crawl_opts.add_argument("--until-fail", action="store_true", help="爬取直到连续3页为空")
+
+    download_opts = argparse.ArgumentParser(add_help=False)
+    download_opts.add_argument("--start", type=int, default=1, help="开始章节")
+    download_opts.add_argument("--end", type=int, default=0, help="结束章节（0表示到最后一章）")
+    download_opts.add_argument("--resume", action="store_true", help="断点续传")
+    download_opts.add_argument("--export", choices=BookExporter.FORMATS, help="下载完成后导出整本")
+    download_opts.add_argument("--attempts", type=int, help="每章最多尝试次数（失败章节在主流程后退避重试）")
+
+    parser = argparse.ArgumentParser(prog="cli.py", description="小说爬虫工具（命令行版）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_crawl = sub.add_parser("crawl", parents=[common, crawl_opts], help="按关键词爬取小说列表")
+    p_crawl.add_argument("keyword", help="搜索关键词")
+    mode = p_crawl.add_mutually_exclusive_group()
+    mode.add_argument("--local", action="store_true", help="只查询本地小说目录")
+    mode.add_argument("--refresh", type=int, nargs="?", const=3, help="增量刷新：最多请求的页数（默认3）")
+    p_crawl.set_defaults(func=cmd_crawl)
+
+    p_download = sub.add_parser("download", parents=[common, download_opts], help="下载单本小说")
+    p_download.add_argument("novel_id", help="小说ID")
+    p_download.add_argument("--name", help="小说名称（用作保存目录名）")
+    p_download.set_defaults(func=cmd_download)
+
+    p_batch = sub.add_parser("batch", parents=[common, crawl_opts, download_opts], help="批量下载")
+    source = p_batch.add_mutually_exclusive_group(required=True)
+    source.add_argument("--keyword", help="先按关键词爬取，再下载全部结果")
+    source.add_argument("--input", help="小说列表文件（crawl --json 的输出或每行一个ID）")
+    p_batch.add_argument("--jobs", type=int, help="同时下载的小说数")
+    p_batch.set_defaults(func=cmd_batch)
+
+    p_convert = sub.add_parser("convert", help="转换小说目录的章节存储类型")
+    p_convert.add_argument("novel_dir", help="小说保存目录")
+    p_convert.add_argument("--to", required=True, choices=sorted(STORE_KINDS), help="目标存储类型")
+    p_convert.add_argument("--remove-source", action="store_true", help="转换后删除原存储")
+    p_convert.add_argument("--json", action="store_true", help="以JSON输出结果")
+    p_convert.set_defaults(func=cmd_convert)
+
+    p_export = sub.add_parser("export", help="导出整本TXT/EPUB")
+    p_export.add_argument("novel_dir", help="小说保存目录")
+    p_export.add_argument("--format", choices=BookExporter.FORMATS, default="txt", help="导出格式")
+    p_export.add_argument("--name", help="书名（默认取目录名）")
+    p_export.add_argument("--novel-id", help="小说ID（写入EPUB标识）")
+    p_export.add_argument("--full", action="store_true", help="整本重建（不做增量追加）")
+    p_export.add_argument("--json", action="store_true", help="以JSON输出结果")
+    p_export.set_defaults(func=cmd_export)
+
+    p_follow = sub.add_parser("follow", parents=[common], help="追更：关注小说并只下载新章节")
+    p_follow.add_argument("action", choices=("add", "remove", "list", "poll", "watch"),
+                          help="add/remove 关注或取消，list 列出，poll 检查一次到期的小说，watch 持续轮询")
+    p_follow.add_argument("novel_id", nargs="?", help="小说ID（add / remove 时必填）")
+    p_follow.add_argument("--name", help="小说名称（与下载时的保存目录名一致）")
+    p_follow.set_defaults(func=cmd_follow)
+
+    p_queue = sub.add_parser("queue", parents=[common], help="多进程共享下载队列")
+    p_queue.add_argument("action", choices=("add", "remove", "status", "retry", "work"),
+                         help="add/remove 加入或移出小说，status 汇总进度，retry 重新排队失败章节，work 作为工作进程下载")
+    p_queue.add_argument("novel_id", nargs="?", help="小说ID（add / remove 时必填，retry 时可选）")
+    p_queue.add_argument("--name", help="小说名称（用作保存目录名）")
+    p_queue.add_argument("--input", help="小说列表文件（add 时批量加入）")
+    p_queue.add_argument("--start", type=int, default=1, help="开始章节")
+    p_queue.add_argument("--end", type=int, default=0, help="结束章节（0表示到最后一章）")
+    p_queue.add_argument("--priority", type=int, default=5, help="优先级（越大越优先）")
+    p_queue.add_argument("--export", choices=BookExporter.FORMATS, help="整本完成后导出")
+    p_queue.add_argument("--threads", type=int, default=1, help="本进程内的工作者数（work）")
+    p_queue.add_argument("--keep-alive", action="store_true", help="队列为空时继续等待新任务（work）")
+    p_queue.set_defaults(func=cmd_queue)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行主函数，返回退出码"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        print("已中断", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    except ValueError as e:
+        print(f"❌ {str(e)}", file=sys.stderr)
+        return EXIT_USAGE
+    except OSError as e:
+        print(f"❌ {str(e)}", file=sys.stderr)
+        return EXIT_FAILED
+    finally:
+        config = getattr(args, "config", None)
+        if config is not None:
+            config.set_parse_workers(0)
+            if getattr(args, "metrics", None):
+                config.metrics.dump(args.metrics)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
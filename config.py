@@ -1,6 +1,14 @@
 # config.py - 配置管理类
+import json
 import os
-from typing import List, Dict
+import threading
+import urllib.parse
+from typing import Dict, Optional
+
+from log_pump import LogRing
+from metrics import Metrics
+from novel_record import NovelList
+from rate_limiter import AdaptiveThrottle
 
 
 class ConfigManager:
@@ -25,14 +33,397 @@ class ConfigManager:
         "Upgrade-Insecure-Requests": "1"
     }
 
+    CHAPTER_URL = "https://www.jjwxc.net/onebook.php"
+
     # 默认保存路径
     DEFAULT_SAVE_PATH = os.path.join(os.getcwd(), "小说下载")
 
+    # 设置文件（可用环境变量 NOVEL_SETTINGS 指定路径）
+    SETTINGS_ENV = "NOVEL_SETTINGS"
+    DEFAULT_SETTINGS_FILE = os.path.join(os.path.expanduser("~"), ".novel_crawler", "settings.json")
+
+    # 写入设置文件的配置项（启动时按默认值的类型读回）
+    SETTINGS_KEYS = (
+        "save_path", "download_workers", "crawl_workers", "max_download_jobs", "max_chapter_requests",
+        "host_rate", "host_rate_overrides", "rate_floor", "rate_ceiling", "target_latency",
+        "pool_size", "retries", "chapter_attempts", "retry_backoff", "retry_backoff_max",
+        "cache_enabled", "cache_max_bytes", "cache_ttls", "parser_backend", "parse_workers",
+        "storage_backend", "durable_writes", "write_queue_size", "write_batch_size",
+        "poll_interval", "poll_min_interval", "poll_max_interval",
+        "lease_seconds", "queue_batch_size", "queue_attempts"
+    )
+    # 读取设置文件时的取值范围：线程数、队列长度等至少为1，速率、间隔等必须大于0，其余数值项不能小于0；
+    # 后端名称只接受下列取值（与 PageParser.BACKENDS、chapter_store.STORE_KINDS 一致，读取设置时不导入这两个模块）
+    SETTINGS_AT_LEAST_ONE = (
+        "download_workers", "crawl_workers", "max_download_jobs", "max_chapter_requests", "pool_size",
+        "chapter_attempts", "write_queue_size", "write_batch_size", "queue_batch_size", "queue_attempts"
+    )
+    SETTINGS_POSITIVE = (
+        "host_rate", "host_rate_overrides", "rate_floor", "rate_ceiling", "target_latency",
+        "poll_interval", "poll_min_interval", "poll_max_interval", "lease_seconds"
+    )
+    SETTINGS_CHOICES = {
+        "parser_backend": ("lxml", "strainer", "html.parser"),
+        "storage_backend": ("files", "packed")
+    }
+
+    # 并发下载配置
+    DEFAULT_DOWNLOAD_WORKERS = 4
+    DEFAULT_HOST_RATE = 2.0  # 每个主机每秒请求数（初始值，之后自适应调整）
+    DEFAULT_RATE_FLOOR = 0.2
+    DEFAULT_RATE_CEILING = 10.0
+    DEFAULT_TARGET_LATENCY = 2.0  # 响应延迟超过该值（秒）时降速
+    DEFAULT_CRAWL_WORKERS = 4
+    DEFAULT_MAX_JOBS = 3  # 下载队列同时运行的小说数
+    DEFAULT_MAX_REQUESTS = 8  # 下载队列全局同时进行的章节请求数
+
+    # HTTP连接配置
+    DEFAULT_POOL_SIZE = 16
+    DEFAULT_TIMEOUT = (10, 30)  # （连接超时，读取超时）秒
+    DEFAULT_RETRIES = 2
+
+    # 章节重试队列配置
+    DEFAULT_CHAPTER_ATTEMPTS = 4  # 每章最多尝试次数（含首次）
+    DEFAULT_RETRY_BACKOFF = 2.0  # 第1轮重试前的等待（秒），之后每轮翻倍
+    DEFAULT_RETRY_BACKOFF_MAX = 60.0
+
+    # 响应缓存配置
+    CACHE_DIR_NAME = ".cache"
+    DEFAULT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+    # 本地小说目录
+    CATALOG_DIR_NAME = ".catalog"
+
+    # 追更配置（轮询间隔按每本书的更新频率在上下限之间自适应，单位秒）
+    FOLLOW_DIR_NAME = ".follows"
+    DEFAULT_POLL_INTERVAL = 6 * 3600  # 新关注小说的初始轮询间隔
+    DEFAULT_POLL_MIN_INTERVAL = 1800  # 不低于目录页缓存有效期
+    DEFAULT_POLL_MAX_INTERVAL = 7 * 86400
+
+    # 多进程共享下载队列配置
+    QUEUE_DIR_NAME = ".queue"
+    DEFAULT_LEASE_SECONDS = 60.0  # 工作项租约时长，工作进程每1/3租约时长发送一次心跳
+    DEFAULT_QUEUE_BATCH_SIZE = 20  # 每次领取的连续章节数
+    DEFAULT_QUEUE_ATTEMPTS = 3  # 租约过期（进程崩溃）或目录读取失败的最多次数
+
+    # 页面解析配置
+    DEFAULT_PARSER_BACKEND = "lxml"
+    PAGE_CHARSET = "gb18030"
+    DEFAULT_PARSE_WORKERS = 0  # 解析进程数（0 表示在网络I/O线程中直接解析）
+
+    # 系统日志保留条数
+    DEFAULT_LOG_CAPACITY = 5000
+
+    # 章节存储配置（files：每章一个文件；packed：每本一个压缩章节库）
+    DEFAULT_STORAGE_BACKEND = "files"
+
+    # 章节写入阶段配置
+    DEFAULT_WRITE_QUEUE_SIZE = 64  # 待写入章节队列上限（满时下载端等待）
+    DEFAULT_WRITE_BATCH_SIZE = 32  # 每批最多写入章节数（一批同步一次磁盘）
+
     def __init__(self):
-        self.novel_data_list: List[Dict] = []
+        self.novel_data_list = NovelList()
         self.save_path: str = self.DEFAULT_SAVE_PATH
-        self.global_log: List[str] = []
+        self.global_log = LogRing(self.DEFAULT_LOG_CAPACITY)
+        self.metrics = Metrics()
+        self.download_workers: int = self.DEFAULT_DOWNLOAD_WORKERS
+        self.crawl_workers: int = self.DEFAULT_CRAWL_WORKERS
+        self.max_download_jobs: int = self.DEFAULT_MAX_JOBS
+        self.max_chapter_requests: int = self.DEFAULT_MAX_REQUESTS
+        self.host_rate: float = self.DEFAULT_HOST_RATE
+        self.host_rate_overrides: Dict[str, float] = {}
+        self.rate_floor: float = self.DEFAULT_RATE_FLOOR
+        self.rate_ceiling: float = self.DEFAULT_RATE_CEILING
+        self.target_latency: float = self.DEFAULT_TARGET_LATENCY
+        self._rate_limiters: Dict[str, AdaptiveThrottle] = {}
+        self._rate_lock = threading.Lock()
+        self.pool_size: int = self.DEFAULT_POOL_SIZE
+        self.timeout = self.DEFAULT_TIMEOUT
+        self.retries: int = self.DEFAULT_RETRIES
+        self.chapter_attempts: int = self.DEFAULT_CHAPTER_ATTEMPTS
+        self.retry_backoff: float = self.DEFAULT_RETRY_BACKOFF
+        self.retry_backoff_max: float = self.DEFAULT_RETRY_BACKOFF_MAX
+        self._http = None
+        self._http_lock = threading.Lock()
+        self.cache_enabled: bool = True
+        self.cache_max_bytes: int = self.DEFAULT_CACHE_MAX_BYTES
+        self.cache_ttls: Dict[str, float] = {}
+        self._cache = None
+        self._catalog = None
+        self._follows = None
+        self.poll_interval: float = self.DEFAULT_POLL_INTERVAL
+        self._work_queue = None
+        self.lease_seconds: float = self.DEFAULT_LEASE_SECONDS
+        self.queue_batch_size: int = self.DEFAULT_QUEUE_BATCH_SIZE
+        self.queue_attempts: int = self.DEFAULT_QUEUE_ATTEMPTS
+        self.poll_min_interval: float = self.DEFAULT_POLL_MIN_INTERVAL
+        self.poll_max_interval: float = self.DEFAULT_POLL_MAX_INTERVAL
+        self.parser_backend: str = self.DEFAULT_PARSER_BACKEND
+        self._parser = None
+        self.parse_workers: int = self.DEFAULT_PARSE_WORKERS
+        self._parse_pool = None
+        self._parse_pool_lock = threading.Lock()
+        self.storage_backend: str = self.DEFAULT_STORAGE_BACKEND
+        self.durable_writes: bool = True
+        self.write_queue_size: int = self.DEFAULT_WRITE_QUEUE_SIZE
+        self.write_batch_size: int = self.DEFAULT_WRITE_BATCH_SIZE
+
+    @property
+    def settings_file(self) -> str:
+        """设置文件路径"""
+        return os.environ.get(self.SETTINGS_ENV) or self.DEFAULT_SETTINGS_FILE
+
+    def load_settings(self, path: Optional[str] = None) -> bool:
+        """读取设置文件（在使用HTTP客户端、缓存等之前调用），文件不存在或损坏时保持默认值，返回是否已读取
+
+        只做类型、取值范围检查与赋值，不合法的项保持默认值；不创建连接池、缓存等对象，
+        也不导入解析、存储模块，它们在首次使用时按读取的设置创建。
+        """
+        try:
+            with open(path or self.settings_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if not isinstance(data, dict):
+            return False
+
+        for key in self.SETTINGS_KEYS:
+            if key not in data:
+                continue
+            default = getattr(self, key)
+            value = data[key]
+            if isinstance(default, dict):
+                if isinstance(value, dict):
+                    setattr(self, key, {str(k): float(v) for k, v in value.items() if self._valid_number(key, v)})
+            elif isinstance(default, bool):
+                if isinstance(value, bool):
+                    setattr(self, key, value)
+            elif isinstance(default, (int, float)):
+                if self._valid_number(key, value):
+                    setattr(self, key, type(default)(value))
+            elif isinstance(value, str) and value:
+                if value in self.SETTINGS_CHOICES.get(key, (value,)):
+                    setattr(self, key, value)
+
+        # 上下限互相矛盾时两项都恢复默认值
+        if self.rate_ceiling < self.rate_floor:
+            self.rate_floor, self.rate_ceiling = self.DEFAULT_RATE_FLOOR, self.DEFAULT_RATE_CEILING
+        if self.poll_max_interval < self.poll_min_interval:
+            self.poll_min_interval = self.DEFAULT_POLL_MIN_INTERVAL
+            self.poll_max_interval = self.DEFAULT_POLL_MAX_INTERVAL
+        return True
+
+    def _valid_number(self, key: str, value) -> bool:
+        """设置文件中的数值是否在该项的取值范围内"""
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value != value:
+            return False
+        if key in self.SETTINGS_AT_LEAST_ONE:
+            return value >= 1
+        if key in self.SETTINGS_POSITIVE:
+            return value > 0
+        return value >= 0
+
+    def save_settings(self, path: Optional[str] = None) -> str:
+        """原子写入设置文件，返回文件路径"""
+        path = path or self.settings_file
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        data = {key: getattr(self, key) for key in self.SETTINGS_KEYS}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+        return path
+
+    @property
+    def http(self):
+        """共享HTTP客户端（首次使用时创建）"""
+        if self._http is None:
+            with self._http_lock:
+                if self._http is None:
+                    from http_client import HttpClient
+                    self._http = HttpClient(self.HEADERS, pool_size=self.pool_size,
+                                            timeout=self.timeout, retries=self.retries,
+                                            cache=self.cache, throttle=self.get_rate_limiter,
+                                            metrics=self.metrics)
+        return self._http
+
+    @property
+    def parser(self):
+        """页面解析器"""
+        if self._parser is None:
+            from page_parser import PageParser
+            self._parser = PageParser(self.parser_backend, self.PAGE_CHARSET)
+        return self._parser
+
+    def set_parser_backend(self, backend: str) -> None:
+        """设置解析后端（lxml / strainer / html.parser）"""
+        from page_parser import PageParser
+        self._parser = PageParser(backend, self.PAGE_CHARSET)
+        self.parser_backend = self._parser.backend
+        self.set_parse_workers(self.parse_workers)
+
+    @property
+    def parse_pool(self):
+        """解析进程池（解析进程数为0时为None，首次使用时创建）"""
+        if self.parse_workers <= 0:
+            return None
+        if self._parse_pool is None:
+            with self._parse_pool_lock:
+                if self._parse_pool is None:
+                    from parse_pool import ParsePool
+                    self._parse_pool = ParsePool(self.parse_workers, self.parser.backend, self.PAGE_CHARSET)
+        return self._parse_pool
+
+    def set_parse_workers(self, workers: int) -> None:
+        """设置解析进程数（0 表示不使用进程池），关闭当前进程池，下次解析时按新配置重建"""
+        self.parse_workers = max(0, int(workers))
+        with self._parse_pool_lock:
+            old, self._parse_pool = self._parse_pool, None
+        if old is not None:
+            old.close()
+
+    def set_storage_backend(self, backend: str) -> None:
+        """设置章节存储类型（files / packed）"""
+        from chapter_store import STORE_KINDS
+        if backend not in STORE_KINDS:
+            raise ValueError(f"未知的存储类型：{backend}（可选：{'、'.join(STORE_KINDS)}）")
+        self.storage_backend = backend
+
+    def set_write_options(self, durable: bool, queue_size: Optional[int] = None,
+                          batch_size: Optional[int] = None) -> None:
+        """设置章节写入：是否同步落盘（fsync）、写入队列上限与每批章节数"""
+        self.durable_writes = durable
+        if queue_size is not None:
+            self.write_queue_size = max(1, int(queue_size))
+        if batch_size is not None:
+            self.write_batch_size = max(1, int(batch_size))
+
+    @property
+    def cache(self):
+        """保存路径下的响应缓存（未启用时为None）"""
+        if not self.cache_enabled:
+            return None
+        if self._cache is None:
+            from response_cache import ResponseCache
+            self._cache = ResponseCache(os.path.join(self.save_path, self.CACHE_DIR_NAME),
+                                        ttls=self.cache_ttls, max_bytes=self.cache_max_bytes)
+        return self._cache
+
+    @property
+    def catalog(self):
+        """保存路径下的本地小说目录"""
+        if self._catalog is None:
+            from catalog import NovelCatalog
+            self._catalog = NovelCatalog(os.path.join(self.save_path, self.CATALOG_DIR_NAME))
+        return self._catalog
+
+    @property
+    def follows(self):
+        """保存路径下的关注列表（追更）"""
+        if self._follows is None:
+            from subscriptions import FollowList
+            self._follows = FollowList(os.path.join(self.save_path, self.FOLLOW_DIR_NAME))
+        return self._follows
+
+    @property
+    def work_queue(self):
+        """保存路径下的多进程共享下载队列"""
+        if self._work_queue is None:
+            from work_queue import WorkQueue
+            self._work_queue = WorkQueue(os.path.join(self.save_path, self.QUEUE_DIR_NAME),
+                                         lease_seconds=self.lease_seconds, max_attempts=self.queue_attempts)
+        return self._work_queue
+
+    def set_poll_options(self, min_interval: float, max_interval: float,
+                         interval: Optional[float] = None) -> None:
+        """设置追更轮询间隔的下限、上限与新关注小说的初始间隔（秒）"""
+        self.poll_min_interval = max(1.0, float(min_interval))
+        self.poll_max_interval = max(self.poll_min_interval, float(max_interval))
+        if interval is not None:
+            self.poll_interval = float(interval)
+        self.poll_interval = min(self.poll_max_interval, max(self.poll_min_interval, self.poll_interval))
+
+    def set_cache_options(self, enabled: bool, max_bytes: Optional[int] = None,
+                          ttls: Optional[Dict[str, float]] = None) -> None:
+        """设置响应缓存开关、大小上限与各类型有效期"""
+        self.cache_enabled = enabled
+        if max_bytes is not None:
+            self.cache_max_bytes = max_bytes
+        if ttls is not None:
+            self.cache_ttls = dict(ttls)
+        self._reset_cache()
+
+    def _reset_cache(self) -> None:
+        """关闭当前缓存，下次使用时按最新配置重建"""
+        old, self._cache = self._cache, None
+        if old is not None:
+            old.close()
+        if self._http is not None:
+            self._http.cache = self.cache
+
+    def set_http_options(self, pool_size: int, timeout, retries: int) -> None:
+        """设置连接池大小、超时与重试次数（下次请求时生效）"""
+        self.pool_size = max(1, int(pool_size))
+        self.timeout = timeout
+        self.retries = max(0, int(retries))
+        with self._http_lock:
+            old, self._http = self._http, None
+        if old is not None:
+            old.close()
+
+    def set_retry_options(self, attempts: int, backoff: Optional[float] = None,
+                          backoff_max: Optional[float] = None) -> None:
+        """设置章节重试队列：每章最多尝试次数（1 表示不重试）、首轮退避与退避上限（秒）"""
+        self.chapter_attempts = max(1, int(attempts))
+        if backoff is not None:
+            self.retry_backoff = max(0.0, float(backoff))
+        if backoff_max is not None:
+            self.retry_backoff_max = max(self.retry_backoff, float(backoff_max))
 
     def set_save_path(self, path: str) -> None:
         """设置保存路径"""
-        self.save_path = path
\ No newline at end of file
+        self.save_path = path
+        self._reset_cache()
+        old, self._catalog = self._catalog, None
+        if old is not None:
+            old.close()
+        old, self._follows = self._follows, None
+        if old is not None:
+            old.close()
+        old, self._work_queue = self._work_queue, None
+        if old is not None:
+            old.close()
+
+    def set_download_options(self, workers: int, host_rate: float) -> None:
+        """设置并发数与每主机请求预算"""
+        self.download_workers = max(1, int(workers))
+        self.host_rate = max(0.1, float(host_rate))
+        with self._rate_lock:
+            self._rate_limiters.clear()
+
+    def set_rate_limits(self, floor: float, ceiling: float, target_latency: Optional[float] = None) -> None:
+        """设置自适应限速的下限、上限（次/秒）与目标延迟（秒）"""
+        self.rate_floor = max(0.01, float(floor))
+        self.rate_ceiling = max(self.rate_floor, float(ceiling))
+        if target_latency is not None:
+            self.target_latency = float(target_latency)
+        with self._rate_lock:
+            self._rate_limiters.clear()
+
+    def get_rate_limiter(self, url: str) -> AdaptiveThrottle:
+        """获取URL所属主机的自适应限速器（同一主机共享请求预算）"""
+        host = urllib.parse.urlsplit(url).netloc
+        with self._rate_lock:
+            limiter = self._rate_limiters.get(host)
+            if limiter is None:
+                rate = self.host_rate_overrides.get(host, self.host_rate)
+                limiter = AdaptiveThrottle(rate, min_rate=self.rate_floor, max_rate=self.rate_ceiling,
+                                           target_latency=self.target_latency,
+                                           burst=max(1, self.download_workers))
+                self._rate_limiters[host] = limiter
+            return limiter
+
+    def current_rates(self) -> Dict[str, float]:
+        """各主机当前请求速率（次/秒）"""
+        with self._rate_lock:
+            return {host: round(limiter.current_rate, 2) for host, limiter in self._rate_limiters.items()}
\ No newline at end of file
@@ -1,19 +1,11 @@
 # crawler.py - 爬虫核心功能
-import time
-import requests
-from bs4 import BeautifulSoup
-import urllib.parse
-from typing import List, Dict, Optional
-import tkinter as tk
-from tkinter import scrolledtext
-
-# 屏蔽SSL警告
-try:
-    import urllib3
-
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-except ImportError:
-    pass
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
+from event_stream import iter_events
+from job_control import JobCancelled, JobControl
+from novel_record import NovelList, NovelRecord
+from parse_pool import parse_result, submit_parse
+from utils import LogTarget
 
 
 class NovelCrawler:
@@ -23,62 +15,134 @@ class NovelCrawler:
         self.config = config
         self.utils = utils
 
-    def get_page_data(self, page_num: int, keyword_encoded: str) -> List[Dict]:
+    # 搜索页数上限
+    MAX_PAGES = 50
+
+    def get_page_data(self, page_num: int, keyword_encoded: str) -> List[NovelRecord]:
         """获取单页小说数据"""
+        page_data, _ = self.get_search_page(page_num, keyword_encoded)
+        return page_data
+
+    def get_search_page(self, page_num: int, keyword_encoded: str,
+                        use_cache: bool = True) -> Tuple[List[NovelRecord], int]:
+        """获取单页小说数据及搜索结果总页数（总页数未知时为0）；use_cache 为False时直接请求网站"""
+        return self._finish_search_page(self._request_search_page(page_num, keyword_encoded, use_cache))
+
+    def _request_search_page(self, page_num: int, keyword_encoded: str, use_cache: bool = True) -> Dict:
+        """搜索页的网络阶段：请求页面并提交解析，返回 {"params", "parsing"（解析Future，请求失败时为None）}"""
         page_params = self.config.PARAMS.copy()
         page_params["kw"] = keyword_encoded
         if page_num > 1:
             page_params["p"] = page_num
 
+        fetched = {"params": page_params, "parsing": None}
         try:
-            response = requests.get(
-                url=self.config.BASE_URL,
-                params=page_params,
-                headers=self.config.HEADERS,
-                timeout=30,
-                verify=False
-            )
+            response = self.config.http.get(self.config.BASE_URL, params=page_params,
+                                            cache_kind="search" if use_cache else None)
             response.raise_for_status()
-            response.encoding = "gbk"
+            fetched["parsing"] = submit_parse(self.config.parse_pool, self.config.parser, "search",
+                                              response.content, response.headers.get("Content-Type", ""),
+                                              self.config.BASE_URL)
+        except Exception:
+            # 请求失败时 parsing 保持为None，由解析阶段计为失败页
+            pass
+        return fetched
 
-            soup = BeautifulSoup(response.text, "html.parser")
+    def _finish_search_page(self, fetched: Dict) -> Tuple[List[NovelRecord], int]:
+        """搜索页的解析阶段：等待解析完成，返回（单页小说数据, 总页数）；链接中没有 novelid 的条目不计入"""
+        metrics = self.config.metrics
+        try:
+            if fetched["parsing"] is None:
+                raise ValueError("请求失败")
+            items, page_count = parse_result(fetched["parsing"], metrics)
             page_data = []
 
-            for h3_tag in soup.find_all("h3", class_="title"):
-                a_tag = h3_tag.find("a", href=True)
-                if not a_tag:
-                    continue
+            for novel_name, href in items:
+                record = NovelRecord.from_link(novel_name, href)
+                if record is not None:
+                    page_data.append(record)
 
-                novel_name = a_tag.get_text(strip=True)
-                href = a_tag["href"].strip()
-                if not href.startswith("http"):
-                    href = urllib.parse.urljoin(self.config.BASE_URL, href)
+            if not page_data:
+                self.config.http.discard_cached(self.config.BASE_URL, fetched["params"])
+                metrics.add("empty_pages")
+            metrics.add("pages")
+            return page_data, page_count
+        except Exception:
+            metrics.add("page_failures")
+            return [], 0
+
+    def _merge_page(self, run: Dict, page_num: int, page_data: List[NovelRecord]) -> bool:
+        """合并一页数据（按 novelid 去重），返回是否已达到数量限制"""
+        all_data = run["all_data"]
+        max_novels = run["max_novels"]
+        log_widget = run["log_widget"]
+        new_items = []
+        reached = False
 
-                novel_id = self.utils.extract_novel_id(href)
-                page_data.append({
-                    "名称": novel_name,
-                    "链接": href,
-                    "novelid": novel_id
-                })
+        for item in page_data:
+            if all_data.add(item):
+                new_items.append(item)
+
+                if not run["crawl_until_fail"] and len(all_data) >= max_novels:
+                    all_data.truncate(max_novels)
+                    self.utils.log_message(f"✅ 已获取{max_novels}条数据，达到数量限制", self.config, log_widget)
+                    reached = True
+                    break
 
-            return page_data
+        run["last_page"] = max(run["last_page"], page_num)
+        try:
+            self.config.catalog.upsert(new_items, run["keyword"], start_rank=len(all_data) - len(new_items))
         except Exception as e:
-            return []
+            self.utils.log_message(f"⚠️ 写入本地目录失败：{str(e)}", self.config, log_widget)
+
+        self.utils.log_message(f"✅ 第{page_num}页爬取完成，新增{len(new_items)}条（累计{len(all_data)}条）",
+                               self.config, log_widget, low_priority=True)
+        if run["progress"]:
+            run["progress"]({
+                "event": "page",
+                "page": page_num,
+                "items": new_items,
+                "total": len(all_data)
+            })
+        return reached
 
     def crawl_novels(self, keyword: str, max_novels: int,
                      crawl_until_fail: bool,
-                     log_widget: Optional[scrolledtext.ScrolledText] = None) -> List[Dict]:
-        """爬取小说列表"""
-        all_data = []
-        seen_links = set()
-        page_num = 1
-        empty_page_count = 0
+                     log_widget: Optional[LogTarget] = None,
+                     workers: Optional[int] = None,
+                     progress: Optional[Callable[[Dict], None]] = None,
+                     control: Optional[JobControl] = None) -> NovelList:
+        """爬取小说列表
+
+        workers 大于1时启用并行模式：先从第1页读取总页数，再并行获取其余页面
+        （受每主机请求预算限制），结果按页码顺序合并。
+        progress 回调按页码顺序接收事件字典：{"event": "page", "page", "items"（本页新增）, "total"}。
+        爬取过程中 config.novel_data_list 即为本次结果列表，随每页合并逐步增长。
+        control 为任务控制令牌：每页之前检查，暂停时等待，取消时停止并返回已获取的结果。
+        关键词为空时直接返回空列表；关键词无法用GB2312编码时 encode_keyword 抛出 ValueError，由调用方提示。
+        """
         max_empty_pages = 2
 
         keyword_encoded = self.utils.encode_keyword(keyword)
         if not keyword_encoded:
-            return []
+            return NovelList()
+
+        if workers is None:
+            workers = self.config.crawl_workers
 
+        run = {
+            "keyword": keyword,
+            "keyword_encoded": keyword_encoded,
+            "max_novels": max_novels,
+            "crawl_until_fail": crawl_until_fail,
+            "all_data": NovelList(),
+            "last_page": 0,
+            "log_widget": log_widget,
+            "progress": progress,
+            "control": control
+        }
+
+        self.config.novel_data_list = run["all_data"]
         self.utils.log_message(f"开始爬取关键词「{keyword}」的小说数据...", self.config, log_widget)
 
         if crawl_until_fail:
@@ -87,14 +151,127 @@ class NovelCrawler:
             self.utils.log_message(f"爬取模式：最多{max_novels}条（连续{max_empty_pages}页空则终止）", self.config,
                                    log_widget)
 
+        cancelled = False
+        try:
+            if workers > 1:
+                self._crawl_parallel(run, workers)
+            else:
+                self._crawl_sequential(run)
+        except JobCancelled:
+            cancelled = True
+
+        all_data = run["all_data"]
+        if run["last_page"]:
+            try:
+                self.config.catalog.mark_refreshed(keyword, run["last_page"])
+            except Exception as e:
+                self.utils.log_message(f"⚠️ 更新本地目录刷新时间失败：{str(e)}", self.config, log_widget)
+        if cancelled:
+            self.utils.log_message("\n⚠️ 爬取已取消", self.config, log_widget)
+        else:
+            self.utils.log_message("\n========== 爬取完成 ==========", self.config, log_widget)
+        self.utils.log_message(f"最终获取到 {len(all_data)} 本小说", self.config, log_widget)
+        http_stats = self.config.http.stats()
+        self.utils.log_message(f"连接统计：新建{http_stats['opened']}个，复用{http_stats['reused']}次",
+                               self.config, log_widget)
+
+        return all_data
+
+    def search_catalog(self, keyword: str, limit: Optional[int] = None) -> NovelList:
+        """从本地目录查询关键词（不发请求），结果同时设为当前小说列表"""
+        novels = self.config.catalog.search(keyword, limit)
+        self.config.novel_data_list = novels
+        return novels
+
+    def refresh_keyword(self, keyword: str, max_pages: int = 3,
+                        log_widget: Optional[LogTarget] = None,
+                        control: Optional[JobControl] = None) -> NovelList:
+        """增量刷新关键词：只重新请求前 max_pages 页，遇到全部为已知小说的页面即停止
+
+        目录中没有该关键词时执行完整爬取。返回本地目录中该关键词的全部结果；
+        control 取消时停止请求后续页面，已刷新的页面保留。
+        """
+        catalog = self.config.catalog
+        if catalog.keyword_info(keyword) is None:
+            self.utils.log_message(f"本地目录中没有关键词「{keyword}」，执行完整爬取", self.config, log_widget)
+            self.crawl_novels(keyword, 0, True, log_widget, control=control)
+            return self.search_catalog(keyword)
+
+        keyword_encoded = self.utils.encode_keyword(keyword)
+        self.utils.log_message(f"开始增量刷新关键词「{keyword}」（最多{max_pages}页）...", self.config, log_widget)
+
+        total_added = 0
+        rank = 0
+        pages = 0
+        for page_num in range(1, max_pages + 1):
+            try:
+                if control is not None:
+                    control.checkpoint()
+            except JobCancelled:
+                self.utils.log_message("⚠️ 刷新已取消", self.config, log_widget)
+                break
+            page_data, _ = self.get_search_page(page_num, keyword_encoded, use_cache=False)
+            if not page_data:
+                self.utils.log_message(f"❌ 第{page_num}页无数据，停止刷新", self.config, log_widget)
+                break
+
+            pages = page_num
+            known = catalog.known_ids(keyword, (str(item.novelid) for item in page_data))
+            added = catalog.upsert(page_data, keyword, start_rank=rank)
+            rank += len(page_data)
+            new_count = sum(1 for item in page_data if str(item.novelid) not in known)
+            total_added += added
+            self.utils.log_message(f"✅ 第{page_num}页：{new_count}本为该关键词新结果（目录新增{added}本）",
+                                   self.config, log_widget)
+            if not new_count:
+                self.utils.log_message(f"第{page_num}页均为已知小说，停止刷新", self.config, log_widget)
+                break
+
+        if pages:
+            try:
+                catalog.mark_refreshed(keyword, pages)
+            except Exception as e:
+                self.utils.log_message(f"⚠️ 更新本地目录刷新时间失败：{str(e)}", self.config, log_widget)
+        novels = self.search_catalog(keyword)
+        self.utils.log_message(f"增量刷新完成：请求{pages}页，目录新增{total_added}本，该关键词共{len(novels)}本",
+                               self.config, log_widget)
+        return novels
+
+    def iter_crawl(self, keyword: str, max_novels: int, crawl_until_fail: bool = False,
+                   log_widget: Optional[LogTarget] = None,
+                   workers: Optional[int] = None,
+                   control: Optional[JobControl] = None) -> Iterator[Dict]:
+        """以生成器形式爬取：每合并一页产出一个 page 事件，最后产出 {"event": "done", "result": 小说列表}
+
+        提前关闭生成器会在下一页合并时终止爬取。
+        """
+        return iter_events(lambda progress: self.crawl_novels(keyword, max_novels, crawl_until_fail,
+                                                              log_widget, workers, progress, control))
+
+    @staticmethod
+    def _checkpoint(run: Dict) -> None:
+        """任务检查点：暂停时等待，已取消时抛出 JobCancelled"""
+        if run["control"] is not None:
+            run["control"].checkpoint()
+
+    def _crawl_sequential(self, run: Dict, start_page: int = 1) -> None:
+        """逐页爬取（从 start_page 开始）"""
+        page_num = start_page
+        empty_page_count = 0
+        max_empty_pages = 2
+        crawl_until_fail = run["crawl_until_fail"]
+        log_widget = run["log_widget"]
+
         while True:
-            if page_num > 50:
-                self.utils.log_message(f"⚠️ 已爬取50页，强制终止", self.config, log_widget)
+            self._checkpoint(run)
+            if page_num > self.MAX_PAGES:
+                self.utils.log_message(f"⚠️ 已爬取{self.MAX_PAGES}页，强制终止", self.config, log_widget)
                 break
 
-            self.utils.log_message(f"正在爬取第{page_num}页...（当前已获取{len(all_data)}条）", self.config, log_widget)
+            self.utils.log_message(f"正在爬取第{page_num}页...（当前已获取{len(run['all_data'])}条）",
+                                   self.config, log_widget, low_priority=True)
 
-            page_data = self.get_page_data(page_num, keyword_encoded)
+            page_data = self.get_page_data(page_num, run["keyword_encoded"])
 
             if not page_data:
                 empty_page_count += 1
@@ -108,31 +285,54 @@ class NovelCrawler:
                     break
             else:
                 empty_page_count = 0
-                new_count = 0
+                if self._merge_page(run, page_num, page_data):
+                    break
 
-                for item in page_data:
-                    if item["链接"] not in seen_links:
-                        seen_links.add(item["链接"])
-                        all_data.append(item)
-                        new_count += 1
+            page_num += 1
 
-                        if not crawl_until_fail and len(all_data) >= max_novels:
-                            all_data = all_data[:max_novels]
-                            self.utils.log_message(f"✅ 已获取{max_novels}条数据，达到数量限制", self.config, log_widget)
-                            break
+    def _crawl_parallel(self, run: Dict, workers: int) -> None:
+        """并行爬取：第1页确定总页数后，其余页面并发获取，按页码顺序合并"""
+        keyword_encoded = run["keyword_encoded"]
+        log_widget = run["log_widget"]
 
-                self.utils.log_message(f"✅ 第{page_num}页爬取完成，新增{new_count}条（累计{len(all_data)}条）",
-                                       self.config, log_widget)
+        self.utils.log_message(f"正在爬取第1页...（并行模式，{workers}个线程）", self.config, log_widget)
+        page_data, total_pages = self.get_search_page(1, keyword_encoded)
 
-                if not crawl_until_fail and len(all_data) >= max_novels:
-                    break
+        if not page_data:
+            self.utils.log_message("❌ 第1页无数据，终止爬取", self.config, log_widget)
+            return
 
-            self.utils.log_message(f"等待2秒后继续...", self.config, log_widget)
-            time.sleep(2)
-            page_num += 1
+        if self._merge_page(run, 1, page_data):
+            return
 
-        self.utils.log_message(f"\n========== 爬取完成 ==========", self.config, log_widget)
-        self.utils.log_message(f"最终获取到 {len(all_data)} 本小说", self.config, log_widget)
+        if total_pages <= 0:
+            # 无法得知总页数时退回逐页爬取，直到遇到空页
+            self.utils.log_message("⚠️ 未能识别总页数，改为逐页爬取", self.config, log_widget)
+            self._crawl_sequential(run, start_page=2)
+            return
 
-        self.config.novel_data_list = all_data
-        return all_data
\ No newline at end of file
+        last_page = min(total_pages, self.MAX_PAGES)
+        self.utils.log_message(f"共{total_pages}页，并行获取第2-{last_page}页", self.config, log_widget)
+
+        pending: Dict[int, Future] = {}
+        next_submit = 2
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            for page_num in range(2, last_page + 1):
+                self._checkpoint(run)
+                while len(pending) < workers * 2 and next_submit <= last_page:
+                    pending[next_submit] = pool.submit(self._request_search_page, next_submit, keyword_encoded)
+                    next_submit += 1
+
+                page_data, _ = self._finish_search_page(pending.pop(page_num).result())
+                if not page_data:
+                    self.utils.log_message(f"❌ 第{page_num}页无数据", self.config, log_widget)
+                    continue
+
+                if self._merge_page(run, page_num, page_data):
+                    break
+        finally:
+            for future in pending.values():
+                future.cancel()
+            # 不等待在途请求：提前结束或取消时其结果已不再需要
+            pool.shutdown(wait=False)
\ No newline at end of file
@@ -0,0 +1,298 @@
+# download_queue.py - 多小说下载队列与调度
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+from downloader import NovelDownloader
+from exporter import BookExporter
+from job_control import JobControl
+from novel_record import NovelRecord
+from utils import LogTarget
+
+
+class FairSlots:
+    """全局章节请求名额（加权公平分配）
+
+    各任务按优先级加权轮流获得名额：每获得一次名额，任务的虚拟时间增加 1/优先级，
+    空出名额时总是分配给正在等待且虚拟时间最小的任务，因此大任务不会饿死小任务，
+    高优先级任务按比例获得更多名额。
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, int(limit))
+        self._free = self.limit
+        self._cond = threading.Condition()
+        self._waiting: Dict[int, int] = {}
+        self._vtime: Dict[int, float] = {}
+
+    def _next_job(self) -> Optional[int]:
+        """等待中且虚拟时间最小的任务"""
+        candidates = [job_id for job_id, count in self._waiting.items() if count > 0]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda job_id: (self._vtime[job_id], job_id))
+
+    def acquire(self, job_id: int, weight: float) -> None:
+        """为任务获取一个名额，不足或未轮到时阻塞"""
+        with self._cond:
+            if job_id not in self._vtime:
+                # 新任务从当前最小虚拟时间开始，避免积累"欠账"后连续抢占
+                self._vtime[job_id] = min(self._vtime.values(), default=0.0)
+            self._waiting[job_id] = self._waiting.get(job_id, 0) + 1
+            while not (self._free > 0 and self._next_job() == job_id):
+                self._cond.wait()
+            self._waiting[job_id] -= 1
+            self._free -= 1
+            self._vtime[job_id] += 1.0 / max(weight, 0.1)
+            self._cond.notify_all()
+
+    def release(self) -> None:
+        """归还名额"""
+        with self._cond:
+            self._free += 1
+            self._cond.notify_all()
+
+    def forget(self, job_id: int) -> None:
+        """任务结束后移除其记录"""
+        with self._cond:
+            self._waiting.pop(job_id, None)
+            self._vtime.pop(job_id, None)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, job_id: int, weight: float):
+        """以上下文管理器形式占用一个名额"""
+        self.acquire(job_id, weight)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class DownloadJob:
+    """下载任务"""
+
+    STATE_QUEUED = "等待中"
+    STATE_RUNNING = "下载中"
+    STATE_PAUSED = "已暂停"
+    STATE_CANCELLING = "取消中"
+    STATE_DONE = "已完成"
+    STATE_CANCELLED = "已取消"
+    STATE_FAILED = "失败"
+
+    def __init__(self, job_id: int, novel: NovelRecord, start_chapter: int, end_chapter: int,
+                 priority: int, resume: bool, export_format: str = ""):
+        self.job_id = job_id
+        self.novel = novel
+        self.start_chapter = start_chapter
+        self.end_chapter = end_chapter
+        self.priority = priority
+        self.resume = resume
+        self.export_format = export_format
+        self.export: Optional[Dict] = None
+        self.state = self.STATE_QUEUED
+        self.control = JobControl()
+        self.downloaded = 0
+        self.failed = 0
+        self.total = 0
+        self.last_chapter = 0
+        self.error = ""
+        self.summary: Optional[Dict] = None
+        self.started_at = 0.0
+        self.finished_at = 0.0
+
+    @property
+    def display_state(self) -> str:
+        """显示用状态（运行中的任务区分暂停、取消中）"""
+        if self.state == self.STATE_RUNNING:
+            if self.control.cancelled:
+                return self.STATE_CANCELLING
+            if self.control.paused:
+                return self.STATE_PAUSED
+        return self.state
+
+    def to_dict(self) -> Dict:
+        """任务状态快照"""
+        return {
+            "job_id": self.job_id,
+            "novelid": str(self.novel.novelid),
+            "name": self.novel.name,
+            "priority": self.priority,
+            "state": self.display_state,
+            "downloaded": self.downloaded,
+            "failed": self.failed,
+            "total": self.total,
+            "last_chapter": self.last_chapter,
+            "error": self.error
+        }
+
+
+class DownloadScheduler:
+    """下载队列调度器
+
+    - 最多同时运行 max_jobs 本小说，其余按优先级（数值越大越优先）排队；
+    - 所有运行中任务的章节请求共享 max_requests 个名额，按优先级加权公平分配；
+    - progress 回调（在任务线程中调用）接收各任务的章节事件，事件中附带 job_id 与 novelid；
+    - cancel / pause / resume 控制单个任务（job_id 为None时作用于全部任务），
+      shutdown 取消全部任务并等待运行中的任务写完当前章节、保存清单后退出。
+    """
+
+    def __init__(self, config, utils, max_jobs: Optional[int] = None,
+                 max_requests: Optional[int] = None, log_widget: Optional[LogTarget] = None,
+                 progress: Optional[Callable[[Dict], None]] = None):
+        self.config = config
+        self.utils = utils
+        self.downloader = NovelDownloader(config, utils)
+        self.max_jobs = max_jobs or config.max_download_jobs
+        self.slots = FairSlots(max_requests or config.max_chapter_requests)
+        self.log_widget = log_widget
+        self.progress = progress
+        self.jobs: List[DownloadJob] = []
+        self._heap: List = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._running = 0
+        self._closed = False
+        self._idle = threading.Condition(self._lock)
+
+    def submit(self, novel: NovelRecord, start_chapter: int = 1, end_chapter: int = 0,
+               priority: int = 5, resume: bool = True, export_format: str = "") -> DownloadJob:
+        """加入下载队列（export_format 为 txt / epub 时下载完成后导出整本）"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("下载队列已关闭")
+            job = DownloadJob(next(self._ids), novel, start_chapter, end_chapter, priority, resume,
+                              export_format)
+            self.jobs.append(job)
+            heapq.heappush(self._heap, (-priority, job.job_id, job))
+            self._dispatch()
+        return job
+
+    def _dispatch(self) -> None:
+        """启动排队任务直到达到并发上限（需持有锁）"""
+        while self._heap and self._running < self.max_jobs:
+            _, _, job = heapq.heappop(self._heap)
+            self._running += 1
+            job.state = DownloadJob.STATE_RUNNING
+            job.started_at = time.time()
+            threading.Thread(target=self._run_job, args=(job,), daemon=True).start()
+
+    def _run_job(self, job: DownloadJob) -> None:
+        """执行单个任务"""
+
+        # 按章节记录最近一次结果：重试成功、写入失败后重新下载等情况都不会重复计数
+        done_ids, failed_ids = set(), set()
+
+        def on_progress(event: Dict) -> None:
+            chapter_id = event["chapter_id"]
+            job.last_chapter = chapter_id
+            job.total = event.get("total", 0)
+            if event["ok"]:
+                done_ids.add(chapter_id)
+                failed_ids.discard(chapter_id)
+            else:
+                failed_ids.add(chapter_id)
+                done_ids.discard(chapter_id)
+            job.downloaded = len(done_ids)
+            job.failed = len(failed_ids)
+            if self.progress:
+                self.progress(dict(event, job_id=job.job_id, novelid=str(job.novel.novelid)))
+
+        try:
+            job.summary = self.downloader.download_novel_chapters(
+                str(job.novel.novelid), job.novel.name,
+                job.start_chapter, job.end_chapter, self.log_widget,
+                resume=job.resume, progress=on_progress,
+                gate=lambda: self.slots.slot(job.job_id, job.priority),
+                control=job.control
+            )
+            # 写入失败只体现在汇总中（没有单独的进度事件），结束时以汇总为准
+            job.downloaded = job.summary["downloaded"]
+            job.failed = job.summary["failed"]
+            if job.summary["cancelled"]:
+                job.state = DownloadJob.STATE_CANCELLED
+                return
+            if job.export_format and (job.summary["downloaded"] or job.summary["skipped"]):
+                self._export_job(job)
+            job.state = DownloadJob.STATE_DONE
+        except Exception as e:
+            job.error = str(e)
+            job.state = DownloadJob.STATE_FAILED
+            self.utils.log_message(f"❌ 《{job.novel.name}》下载出错：{str(e)}",
+                                   self.config, self.log_widget)
+        finally:
+            job.finished_at = time.time()
+            self.slots.forget(job.job_id)
+            with self._lock:
+                self._running -= 1
+                self._dispatch()
+                self._idle.notify_all()
+
+    def _export_job(self, job: DownloadJob) -> None:
+        """导出任务对应的整本书（只追加新下载的章节）"""
+        exporter = BookExporter(job.summary["save_dir"], self.utils.safe_filename(job.summary["novel_name"]),
+                                str(job.novel.novelid), store_kind=self.config.storage_backend)
+        job.export = exporter.export(job.export_format)
+        action = "重建" if job.export["rebuilt"] else "追加"
+        self.utils.log_message(f"✅ 《{job.summary['novel_name']}》已导出{job.export_format.upper()}"
+                               f"（{action}{job.export['appended']}章，共{job.export['chapters']}章）：{job.export['path']}",
+                               self.config, self.log_widget)
+
+    def _select(self, job_id: Optional[int]) -> List[DownloadJob]:
+        """按ID选择任务（None 表示全部，需持有锁）"""
+        return [job for job in self.jobs if job_id is None or job.job_id == job_id]
+
+    def cancel(self, job_id: Optional[int] = None) -> None:
+        """取消任务：排队中的直接移出队列，运行中的在当前章节写完后停止"""
+        with self._lock:
+            for job in self._select(job_id):
+                if job.state == DownloadJob.STATE_QUEUED:
+                    job.state = DownloadJob.STATE_CANCELLED
+                    job.finished_at = time.time()
+                job.control.cancel()
+            self._heap = [entry for entry in self._heap if entry[2].state == DownloadJob.STATE_QUEUED]
+            heapq.heapify(self._heap)
+            self._idle.notify_all()
+
+    def pause(self, job_id: Optional[int] = None) -> None:
+        """暂停任务（排队中的任务开始运行后也会立即暂停），暂停的任务仍占用运行名额"""
+        with self._lock:
+            for job in self._select(job_id):
+                job.control.pause()
+
+    def resume(self, job_id: Optional[int] = None) -> None:
+        """恢复暂停的任务"""
+        with self._lock:
+            for job in self._select(job_id):
+                job.control.resume()
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None) -> bool:
+        """关闭队列：不再接受新任务并取消全部任务；wait 为True时等待运行中的任务结束，返回是否已全部结束"""
+        with self._lock:
+            self._closed = True
+        self.cancel()
+        return self.wait(timeout) if wait else self.is_idle()
+
+    def snapshot(self) -> List[Dict]:
+        """所有任务的状态快照"""
+        with self._lock:
+            return [job.to_dict() for job in self.jobs]
+
+    def is_idle(self) -> bool:
+        """队列是否已清空且无运行中任务"""
+        with self._lock:
+            return not self._heap and self._running == 0
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待队列全部完成，返回是否完成"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._heap or self._running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
@@ -1,47 +1,196 @@
 # downloader.py - 下载器核心功能
+import itertools
 import os
+import random
 import time
-import requests
-from bs4 import BeautifulSoup
-from typing import Optional
-import tkinter as tk
-from tkinter import scrolledtext, messagebox
-
-# 屏蔽SSL警告
-try:
-    import urllib3
-
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-except ImportError:
-    pass
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Iterable, Iterator, List, Optional, Dict, Set
+from chapter_store import open_store
+from chapter_writer import ChapterWriter
+from event_stream import iter_events
+from job_control import JobCancelled, JobControl
+from manifest import ChapterManifest
+from parse_pool import parse_result, submit_parse
+from utils import LogTarget
 
 
 class NovelDownloader:
     """小说下载类"""
 
+    # 视为暂时性失败、可稍后重试的状态码
+    RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+    # 下载结束时日志中逐条列出的缺失章节数上限
+    MISSING_LOG_LIMIT = 50
+
     def __init__(self, config, utils):
         self.config = config
         self.utils = utils
 
+    def _chapter_url(self, novel_id: str, chapter_id: int) -> str:
+        """生成章节链接"""
+        return f"{self.config.CHAPTER_URL}?novelid={novel_id}&chapterid={chapter_id}"
+
+    def fetch_chapter_index(self, novel_id: str, gate: Optional[Callable] = None) -> List[Dict]:
+        """获取小说目录，返回按章节号排序的 [{"chapter_id", "title"}]，获取失败时返回空列表"""
+        toc_url = f"{self.config.CHAPTER_URL}?novelid={novel_id}"
+        try:
+            with (gate() if gate else nullcontext()):
+                response = self.config.http.get(toc_url, cache_kind="toc")
+            if response.status_code != 200:
+                return []
+
+            chapters = parse_result(self._submit_parse("toc", response, novel_id))
+        except Exception:
+            return []
+
+        if not chapters:
+            self.config.http.discard_cached(toc_url)
+        return [{"chapter_id": chapter_id, "title": title} for chapter_id, title in chapters]
+
+    def _submit_parse(self, kind: str, response, *args):
+        """把响应交给解析阶段（解析进程池或当前线程），返回解析Future"""
+        return submit_parse(self.config.parse_pool, self.config.parser, kind, response.content,
+                            response.headers.get("Content-Type", ""), *args)
+
+    def _fetch_chapter(self, novel_id: str, chapter_id: int,
+                       gate: Optional[Callable] = None) -> Dict:
+        """下载并解析单个章节，返回结果字典（不写文件）"""
+        return self._finish_chapter(self._request_chapter(novel_id, chapter_id, gate))
+
+    def _request_chapter(self, novel_id: str, chapter_id: int,
+                         gate: Optional[Callable] = None) -> Dict:
+        """章节的网络阶段：请求页面并提交解析，结果字典中的 parsing 为解析Future
+
+        gate 为返回上下文管理器的函数（如调度器的请求名额），请求期间保持占用。
+        """
+        result = {"chapter_id": chapter_id, "ok": False, "title": "", "content": "", "error": "",
+                  "retryable": False}
+        try:
+            chapter_url = self._chapter_url(novel_id, chapter_id)
+            with (gate() if gate else nullcontext()):
+                response = self.config.http.get(chapter_url, cache_kind="chapter")
+
+            if response.status_code != 200:
+                result["error"] = f"下载失败（状态码：{response.status_code}）"
+                result["retryable"] = response.status_code in self.RETRY_STATUS
+                return result
+
+            result["url"] = chapter_url
+            result["parsing"] = self._submit_parse("chapter", response)
+        except Exception as e:
+            result["error"] = f"下载异常：{str(e)}"
+            result["exception"] = True
+            result["retryable"] = True
+        return result
+
+    def _finish_chapter(self, result: Dict) -> Dict:
+        """章节的解析阶段：等待解析完成并填入标题与正文"""
+        parsing = result.pop("parsing", None)
+        if parsing is None:
+            return result
+        chapter_id = result["chapter_id"]
+        try:
+            parsed = parse_result(parsing, self.config.metrics)
+            if parsed is None:
+                self.config.http.discard_cached(result["url"])
+                result["error"] = "无内容"
+                return result
+
+            chapter_title, chapter_content = parsed
+            result["title"] = chapter_title if chapter_title is not None else f"第{chapter_id}章"
+            result["content"] = chapter_content
+            result["ok"] = True
+        except Exception as e:
+            result["error"] = f"解析异常：{str(e)}"
+            result["exception"] = True
+        return result
+
     def download_novel_chapters(self, novel_id: str, novel_name: str,
                                 start_chapter: int, end_chapter: int,
-                                log_widget: Optional[scrolledtext.ScrolledText] = None) -> None:
-        """下载小说章节"""
+                                log_widget: Optional[LogTarget] = None,
+                                workers: Optional[int] = None,
+                                resume: bool = False,
+                                progress: Optional[Callable[[Dict], None]] = None,
+                                gate: Optional[Callable] = None,
+                                use_index: bool = True,
+                                control: Optional[JobControl] = None,
+                                chapter_ids: Optional[List[int]] = None) -> Dict:
+        """下载小说章节，返回下载汇总
+
+        use_index 为True时先读取目录页得到准确的章节列表，只请求范围内存在的章节，
+        中间个别章节失败（锁章、缺章）不会提前结束；目录读取失败时退回逐章探测，
+        连续3章失败视为结束。
+        workers 大于1时启用并发下载：多个章节同时请求（受每主机请求预算限制），
+        结果按章节顺序写入和记录日志。
+        resume 为True时根据保存目录中的下载清单跳过已完整写入的章节，只请求缺失或失败的章节。
+        章节由独立的写入线程批量、原子地写入存储（见 ChapterWriter），下载清单只记录已落盘的章节。
+        主流程结束后，暂时性失败（超时、连接错误、5xx/429）的章节进入重试队列，按指数退避重试，
+        每章最多尝试 config.chapter_attempts 次；汇总中的 missing 列出仍缺失的章节及原因。
+        progress 回调按章节顺序接收事件字典：{"event": "chapter", "chapter_id", "ok", "title", "error", "total", "attempt"}，
+        total 为计划下载的章节数（逐章探测时为0），attempt 为该章第几次尝试（重试时大于1）。
+        gate 为每次章节请求前进入的上下文管理器工厂（供下载队列限制全局并发）。
+        control 为任务控制令牌：每章提交前检查，暂停时等待，取消时在当前章节写完后停止，
+        保存清单并返回汇总（cancelled 为True）。
+        chapter_ids 指定要下载的章节（如工作队列已按目录拆分好的章节）：不再读取目录页，
+        只请求这些章节，start_chapter / end_chapter 仅用于日志。
+        """
         if not novel_id:
-            messagebox.showerror("错误", "小说ID为空，无法下载！")
-            return
+            raise ValueError("小说ID为空，无法下载！")
 
         if start_chapter < 1:
             start_chapter = 1
             self.utils.log_message("⚠️ 开始章节不能小于1，自动设为1", self.config, log_widget)
 
+        if workers is None:
+            workers = self.config.download_workers
+
         safe_name = self.utils.safe_filename(novel_name)
         save_dir = os.path.join(self.config.save_path, safe_name)
         os.makedirs(save_dir, exist_ok=True)
 
-        chapter_id = start_chapter
-        fail_count = 0
-        total_downloaded = 0
+        manifest = ChapterManifest(save_dir, novel_id)
+        store = open_store(self.config.storage_backend, save_dir, fsync=self.config.durable_writes)
+        skip: Set[int] = set()
+        if resume:
+            skip = {int(cid) for cid in manifest.chapters if manifest.is_done(int(cid), store)}
+
+        index = self.fetch_chapter_index(novel_id, gate) if use_index and chapter_ids is None else []
+        if chapter_ids is not None:
+            plan = sorted(chapter_ids)
+            fail_limit = 0
+        elif index:
+            plan: Iterable[int] = [item["chapter_id"] for item in index
+                                   if item["chapter_id"] >= start_chapter
+                                   and (end_chapter <= 0 or item["chapter_id"] <= end_chapter)]
+            fail_limit = 0
+        elif end_chapter > 0:
+            plan = range(start_chapter, end_chapter + 1)
+            fail_limit = 3
+        else:
+            plan = itertools.count(start_chapter)
+            fail_limit = 3
+        total = len(plan) if index or chapter_ids is not None else 0
+
+        run = {
+            "novel_id": novel_id,
+            "save_dir": save_dir,
+            "log_widget": log_widget,
+            "progress": progress,
+            "gate": gate,
+            "manifest": manifest,
+            "store": store,
+            "writer": ChapterWriter(store, manifest, self.config.metrics,
+                                    self.config.write_queue_size, self.config.write_batch_size),
+            "skip": skip,
+            "total": total,
+            "control": control,
+            "downloaded": 0,
+            "failures": {},
+            "retried": 0
+        }
 
         self.utils.log_message(f"\n========== 开始下载《{novel_name}》 ==========", self.config, log_widget)
         self.utils.log_message(f"保存路径：{save_dir}", self.config, log_widget)
@@ -51,64 +200,284 @@ class NovelDownloader:
         else:
             self.utils.log_message(f"下载范围：第{start_chapter}章到最后一章", self.config, log_widget)
 
-        while fail_count < 3:
-            if end_chapter > 0 and chapter_id > end_chapter:
+        if index:
+            self.utils.log_message(f"目录共{len(index)}章，计划下载{total}章", self.config, log_widget)
+        elif use_index:
+            self.utils.log_message("⚠️ 未能读取目录，改为逐章探测（连续3章失败视为结束）", self.config, log_widget)
+
+        if resume:
+            self.utils.log_message(f"断点续传：清单中已有{len(skip)}章，将跳过", self.config, log_widget)
+
+        cancelled = False
+        try:
+            if workers > 1:
+                self.utils.log_message(f"并发下载：{workers}个线程", self.config, log_widget)
+            self._download_pass(run, plan, fail_limit, workers)
+            while self._retry_failed(run, workers):
+                # 逐章探测因连续失败停止，但停止处的失败章节重试成功：尚未到达末章，从停止处继续
+                resume_from = run.pop("stopped_at") + 1
+                self.utils.log_message(f"结尾章节重试成功，从第{resume_from}章继续下载", self.config, log_widget)
+                plan = range(resume_from, end_chapter + 1) if end_chapter > 0 else itertools.count(resume_from)
+                self._download_pass(run, plan, fail_limit, workers)
+        except JobCancelled:
+            cancelled = True
+        finally:
+            # 写完已提交的章节后再保存清单、关闭存储（取消时同样等待在途写入完成）
+            run["writer"].close()
+            self._collect_write_errors(run)
+            manifest.save()
+            store.close()
+
+        if run.get("stopped_at"):
+            # 逐章探测结尾连续无内容的章节视为超出末章，不计入缺失
+            for chapter_id in range(run["stopped_at"] - fail_limit + 1, run["stopped_at"] + 1):
+                failure = run["failures"].get(chapter_id)
+                if failure is not None and not failure["retryable"]:
+                    del run["failures"][chapter_id]
+
+        total_downloaded = run["downloaded"]
+        missing = [{"chapter_id": chapter_id, "error": failure["error"], "attempts": failure["attempts"]}
+                   for chapter_id, failure in sorted(run["failures"].items())]
+        if cancelled:
+            self.utils.log_message("\n⚠️ 下载已取消（已下载的章节与清单已保存，可断点续传）", self.config, log_widget)
+        else:
+            self.utils.log_message("\n========== 下载完成 ==========", self.config, log_widget)
+        self.utils.log_message(f"共成功下载 {total_downloaded} 章", self.config, log_widget)
+        if run["retried"]:
+            self.utils.log_message(f"重试成功 {run['retried']} 章", self.config, log_widget)
+        self._log_missing(missing, log_widget)
+        self.utils.log_message(f"文件保存至：{save_dir}", self.config, log_widget)
+        write_stats = run["writer"].stats()
+        self.utils.log_message(f"写入统计：{write_stats['written']}章，{write_stats['batches']}批，"
+                               f"平均每批{write_stats['batch_ms']}ms，队列峰值{write_stats['peak_depth']}",
+                               self.config, log_widget)
+        http_stats = self.config.http.stats()
+        self.utils.log_message(f"连接统计：新建{http_stats['opened']}个，复用{http_stats['reused']}次",
+                               self.config, log_widget)
+        if self.config.cache is not None:
+            cache_stats = self.config.cache.stats()
+            self.utils.log_message(f"缓存统计：命中{cache_stats['hits']}次，未命中{cache_stats['misses']}次",
+                                   self.config, log_widget)
+        for host, rate in self.config.current_rates().items():
+            self.utils.log_message(f"当前请求速率：{host} {rate}次/秒", self.config, log_widget)
+
+        return {
+            "novel_id": novel_id,
+            "novel_name": novel_name,
+            "save_dir": save_dir,
+            "planned": total,
+            "downloaded": total_downloaded,
+            "skipped": len(skip),
+            "failed": len(missing),
+            "retried": run["retried"],
+            "missing": missing,
+            "cancelled": cancelled
+        }
+
+    def iter_download(self, novel_id: str, novel_name: str,
+                      start_chapter: int = 1, end_chapter: int = 0,
+                      log_widget: Optional[LogTarget] = None,
+                      workers: Optional[int] = None,
+                      resume: bool = False,
+                      gate: Optional[Callable] = None,
+                      control: Optional[JobControl] = None) -> Iterator[Dict]:
+        """以生成器形式下载：按章节顺序产出 chapter 事件，最后产出 {"event": "done", "result": 下载汇总}
+
+        提前关闭生成器会在下一章提交时终止下载（已写入的章节和清单保留）。
+        """
+        return iter_events(lambda progress: self.download_novel_chapters(
+            novel_id, novel_name, start_chapter, end_chapter, log_widget,
+            workers=workers, resume=resume, progress=progress, gate=gate, control=control
+        ))
+
+    def _log_missing(self, missing: List[Dict], log_widget: Optional[LogTarget]) -> None:
+        """记录仍缺失的章节及原因"""
+        if not missing:
+            return
+        self.utils.log_message(f"❌ 仍有 {len(missing)} 章未能下载：", self.config, log_widget)
+        for item in missing[:self.MISSING_LOG_LIMIT]:
+            self.utils.log_message(f"   第{item['chapter_id']}章：{item['error']}（已尝试{item['attempts']}次）",
+                                   self.config, log_widget)
+        if len(missing) > self.MISSING_LOG_LIMIT:
+            self.utils.log_message(f"   ……其余{len(missing) - self.MISSING_LOG_LIMIT}章见下载清单",
+                                   self.config, log_widget)
+
+    def _retry_failed(self, run: Dict, workers: int) -> bool:
+        """重试队列：对暂时性失败的章节按指数退避（加随机抖动）分轮重试
+
+        第N轮重试前等待 retry_backoff * 2^(N-1) 秒（不超过 retry_backoff_max），再乘以0.5-1.5的随机系数，
+        避免多本小说同时重试；每章尝试次数达到 config.chapter_attempts 后不再重试。
+        返回逐章探测是否需要从停止处继续（停止处的失败章节重试成功时）。
+        """
+        log_widget = run["log_widget"]
+        round_num = 0
+        while True:
+            # 写入失败的章节也进入重试队列
+            run["writer"].flush()
+            self._collect_write_errors(run)
+            retry_ids = sorted(chapter_id for chapter_id, failure in run["failures"].items()
+                               if failure["retryable"] and failure["attempts"] < self.config.chapter_attempts)
+            if not retry_ids:
                 break
 
-            try:
-                chapter_url = f"https://www.jjwxc.net/onebook.php?novelid={novel_id}&chapterid={chapter_id}"
-                response = requests.get(chapter_url, headers=self.config.HEADERS,
-                                        timeout=10, verify=False)
+            round_num += 1
+            delay = min(self.config.retry_backoff_max, self.config.retry_backoff * 2 ** (round_num - 1))
+            delay *= random.uniform(0.5, 1.5)
+            self.utils.log_message(f"⚠️ {len(retry_ids)}章暂时失败，{delay:.1f}秒后第{round_num}轮重试",
+                                   self.config, log_widget)
+            if run["control"] is not None:
+                run["control"].sleep(delay)
+            else:
+                time.sleep(delay)
+            self._download_pass(run, retry_ids, 0, workers)
 
-                if response.status_code != 200:
-                    fail_count += 1
-                    self.utils.log_message(f"❌ 第{chapter_id}章下载失败（状态码：{response.status_code}）", self.config,
-                                           log_widget)
-                    chapter_id += 1
-                    time.sleep(1)
-                    continue
+        stopped_at = run.get("stopped_at")
+        if not stopped_at:
+            return False
+        return stopped_at not in run["failures"]
 
-                response.encoding = response.apparent_encoding or "gbk"
-                soup = BeautifulSoup(response.text, "html.parser")
-                novel_body = soup.find("div", class_="novelbody")
+    @staticmethod
+    def _checkpoint(run: Dict) -> None:
+        """任务检查点：暂停时等待，已取消时抛出 JobCancelled"""
+        if run["control"] is not None:
+            run["control"].checkpoint()
 
-                if not novel_body:
-                    fail_count += 1
-                    self.utils.log_message(f"❌ 第{chapter_id}章无内容", self.config, log_widget)
-                    chapter_id += 1
-                    time.sleep(1)
-                    continue
+    def _download_pass(self, run: Dict, plan: Iterable[int], fail_limit: int, workers: int) -> None:
+        """按计划下载一遍（并发或逐章）"""
+        if workers > 1:
+            self._download_concurrent(run, plan, fail_limit, workers)
+        else:
+            self._download_sequential(run, plan, fail_limit)
 
-                chapter_title = soup.find("h2").get_text(strip=True) if soup.find("h2") else f"第{chapter_id}章"
-                chapter_content = novel_body.get_text(separator="\n", strip=True)
+    def _collect_write_errors(self, run: Dict) -> None:
+        """把写入失败的章节转入失败表（之后由重试队列重新下载），并撤销交给写入阶段时的成功计数"""
+        metrics = self.config.metrics
+        for result in run["writer"].take_errors():
+            chapter_id = result["chapter_id"]
+            run["downloaded"] -= 1
+            metrics.add("chapters", -1)
+            if result["attempt"] > 1:
+                run["retried"] -= 1
+                metrics.add("chapter_retry_successes", -1)
+            run["failures"][chapter_id] = {"error": result["error"], "retryable": True,
+                                           "attempts": result["attempt"]}
+            run["manifest"].record_failure(chapter_id, result["error"])
+            self.utils.log_message(f"❌ 第{chapter_id}章{result['error']}", self.config, run["log_widget"])
 
-                chapter_file = os.path.join(
-                    save_dir,
-                    f"{chapter_id}_{chapter_title.replace('/', '_').replace('\\', '_')}.txt"
-                )
+    def _commit_chapter(self, run: Dict, result: Dict) -> bool:
+        """按顺序处理单个章节结果：成功则交给写入阶段，失败则记录日志并记入失败表（供重试队列使用）"""
+        chapter_id = result["chapter_id"]
+        log_widget = run["log_widget"]
+        self._collect_write_errors(run)
+        failure = run["failures"].get(chapter_id)
+        attempt = failure["attempts"] + 1 if failure else 1
+        result["attempt"] = attempt
+        try:
+            if result["ok"]:
+                run["writer"].put(result)
+                self.utils.log_message(f"✅ 第{chapter_id}章下载成功：{result['title']}", self.config, log_widget,
+                                       low_priority=True)
+            else:
+                run["manifest"].record_failure(chapter_id, result["error"])
+                self.utils.log_message(f"❌ 第{chapter_id}章{result['error']}", self.config, log_widget)
+        except Exception as e:
+            result["ok"] = False
+            result["exception"] = True
+            result["error"] = f"下载异常：{str(e)}"
+            self.utils.log_message(f"❌ 第{chapter_id}章{result['error']}", self.config, log_widget)
 
-                with open(chapter_file, "w", encoding="utf-8") as f:
-                    f.write(f"{chapter_title}\n\n{chapter_content}")
+        if result["ok"]:
+            run["downloaded"] += 1
+            self.config.metrics.add("chapters")
+            if failure:
+                del run["failures"][chapter_id]
+                run["retried"] += 1
+                self.config.metrics.add("chapter_retry_successes")
+        else:
+            run["failures"][chapter_id] = {"error": result["error"], "retryable": result.get("retryable", False),
+                                           "attempts": attempt}
+            self.config.metrics.add("chapter_failures")
 
-                fail_count = 0
-                total_downloaded += 1
-                self.utils.log_message(f"✅ 第{chapter_id}章下载成功：{chapter_title}", self.config, log_widget)
+        if run["progress"]:
+            run["progress"]({
+                "event": "chapter",
+                "chapter_id": chapter_id,
+                "ok": result["ok"],
+                "title": result["title"],
+                "error": result["error"],
+                "total": run["total"],
+                "attempt": attempt
+            })
+        return result["ok"]
 
-                chapter_id += 1
-                time.sleep(1.5)
+    def _download_sequential(self, run: Dict, plan: Iterable[int], fail_limit: int) -> None:
+        """按计划逐章下载（跳过 run["skip"] 中的章节）
 
-            except Exception as e:
-                fail_count += 1
-                self.utils.log_message(f"❌ 第{chapter_id}章下载异常：{str(e)}", self.config, log_widget)
-                chapter_id += 1
-                time.sleep(2)
+        fail_limit 大于0时，连续失败达到该次数即视为全书结束，停止处的章节号记入 run["stopped_at"]。
+        """
+        fail_count = 0
+
+        for chapter_id in plan:
+            self._checkpoint(run)
+            if chapter_id in run["skip"]:
+                fail_count = 0
                 continue
 
-        self.utils.log_message(f"\n========== 下载完成 ==========", self.config, log_widget)
-        self.utils.log_message(f"共成功下载 {total_downloaded} 章", self.config, log_widget)
-        self.utils.log_message(f"文件保存至：{save_dir}", self.config, log_widget)
+            result = self._fetch_chapter(run["novel_id"], chapter_id, gate=run["gate"])
+            if self._commit_chapter(run, result):
+                fail_count = 0
+            else:
+                fail_count += 1
+                if fail_limit and fail_count >= fail_limit:
+                    run["stopped_at"] = chapter_id
+                    break
+
+    def _download_concurrent(self, run: Dict, plan: Iterable[int], fail_limit: int, workers: int) -> None:
+        """并发下载：章节乱序到达，按计划顺序提交
 
-        messagebox.showinfo(
-            "完成",
-            f"《{novel_name}》下载完成！\n共下载 {total_downloaded} 章\n保存路径：{save_dir}"
-        )
\ No newline at end of file
+        网络线程只负责请求并提交解析（启用解析进程池时解析在子进程中进行），提交端按顺序等待解析结果；
+        在途章节数不超过 workers * 2。
+        提交端按计划顺序消费结果，因此"连续 fail_limit 章失败视为结束"的判断与逐章下载一致；
+        判定结束后，已在途的后续章节结果被丢弃。
+        """
+        window = workers * 2
+        plan = iter(plan)
+        pending = deque()
+        fail_count = 0
+
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            while True:
+                self._checkpoint(run)
+                while len(pending) < window:
+                    chapter_id = next(plan, None)
+                    if chapter_id is None:
+                        break
+                    if chapter_id in run["skip"]:
+                        pending.append(None)
+                    else:
+                        pending.append(pool.submit(self._request_chapter, run["novel_id"],
+                                                   chapter_id, run["gate"]))
+
+                if not pending:
+                    break
+
+                future: Optional[Future] = pending.popleft()
+                if future is None:
+                    fail_count = 0
+                    continue
+
+                result = self._finish_chapter(future.result())
+                if self._commit_chapter(run, result):
+                    fail_count = 0
+                else:
+                    fail_count += 1
+                    if fail_limit and fail_count >= fail_limit:
+                        run["stopped_at"] = result["chapter_id"]
+                        break
+        finally:
+            for future in pending:
+                if future is not None:
+                    future.cancel()
+            # 不等待在途请求：其结果已不再需要，取消时尽快保存清单
+            pool.shutdown(wait=False)
\ No newline at end of file
@@ -0,0 +1,53 @@
+# event_stream.py - 把进度回调转换为事件生成器
+import queue
+import threading
+from typing import Callable, Dict, Iterator
+
+
+class StreamClosed(Exception):
+    """消费端已关闭生成器，用于中止生产端"""
+
+
+def iter_events(run: Callable[[Callable[[Dict], None]], object], maxsize: int = 256) -> Iterator[Dict]:
+    """在后台线程执行 run(progress)，边执行边产出 progress 收到的事件
+
+    全部完成后产出 {"event": "done", "result": run的返回值}；run 抛出的异常在消费端重新抛出。
+    事件队列有界，消费端处理慢时生产端在回调处阻塞；生成器被提前关闭时，生产端在下一次回调时中止。
+    """
+    events: queue.Queue = queue.Queue(maxsize)
+    closed = threading.Event()
+
+    def put(item) -> None:
+        while not closed.is_set():
+            try:
+                events.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise StreamClosed()
+
+    def worker() -> None:
+        try:
+            result = run(lambda event: put(("event", event)))
+            put(("done", result))
+        except StreamClosed:
+            pass
+        except BaseException as e:
+            try:
+                put(("error", e))
+            except StreamClosed:
+                pass
+
+    threading.Thread(target=worker, daemon=True).start()
+    try:
+        while True:
+            kind, payload = events.get()
+            if kind == "event":
+                yield payload
+            elif kind == "done":
+                yield {"event": "done", "result": payload}
+                return
+            else:
+                raise payload
+    finally:
+        closed.set()
@@ -0,0 +1,255 @@
+# exporter.py - 整本导出（合并TXT / EPUB）
+import hashlib
+import html
+import json
+import os
+import shutil
+import time
+import zipfile
+from typing import Dict, List, Optional
+
+from chapter_store import ChapterStore, detect_store_kind, open_store
+
+
+class BookExporter:
+    """把小说目录中的章节按章节号顺序流式合并为一本书
+
+    每次只读取一个章节，内存占用与全书长度无关；导出状态记录在 .export.json 中，
+    再次导出时若已导出的章节都未变化且新增章节都排在最后，只追加新增章节，否则整本重建。
+    """
+
+    FORMATS = ("txt", "epub")
+    STATE_FILE = ".export.json"
+
+    def __init__(self, save_dir: str, book_name: str, novel_id: str = "",
+                 output_dir: Optional[str] = None, store_kind: str = ""):
+        self.save_dir = save_dir
+        self.book_name = book_name
+        self.novel_id = novel_id
+        self.output_dir = output_dir or os.path.dirname(os.path.abspath(save_dir))
+        self.store_kind = store_kind or detect_store_kind(save_dir)
+        self.state_path = os.path.join(save_dir, self.STATE_FILE)
+
+    def output_path(self, fmt: str) -> str:
+        """导出文件路径"""
+        return os.path.join(self.output_dir, f"{self.book_name}.{fmt}")
+
+    def _load_state(self) -> Dict:
+        """读取导出状态（不存在或损坏时为空）"""
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state: Dict) -> None:
+        """原子写入导出状态"""
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def _chapter_hashes(self) -> Dict[str, str]:
+        """下载清单中各章节的内容哈希（用于判断已导出章节是否变化）"""
+        from manifest import ChapterManifest
+        manifest = ChapterManifest(self.save_dir, self.novel_id)
+        return {cid: entry.get("sha256", "") for cid, entry in manifest.chapters.items()}
+
+    def export(self, fmt: str = "txt", incremental: bool = True) -> Dict:
+        """导出整本书，返回导出汇总
+
+        汇总字段：format、path、chapters（总章数）、appended（本次写入章数）、rebuilt（是否整本重建）、
+        bytes（文件大小）、seconds（耗时）。
+        """
+        if fmt not in self.FORMATS:
+            raise ValueError(f"不支持的导出格式：{fmt}（可选：{'、'.join(self.FORMATS)}）")
+        if not self.store_kind:
+            raise ValueError(f"目录中没有已下载的章节：{self.save_dir}")
+
+        started = time.perf_counter()
+        path = self.output_path(fmt)
+        store = open_store(self.store_kind, self.save_dir)
+        try:
+            chapter_ids = store.chapter_ids()
+            stored = set(chapter_ids)
+            hashes = self._chapter_hashes()
+            state = self._load_state()
+            previous = state.get(fmt, {})
+
+            exported: Dict[str, str] = previous.get("chapters", {}) if incremental else {}
+            new_ids = [cid for cid in chapter_ids if str(cid) not in exported]
+            rebuild = (
+                not exported
+                or previous.get("path") != path
+                or previous.get("store") != self.store_kind
+                or _file_size(path) != previous.get("bytes")
+                or any(hashes.get(cid, "") != sha for cid, sha in exported.items())
+                or any(int(cid) not in stored for cid in exported)
+                or (new_ids and exported and new_ids[0] < max(int(cid) for cid in exported))
+            )
+            if rebuild:
+                exported = {}
+                new_ids = chapter_ids
+
+            if fmt == "txt":
+                self._write_txt(store, path, new_ids, append=not rebuild)
+            else:
+                self._write_epub(store, path, chapter_ids, new_ids, copy_existing=not rebuild)
+
+            for cid in new_ids:
+                exported[str(cid)] = hashes.get(str(cid), "")
+            state[fmt] = {"path": path, "store": self.store_kind, "chapters": exported,
+                          "bytes": _file_size(path)}
+            self._save_state(state)
+        finally:
+            store.close()
+
+        return {
+            "format": fmt,
+            "path": path,
+            "chapters": len(chapter_ids),
+            "appended": len(new_ids),
+            "rebuilt": rebuild,
+            "bytes": _file_size(path),
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+
+    # ---------- TXT ----------
+
+    def _write_txt(self, store: ChapterStore, path: str, chapter_ids: List[int], append: bool) -> None:
+        """写入合并TXT：append 为True时追加到现有文件末尾，否则写临时文件后替换"""
+        target = path if append else path + ".tmp"
+        with open(target, "ab" if append else "wb") as f:
+            if not append:
+                f.write(_encode_text(f"{self.book_name}\n\n"))
+            for chapter_id in chapter_ids:
+                chapter = store.read(chapter_id)
+                if chapter is None:
+                    continue
+                title, content = chapter
+                f.write(_encode_text(f"\n{title}\n\n{content}\n"))
+        if not append:
+            os.replace(target, path)
+
+    # ---------- EPUB ----------
+
+    def _write_epub(self, store: ChapterStore, path: str, chapter_ids: List[int],
+                    new_ids: List[int], copy_existing: bool) -> None:
+        """写入EPUB：已导出的章节从旧文件逐个复制，只渲染新增章节，目录与清单每次重写"""
+        new_set = set(new_ids)
+        titles: Dict[int, str] = {}
+        tmp_path = path + ".tmp"
+
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as book:
+            book.writestr(zipfile.ZipInfo("mimetype"), "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+            book.writestr("META-INF/container.xml", _CONTAINER_XML)
+
+            old = zipfile.ZipFile(path) if copy_existing and os.path.exists(path) else None
+            try:
+                for chapter_id in chapter_ids:
+                    name = _chapter_name(chapter_id)
+                    if chapter_id not in new_set and old is not None:
+                        titles[chapter_id] = _old_title(old, chapter_id)
+                        with old.open(name) as src, book.open(name, "w") as dst:
+                            shutil.copyfileobj(src, dst)
+                        continue
+
+                    chapter = store.read(chapter_id)
+                    if chapter is None:
+                        continue
+                    title, content = chapter
+                    titles[chapter_id] = title
+                    book.writestr(name, _chapter_xhtml(title, content))
+            finally:
+                if old is not None:
+                    old.close()
+
+            book.writestr("OEBPS/nav.xhtml", _nav_xhtml(self.book_name, titles))
+            book.writestr("OEBPS/content.opf", _content_opf(self.book_name, self.novel_id, titles))
+
+        os.replace(tmp_path, path)
+
+
+def _file_size(path: str) -> int:
+    """文件大小（不存在时为-1）"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return -1
+
+
+def _encode_text(text: str) -> bytes:
+    """按平台换行编码为UTF-8（与章节文件一致）"""
+    return text.replace("\n", os.linesep).encode("utf-8")
+
+
+def _chapter_name(chapter_id: int) -> str:
+    """EPUB中的章节文件名"""
+    return f"OEBPS/text/ch{chapter_id}.xhtml"
+
+
+def _old_title(book: zipfile.ZipFile, chapter_id: int) -> str:
+    """从旧EPUB的章节页读取标题"""
+    with book.open(_chapter_name(chapter_id)) as f:
+        head = f.read(4096).decode("utf-8", errors="ignore")
+    start = head.find("<title>")
+    end = head.find("</title>", start)
+    return html.unescape(head[start + 7:end]) if start >= 0 and end > start else f"第{chapter_id}章"
+
+
+def _chapter_xhtml(title: str, content: str) -> str:
+    """章节页XHTML"""
+    paragraphs = "\n".join(f"<p>{html.escape(line)}</p>" for line in content.split("\n") if line.strip())
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<!DOCTYPE html>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="zh-CN">\n'
+        f'<head><title>{html.escape(title)}</title></head>\n'
+        f'<body>\n<h2>{html.escape(title)}</h2>\n{paragraphs}\n</body>\n</html>\n'
+    )
+
+
+def _nav_xhtml(book_name: str, titles: Dict[int, str]) -> str:
+    """EPUB3目录页"""
+    items = "\n".join(f'<li><a href="text/ch{cid}.xhtml">{html.escape(title)}</a></li>'
+                      for cid, title in titles.items())
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<!DOCTYPE html>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" xml:lang="zh-CN">\n'
+        f'<head><title>{html.escape(book_name)}</title></head>\n'
+        f'<body>\n<nav epub:type="toc" id="toc"><h1>目录</h1>\n<ol>\n{items}\n</ol>\n</nav>\n</body>\n</html>\n'
+    )
+
+
+def _content_opf(book_name: str, novel_id: str, titles: Dict[int, str]) -> str:
+    """EPUB3包文件（元数据、清单与阅读顺序）"""
+    identifier = f"jjwxc-{novel_id}" if novel_id else "book-" + hashlib.sha1(book_name.encode("utf-8")).hexdigest()
+    modified = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    manifest_items = "\n".join(f'<item id="ch{cid}" href="text/ch{cid}.xhtml" media-type="application/xhtml+xml"/>'
+                               for cid in titles)
+    spine_items = "\n".join(f'<itemref idref="ch{cid}"/>' for cid in titles)
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="bookid">\n'
+        '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">\n'
+        f'<dc:identifier id="bookid">{html.escape(identifier)}</dc:identifier>\n'
+        f'<dc:title>{html.escape(book_name)}</dc:title>\n'
+        '<dc:language>zh-CN</dc:language>\n'
+        f'<meta property="dcterms:modified">{modified}</meta>\n'
+        '</metadata>\n'
+        '<manifest>\n'
+        '<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>\n'
+        f'{manifest_items}\n'
+        '</manifest>\n'
+        f'<spine>\n{spine_items}\n</spine>\n'
+        '</package>\n'
+    )
+
+
+_CONTAINER_XML = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">\n'
+    '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>\n'
+    '</container>\n'
+)
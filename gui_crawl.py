@@ -1,8 +1,9 @@
 # gui_crawl.py - 爬取窗口GUI
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, Listbox, END
-import threading
 from crawler import NovelCrawler
+from job_control import BackgroundJob
+from log_pump import LogPump
 
 
 class CrawlWindow:
@@ -15,6 +16,8 @@ class CrawlWindow:
         self.window = None
         self.listbox_novels = None
         self.text_log = None
+        self.log_pump = None
+        self.job = None
 
     def create_window(self) -> None:
         """创建爬取配置窗口"""
@@ -30,6 +33,7 @@ class CrawlWindow:
         self._create_result_area(main_frame)
         self._create_log_area(main_frame)
 
+        self.window.protocol("WM_DELETE_WINDOW", self._on_close)
         self.utils.center_window(self.window)
 
     def _create_config_area(self, parent: ttk.Frame) -> None:
@@ -55,6 +59,22 @@ class CrawlWindow:
                                command=self._start_crawling)
         btn_crawl.grid(row=0, column=5)
 
+        btn_local = ttk.Button(config_frame, text="本地查询", width=12,
+                               command=self._search_catalog)
+        btn_local.grid(row=1, column=5, pady=(5, 0))
+
+        btn_refresh = ttk.Button(config_frame, text="增量刷新", width=12,
+                                 command=self._refresh_keyword)
+        btn_refresh.grid(row=1, column=4, padx=(0, 15), pady=(5, 0))
+
+        self.btn_pause = ttk.Button(config_frame, text="暂停", width=12,
+                                    command=self._toggle_pause, state=tk.DISABLED)
+        self.btn_pause.grid(row=1, column=2, columnspan=2, sticky=tk.E, padx=(0, 15), pady=(5, 0))
+
+        self.btn_stop = ttk.Button(config_frame, text="停止", width=12,
+                                   command=self._stop_job, state=tk.DISABLED)
+        self.btn_stop.grid(row=1, column=1, sticky=tk.E, padx=(0, 15), pady=(5, 0))
+
     def _create_result_area(self, parent: ttk.Frame) -> None:
         """创建结果显示区域"""
         result_frame = ttk.LabelFrame(parent, text="爬取结果", padding="10")
@@ -71,12 +91,110 @@ class CrawlWindow:
         self.text_log = scrolledtext.ScrolledText(log_frame, font=("Consolas", 9),
                                                   wrap=tk.WORD, height=15)
         self.text_log.pack(fill=tk.BOTH, expand=True)
+        self.log_pump = LogPump(self.text_log).start()
 
     def _update_novel_list(self) -> None:
         """更新小说列表"""
         self.listbox_novels.delete(0, END)
         for i, novel in enumerate(self.config.novel_data_list, 1):
-            self.listbox_novels.insert(END, f"{i}. {novel['名称']}")
+            self.listbox_novels.insert(END, f"{i}. {novel.name}")
+
+    def _append_novels(self, novels) -> None:
+        """追加一页新爬取的小说（在主线程调用）"""
+        start = self.listbox_novels.size() + 1
+        for i, novel in enumerate(novels, start):
+            self.listbox_novels.insert(END, f"{i}. {novel.name}")
+
+    def _run_job(self, target) -> bool:
+        """在后台启动任务（同一时间只运行一个），target 接收任务控制令牌"""
+        if self.job is not None and self.job.running:
+            messagebox.showwarning("提示", "已有任务在运行，请等待完成或先停止！")
+            return False
+
+        def run(control):
+            try:
+                target(control)
+            finally:
+                self._call_in_ui(self._job_finished)
+
+        self.job = BackgroundJob(run, name="crawl").start()
+        self.btn_pause.config(text="暂停", state=tk.NORMAL)
+        self.btn_stop.config(state=tk.NORMAL)
+        return True
+
+    def _call_in_ui(self, callback, *args) -> None:
+        """在主线程执行回调（窗口已关闭时忽略）"""
+        try:
+            self.window.after(0, callback, *args)
+        except (tk.TclError, RuntimeError):
+            pass
+
+    def _job_finished(self) -> None:
+        """任务结束后恢复按钮状态"""
+        if self.window.winfo_exists():
+            self.btn_pause.config(text="暂停", state=tk.DISABLED)
+            self.btn_stop.config(state=tk.DISABLED)
+
+    def _toggle_pause(self) -> None:
+        """暂停/继续当前任务"""
+        if self.job is None or not self.job.running:
+            return
+        if self.job.control.paused:
+            self.job.resume()
+            self.btn_pause.config(text="暂停")
+            self.utils.log_message("继续爬取", self.config, self.log_pump)
+        else:
+            self.job.pause()
+            self.btn_pause.config(text="继续")
+            self.utils.log_message("已暂停（当前页完成后暂停）", self.config, self.log_pump)
+
+    def _stop_job(self) -> None:
+        """停止当前任务（已获取的结果保留）"""
+        if self.job is not None and self.job.running:
+            self.job.cancel()
+            self.btn_pause.config(state=tk.DISABLED)
+            self.btn_stop.config(state=tk.DISABLED)
+            self.utils.log_message("⚠️ 正在停止……", self.config, self.log_pump)
+
+    def shutdown(self) -> None:
+        """取消运行中的任务（关闭窗口或退出程序时调用）"""
+        if self.job is not None:
+            self.job.cancel()
+
+    def _on_close(self) -> None:
+        """关闭窗口：先取消后台任务，不让其在窗口关闭后继续运行"""
+        self.shutdown()
+        self.log_pump.stop()
+        self.window.destroy()
+
+    def _search_catalog(self) -> None:
+        """从本地目录查询关键词（立即返回，不发请求）"""
+        keyword = self.entry_keyword.get().strip()
+        if not keyword:
+            messagebox.showwarning("提示", "请输入搜索关键词！")
+            return
+
+        novels = self.crawler.search_catalog(keyword)
+        self._update_novel_list()
+        self.utils.log_message(f"本地目录中找到{len(novels)}本与「{keyword}」相关的小说", self.config, self.log_pump)
+
+    def _refresh_keyword(self) -> None:
+        """增量刷新关键词（后台执行，完成后更新列表）"""
+        keyword = self.entry_keyword.get().strip()
+        if not keyword:
+            messagebox.showwarning("提示", "请输入搜索关键词！")
+            return
+
+        def refresh_thread(control):
+            try:
+                self.crawler.refresh_keyword(keyword, log_widget=self.log_pump, control=control)
+                self._call_in_ui(self._update_novel_list)
+            except Exception as e:
+                error = str(e)
+                self.utils.log_message(f"\n❌ 刷新出错：{error}", self.config, self.log_pump)
+                self._call_in_ui(lambda: messagebox.showerror("错误", f"刷新失败：{error}"))
+
+        self._run_job(refresh_thread)
 
     def _start_crawling(self) -> None:
         """开始爬取"""
@@ -98,15 +216,24 @@ class CrawlWindow:
                 messagebox.showerror("错误", "爬取数量必须是数字！")
                 return
 
+        if self.job is not None and self.job.running:
+            messagebox.showwarning("提示", "已有任务在运行，请等待完成或先停止！")
+            return
+
+        self.log_pump.flush()
         self.text_log.delete(1.0, tk.END)
         self.listbox_novels.delete(0, END)
 
-        def crawl_thread():
+        def crawl_thread(control):
             try:
-                self.crawler.crawl_novels(keyword, max_novels, crawl_until_fail, self.text_log)
-                self.window.after(0, self._update_novel_list)
+                for event in self.crawler.iter_crawl(keyword, max_novels, crawl_until_fail, self.log_pump,
+                                                     control=control):
+                    if event["event"] == "page" and event["items"]:
+                        self._call_in_ui(self._append_novels, event["items"])
+                self._call_in_ui(self._update_novel_list)
             except Exception as e:
-                self.utils.log_message(f"\n❌ 爬取出错：{str(e)}", self.config, self.text_log)
-                messagebox.showerror("错误", f"爬取失败：{str(e)}")
+                error = str(e)
+                self.utils.log_message(f"\n❌ 爬取出错：{error}", self.config, self.log_pump)
+                self._call_in_ui(lambda: messagebox.showerror("错误", f"爬取失败：{error}"))
 
-        threading.Thread(target=crawl_thread, daemon=True).start()
\ No newline at end of file
+        self._run_job(crawl_thread)
\ No newline at end of file
@@ -1,26 +1,35 @@
 # gui_download.py - 下载窗口GUI
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, Listbox, END
-import threading
-from downloader import NovelDownloader
+from download_queue import DownloadScheduler, DownloadJob
+from log_pump import LogPump
+from subscriptions import SubscriptionWatcher
 
 
 class DownloadWindow:
     """下载管理窗口"""
 
+    # 队列视图刷新间隔（毫秒）
+    QUEUE_REFRESH_MS = 500
+
     def __init__(self, config, utils):
         self.config = config
         self.utils = utils
-        self.downloader = NovelDownloader(config, utils)
+        self.scheduler = None
+        self.watcher = None
+        self.btn_watch = None
         self.window = None
         self.listbox_novels = None
+        self.tree_queue = None
         self.text_log = None
+        self.log_pump = None
+        self._queue_busy = False
 
     def create_window(self) -> None:
         """创建下载管理窗口"""
         self.window = tk.Toplevel()
         self.window.title("小说下载 - 管理界面")
-        self.window.geometry("800x600")
+        self.window.geometry("800x750")
         self.window.resizable(True, True)
 
         main_frame = ttk.Frame(self.window, padding="15")
@@ -28,10 +37,16 @@ class DownloadWindow:
 
         self._create_config_area(main_frame)
         self._create_novel_list_area(main_frame)
+        self._create_queue_area(main_frame)
         self._create_log_area(main_frame)
 
+        self.scheduler = DownloadScheduler(self.config, self.utils, log_widget=self.log_pump)
+        self.watcher = SubscriptionWatcher(self.config, self.utils, log_widget=self.log_pump)
+
+        self.window.protocol("WM_DELETE_WINDOW", self._on_close)
         self._update_novel_list()
         self.utils.center_window(self.window)
+        self.window.after(self.QUEUE_REFRESH_MS, self._refresh_queue)
 
     def _create_config_area(self, parent: ttk.Frame) -> None:
         """创建配置区域"""
@@ -49,20 +64,50 @@ class DownloadWindow:
 
         ttk.Label(config_frame, text="（留空下载全部）", foreground="gray").grid(row=0, column=4, sticky=tk.W)
 
+        self.var_resume = tk.BooleanVar(value=True)
+        chk_resume = ttk.Checkbutton(config_frame, text="断点续传", variable=self.var_resume)
+        chk_resume.grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+
+        ttk.Label(config_frame, text="优先级：").grid(row=1, column=2, sticky=tk.W, padx=(0, 10), pady=(5, 0))
+        self.entry_priority = ttk.Entry(config_frame, width=10)
+        self.entry_priority.grid(row=1, column=3, padx=(0, 15), pady=(5, 0))
+        self.entry_priority.insert(0, "5")
+
+        ttk.Label(config_frame, text="（1-10，越大越优先）", foreground="gray").grid(row=1, column=4, sticky=tk.W,
+                                                                            pady=(5, 0))
+
+        ttk.Label(config_frame, text="完成后导出：").grid(row=2, column=0, sticky=tk.W, padx=(0, 10), pady=(5, 0))
+        self.combo_export = ttk.Combobox(config_frame, width=8, state="readonly",
+                                         values=("不导出", "txt", "epub"))
+        self.combo_export.grid(row=2, column=1, padx=(0, 15), pady=(5, 0))
+        self.combo_export.set("不导出")
+
         btn_download = ttk.Button(config_frame, text="下载选中小说", width=12,
                                   command=self._start_download)
         btn_download.grid(row=0, column=5, padx=(15, 0))
 
+        btn_download_all = ttk.Button(config_frame, text="全部下载", width=12,
+                                      command=self._start_download_all)
+        btn_download_all.grid(row=1, column=5, padx=(15, 0), pady=(5, 0))
+
         btn_refresh = ttk.Button(config_frame, text="刷新列表", width=10,
                                  command=self._update_novel_list)
         btn_refresh.grid(row=0, column=6)
 
+        btn_follow = ttk.Button(config_frame, text="关注选中", width=10,
+                                command=self._follow_selected)
+        btn_follow.grid(row=1, column=6, pady=(5, 0))
+
+        self.btn_watch = ttk.Button(config_frame, text="开始追更", width=12,
+                                    command=self._toggle_watch)
+        self.btn_watch.grid(row=2, column=5, padx=(15, 0), pady=(5, 0))
+
     def _create_novel_list_area(self, parent: ttk.Frame) -> None:
         """创建小说列表区域"""
         list_frame = ttk.LabelFrame(parent, text="可用小说", padding="10")
         list_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
 
-        self.listbox_novels = Listbox(list_frame, font=("微软雅黑", 9))
+        self.listbox_novels = Listbox(list_frame, font=("微软雅黑", 9), selectmode=tk.EXTENDED)
         self.listbox_novels.pack(fill=tk.BOTH, expand=True, side=tk.LEFT)
 
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL,
@@ -70,6 +115,36 @@ class DownloadWindow:
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.listbox_novels.config(yscrollcommand=scrollbar.set)
 
+    def _create_queue_area(self, parent: ttk.Frame) -> None:
+        """创建下载队列区域"""
+        queue_frame = ttk.LabelFrame(parent, text="下载队列", padding="10")
+        queue_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+
+        columns = ("name", "priority", "state", "progress")
+        button_frame = ttk.Frame(queue_frame)
+        button_frame.pack(fill=tk.X, side=tk.BOTTOM, pady=(5, 0))
+        for text, command in (("暂停", self._pause_jobs), ("继续", self._resume_jobs),
+                              ("取消", self._cancel_jobs)):
+            ttk.Button(button_frame, text=text, width=8, command=command).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Label(button_frame, text="（作用于选中的任务，未选中时作用于全部）",
+                  foreground="gray").pack(side=tk.LEFT)
+
+        self.tree_queue = ttk.Treeview(queue_frame, columns=columns, show="headings", height=6)
+        self.tree_queue.heading("name", text="小说")
+        self.tree_queue.heading("priority", text="优先级")
+        self.tree_queue.heading("state", text="状态")
+        self.tree_queue.heading("progress", text="进度")
+        self.tree_queue.column("name", width=300)
+        self.tree_queue.column("priority", width=60, anchor=tk.CENTER)
+        self.tree_queue.column("state", width=80, anchor=tk.CENTER)
+        self.tree_queue.column("progress", width=200)
+        self.tree_queue.pack(fill=tk.BOTH, expand=True, side=tk.LEFT)
+
+        scrollbar = ttk.Scrollbar(queue_frame, orient=tk.VERTICAL,
+                                  command=self.tree_queue.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree_queue.config(yscrollcommand=scrollbar.set)
+
     def _create_log_area(self, parent: ttk.Frame) -> None:
         """创建日志区域"""
         log_frame = ttk.LabelFrame(parent, text="下载日志", padding="10")
@@ -78,6 +153,7 @@ class DownloadWindow:
         self.text_log = scrolledtext.ScrolledText(log_frame, font=("Consolas", 9),
                                                   wrap=tk.WORD, height=15)
         self.text_log.pack(fill=tk.BOTH, expand=True)
+        self.log_pump = LogPump(self.text_log).start()
 
     def _update_novel_list(self) -> None:
         """更新小说列表"""
@@ -86,40 +162,137 @@ class DownloadWindow:
             self.listbox_novels.insert(END, "（暂无小说数据，请先爬取）")
         else:
             for i, novel in enumerate(self.config.novel_data_list, 1):
-                self.listbox_novels.insert(END, f"{i}. {novel['名称']}")
+                self.listbox_novels.insert(END, f"{i}. {novel.name}")
 
-    def _start_download(self) -> None:
-        """开始下载"""
-        selected = self.listbox_novels.curselection()
-        if not selected or not self.config.novel_data_list:
-            messagebox.showwarning("提示", "请先选择要下载的小说！")
+    def _refresh_queue(self) -> None:
+        """刷新队列视图（定时执行）"""
+        if not self.window.winfo_exists():
             return
 
-        idx = selected[0]
-        if idx >= len(self.config.novel_data_list):
-            messagebox.showerror("错误", "选中的小说不存在！")
+        jobs = self.scheduler.snapshot()
+        existing = set(self.tree_queue.get_children())
+        for job in jobs:
+            item_id = str(job["job_id"])
+            progress = f"成功{job['downloaded']}章，失败{job['failed']}章"
+            if job["total"]:
+                progress = f"{job['downloaded'] + job['failed']}/{job['total']}章，" + progress
+            if job["last_chapter"]:
+                progress += f"（第{job['last_chapter']}章）"
+            values = (job["name"], job["priority"], job["state"], progress)
+            if item_id in existing:
+                self.tree_queue.item(item_id, values=values)
+            else:
+                self.tree_queue.insert("", END, iid=item_id, values=values)
+
+        idle = self.scheduler.is_idle()
+        if self._queue_busy and idle:
+            done = sum(1 for job in jobs if job["state"] == DownloadJob.STATE_DONE)
+            messagebox.showinfo("完成", f"下载队列已处理完毕！\n成功 {done} 本，共 {len(jobs)} 本\n"
+                                        f"保存路径：{self.config.save_path}")
+        self._queue_busy = not idle
+
+        self.window.after(self.QUEUE_REFRESH_MS, self._refresh_queue)
+
+    def _selected_jobs(self):
+        """队列视图中选中的任务ID，未选中时为 [None]（表示全部）"""
+        selected = self.tree_queue.selection()
+        return [int(item_id) for item_id in selected] if selected else [None]
+
+    def _pause_jobs(self) -> None:
+        """暂停选中的任务（当前章节完成后暂停）"""
+        for job_id in self._selected_jobs():
+            self.scheduler.pause(job_id)
+
+    def _resume_jobs(self) -> None:
+        """恢复选中的任务"""
+        for job_id in self._selected_jobs():
+            self.scheduler.resume(job_id)
+
+    def _cancel_jobs(self) -> None:
+        """取消选中的任务（已下载章节保留，可断点续传）"""
+        job_ids = self._selected_jobs()
+        if job_ids == [None] and not messagebox.askyesno("确认", "确定取消全部下载任务吗？"):
+            return
+        for job_id in job_ids:
+            self.scheduler.cancel(job_id)
+
+    def _follow_selected(self) -> None:
+        """关注选中的小说（追更时只下载新增章节）"""
+        selected = [idx for idx in self.listbox_novels.curselection() if idx < len(self.config.novel_data_list)]
+        if not selected:
+            messagebox.showwarning("提示", "请先选择要关注的小说！")
             return
+        for idx in selected:
+            novel = self.config.novel_data_list[idx]
+            self.watcher.follow(str(novel.novelid), novel.name)
+
+    def _toggle_watch(self) -> None:
+        """开始/停止后台追更轮询"""
+        if self.watcher.running:
+            self.watcher.stop(timeout=0)
+            self.btn_watch.config(text="开始追更")
+        else:
+            self.watcher.start()
+            self.btn_watch.config(text="停止追更")
 
-        novel = self.config.novel_data_list[idx]
-        novel_id = novel["novelid"]
-        novel_name = novel["名称"]
+    def shutdown(self, timeout: float = 0) -> bool:
+        """取消全部任务与追更轮询；timeout 大于0时等待运行中的任务写完当前章节，返回是否已全部结束"""
+        self.watcher.stop(timeout=0)
+        return self.scheduler.shutdown(wait=timeout > 0, timeout=timeout)
 
+    def _on_close(self) -> None:
+        """关闭窗口：有任务运行时确认后取消全部任务，不让其在窗口关闭后继续下载"""
+        if not self.scheduler.is_idle() and not messagebox.askyesno(
+                "确认", "仍有下载任务在进行，关闭窗口将取消全部任务（已下载的章节会保存）。\n确定关闭吗？"):
+            return
+        self.shutdown()
+        self.log_pump.stop()
+        self.window.destroy()
+
+    def _read_options(self):
+        """读取章节范围与优先级，输入有误时返回None"""
         try:
             start_chapter = int(self.entry_start_chapter.get().strip()) if self.entry_start_chapter.get().strip() else 1
             end_chapter = int(self.entry_end_chapter.get().strip()) if self.entry_end_chapter.get().strip() else 0
+            priority = int(self.entry_priority.get().strip()) if self.entry_priority.get().strip() else 5
         except ValueError:
-            messagebox.showerror("错误", "章节号必须是数字！")
+            messagebox.showerror("错误", "章节号和优先级必须是数字！")
+            return None
+
+        return start_chapter, end_chapter, min(max(priority, 1), 10)
+
+    def _enqueue(self, novels) -> None:
+        """把小说加入下载队列"""
+        options = self._read_options()
+        if options is None:
+            return
+
+        start_chapter, end_chapter, priority = options
+        resume = self.var_resume.get()
+        export_format = self.combo_export.get() if self.combo_export.get() != "不导出" else ""
+        for novel in novels:
+            self.scheduler.submit(novel, start_chapter, end_chapter, priority, resume, export_format)
+            self.utils.log_message(f"➕ 《{novel.name}》已加入下载队列（优先级{priority}）",
+                                   self.config, self.log_pump)
+        self._queue_busy = True
+
+    def _start_download(self) -> None:
+        """下载选中的小说"""
+        selected = self.listbox_novels.curselection()
+        if not selected or not self.config.novel_data_list:
+            messagebox.showwarning("提示", "请先选择要下载的小说！")
             return
 
-        self.text_log.delete(1.0, tk.END)
+        if any(idx >= len(self.config.novel_data_list) for idx in selected):
+            messagebox.showerror("错误", "选中的小说不存在！")
+            return
+
+        self._enqueue([self.config.novel_data_list[idx] for idx in selected])
 
-        def download_thread():
-            try:
-                self.downloader.download_novel_chapters(novel_id, novel_name,
-                                                        start_chapter, end_chapter,
-                                                        self.text_log)
-            except Exception as e:
-                self.utils.log_message(f"\n❌ 下载出错：{str(e)}", self.config, self.text_log)
-                messagebox.showerror("错误", f"下载失败：{str(e)}")
+    def _start_download_all(self) -> None:
+        """下载列表中的全部小说"""
+        if not self.config.novel_data_list:
+            messagebox.showwarning("提示", "暂无小说数据，请先爬取！")
+            return
 
-        threading.Thread(target=download_thread, daemon=True).start()
\ No newline at end of file
+        self._enqueue(list(self.config.novel_data_list))
\ No newline at end of file
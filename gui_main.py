@@ -1,19 +1,24 @@
 # gui_main.py - 主窗口GUI
 import tkinter as tk
 from tkinter import ttk
-from gui_crawl import CrawlWindow
-from gui_download import DownloadWindow
-from gui_settings import SettingsWindow
 from config import ConfigManager
 from utils import Utils
 
 
 class MainWindow:
-    """主窗口类"""
+    """主窗口类
+
+    各功能窗口（及其依赖的爬取、下载引擎和 requests / bs4 等第三方库）在首次打开时才导入，
+    启动时只读取设置文件并显示主菜单。
+    """
+
+    # 退出时等待下载任务收尾的最长时间（秒）
+    SHUTDOWN_TIMEOUT = 10
 
     def __init__(self):
         self.root = None
         self.config = ConfigManager()
+        self.config.load_settings()
         self.utils = Utils()
         self.crawl_window_instance = None
         self.download_window_instance = None
@@ -33,6 +38,7 @@ class MainWindow:
             pass
 
         self._create_main_frame()
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
         self.utils.center_window(self.root)
 
         return self.root
@@ -117,20 +123,32 @@ class MainWindow:
         )
         info_label.pack(side=tk.BOTTOM, pady=(20, 0))
 
+    def _on_close(self) -> None:
+        """退出程序：取消后台任务，等待正在下载的章节写入完成并保存清单后再退出"""
+        if self.crawl_window_instance is not None:
+            self.crawl_window_instance.shutdown()
+        if self.download_window_instance is not None:
+            self.download_window_instance.shutdown(timeout=self.SHUTDOWN_TIMEOUT)
+        self.config.set_parse_workers(0)
+        self.root.destroy()
+
     def _open_crawl_window(self) -> None:
         """打开爬取窗口"""
         if self.crawl_window_instance is None or not self.crawl_window_instance.window.winfo_exists():
+            from gui_crawl import CrawlWindow
             self.crawl_window_instance = CrawlWindow(self.config, self.utils)
             self.crawl_window_instance.create_window()
 
     def _open_download_window(self) -> None:
         """打开下载窗口"""
         if self.download_window_instance is None or not self.download_window_instance.window.winfo_exists():
+            from gui_download import DownloadWindow
             self.download_window_instance = DownloadWindow(self.config, self.utils)
             self.download_window_instance.create_window()
 
     def _open_settings_window(self) -> None:
         """打开设置窗口"""
         if self.settings_window_instance is None or not self.settings_window_instance.window.winfo_exists():
+            from gui_settings import SettingsWindow
             self.settings_window_instance = SettingsWindow(self.config, self.utils)
             self.settings_window_instance.create_window()
\ No newline at end of file
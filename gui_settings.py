@@ -11,22 +11,27 @@ class SettingsWindow:
         self.utils = utils
         self.window = None
         self.text_log = None
+        self.tree_metrics = None
+        self.label_counters = None
 
     def create_window(self) -> None:
         """创建系统设置窗口"""
         self.window = tk.Toplevel()
         self.window.title("系统设置 - 配置界面")
-        self.window.geometry("700x500")
+        self.window.geometry("700x750")
         self.window.resizable(True, True)
 
         main_frame = ttk.Frame(self.window, padding="15")
         main_frame.pack(fill=tk.BOTH, expand=True)
 
         self._create_path_settings(main_frame)
+        self._create_download_settings(main_frame)
+        self._create_metrics_panel(main_frame)
         self._create_log_settings(main_frame)
 
         self._load_log()
         self.utils.center_window(self.window)
+        self._refresh_metrics()
 
     def _create_path_settings(self, parent: ttk.Frame) -> None:
         """创建路径设置区域"""
@@ -43,6 +48,78 @@ class SettingsWindow:
                               command=self._select_save_path)
         btn_path.grid(row=0, column=2)
 
+    def _create_download_settings(self, parent: ttk.Frame) -> None:
+        """创建下载设置区域"""
+        download_frame = ttk.LabelFrame(parent, text="下载设置", padding="10")
+        download_frame.pack(fill=tk.X, pady=(0, 10))
+
+        ttk.Label(download_frame, text="并发线程数：").grid(row=0, column=0, sticky=tk.W, padx=(0, 10))
+        self.entry_workers = ttk.Entry(download_frame, width=8)
+        self.entry_workers.grid(row=0, column=1, padx=(0, 15))
+        self.entry_workers.insert(0, str(self.config.download_workers))
+
+        ttk.Label(download_frame, text="每主机每秒请求数：").grid(row=0, column=2, sticky=tk.W, padx=(0, 10))
+        self.entry_host_rate = ttk.Entry(download_frame, width=8)
+        self.entry_host_rate.grid(row=0, column=3, padx=(0, 15))
+        self.entry_host_rate.insert(0, str(self.config.host_rate))
+
+        ttk.Label(download_frame, text="速率下限：").grid(row=1, column=0, sticky=tk.W, padx=(0, 10), pady=(5, 0))
+        self.entry_rate_floor = ttk.Entry(download_frame, width=8)
+        self.entry_rate_floor.grid(row=1, column=1, padx=(0, 15), pady=(5, 0))
+        self.entry_rate_floor.insert(0, str(self.config.rate_floor))
+
+        ttk.Label(download_frame, text="速率上限：").grid(row=1, column=2, sticky=tk.W, padx=(0, 10), pady=(5, 0))
+        self.entry_rate_ceiling = ttk.Entry(download_frame, width=8)
+        self.entry_rate_ceiling.grid(row=1, column=3, padx=(0, 15), pady=(5, 0))
+        self.entry_rate_ceiling.insert(0, str(self.config.rate_ceiling))
+
+        ttk.Label(download_frame, text="章节存储：").grid(row=2, column=0, sticky=tk.W, padx=(0, 10), pady=(5, 0))
+        self.combo_storage = ttk.Combobox(download_frame, width=8, state="readonly",
+                                          values=("files", "packed"))
+        self.combo_storage.grid(row=2, column=1, padx=(0, 15), pady=(5, 0))
+        self.combo_storage.set(self.config.storage_backend)
+
+        ttk.Label(download_frame, text="（files：每章一个文件；packed：每本一个压缩章节库）",
+                  foreground="gray").grid(row=2, column=2, columnspan=2, sticky=tk.W, pady=(5, 0))
+
+        ttk.Label(download_frame, text="解析进程数：").grid(row=3, column=0, sticky=tk.W, padx=(0, 10), pady=(5, 0))
+        self.entry_parse_workers = ttk.Entry(download_frame, width=8)
+        self.entry_parse_workers.grid(row=3, column=1, padx=(0, 15), pady=(5, 0))
+        self.entry_parse_workers.insert(0, str(self.config.parse_workers))
+
+        ttk.Label(download_frame, text="（0：在下载线程中解析；多核机器可设为CPU核数）",
+                  foreground="gray").grid(row=3, column=2, columnspan=2, sticky=tk.W, pady=(5, 0))
+
+        btn_apply = ttk.Button(download_frame, text="应用", width=8,
+                               command=self._apply_download_settings)
+        btn_apply.grid(row=0, column=4, rowspan=4)
+
+    def _create_metrics_panel(self, parent: ttk.Frame) -> None:
+        """创建运行指标面板"""
+        metrics_frame = ttk.LabelFrame(parent, text="运行指标", padding="10")
+        metrics_frame.pack(fill=tk.X, pady=(0, 10))
+
+        columns = ("phase", "count", "mean", "p50", "p99", "max")
+        self.tree_metrics = ttk.Treeview(metrics_frame, columns=columns, show="headings", height=6)
+        for column, text in zip(columns, ("阶段", "次数", "平均(ms)", "p50(ms)", "p99(ms)", "最大(ms)")):
+            self.tree_metrics.heading(column, text=text)
+            self.tree_metrics.column(column, width=90, anchor=tk.CENTER)
+        self.tree_metrics.pack(fill=tk.X)
+
+        self.label_counters = ttk.Label(metrics_frame, text="", foreground="gray", wraplength=640)
+        self.label_counters.pack(fill=tk.X, pady=(5, 0))
+
+        button_frame = ttk.Frame(metrics_frame)
+        button_frame.pack(fill=tk.X, pady=(5, 0))
+
+        btn_export_metrics = ttk.Button(button_frame, text="导出指标",
+                                        command=self._export_metrics)
+        btn_export_metrics.pack(side=tk.RIGHT, padx=(5, 0))
+
+        btn_reset_metrics = ttk.Button(button_frame, text="清零",
+                                       command=self.config.metrics.reset)
+        btn_reset_metrics.pack(side=tk.RIGHT)
+
     def _create_log_settings(self, parent: ttk.Frame) -> None:
         """创建日志设置区域"""
         log_frame = ttk.LabelFrame(parent, text="系统日志", padding="10")
@@ -71,13 +148,90 @@ class SettingsWindow:
             self.config.set_save_path(folder)
             self.entry_path.delete(0, END)
             self.entry_path.insert(0, self.config.save_path)
+            self._save_settings()
             messagebox.showinfo("成功", f"保存路径已设置为：\n{self.config.save_path}")
 
+    def _save_settings(self) -> None:
+        """把当前设置写入设置文件（下次启动时读取）"""
+        try:
+            self.config.save_settings()
+        except OSError as e:
+            self.utils.log_message(f"⚠️ 设置保存失败：{str(e)}", self.config)
+
+    def _apply_download_settings(self) -> None:
+        """应用下载设置"""
+        try:
+            workers = int(self.entry_workers.get().strip())
+            host_rate = float(self.entry_host_rate.get().strip())
+            rate_floor = float(self.entry_rate_floor.get().strip())
+            rate_ceiling = float(self.entry_rate_ceiling.get().strip())
+            parse_workers = int(self.entry_parse_workers.get().strip())
+        except ValueError:
+            messagebox.showerror("错误", "并发线程数和请求数必须是数字！")
+            return
+
+        if workers < 1 or host_rate <= 0 or rate_floor <= 0 or rate_ceiling < rate_floor:
+            messagebox.showerror("错误", "并发线程数和请求数必须大于0，且速率上限不能小于下限！")
+            return
+        if parse_workers < 0:
+            messagebox.showerror("错误", "解析进程数不能小于0！")
+            return
+
+        self.config.set_download_options(workers, host_rate)
+        self.config.set_rate_limits(rate_floor, rate_ceiling)
+        self.config.set_storage_backend(self.combo_storage.get())
+        if parse_workers != self.config.parse_workers:
+            self.config.set_parse_workers(parse_workers)
+        self._save_settings()
+        messagebox.showinfo("成功", f"并发线程数：{self.config.download_workers}\n"
+                                    f"每主机每秒请求数：{self.config.host_rate}\n"
+                                    f"速率范围：{self.config.rate_floor}-{self.config.rate_ceiling}\n"
+                                    f"章节存储：{self.config.storage_backend}\n"
+                                    f"解析进程数：{self.config.parse_workers}")
+
+    def _refresh_metrics(self) -> None:
+        """刷新运行指标面板（每秒一次）"""
+        if not self.window.winfo_exists():
+            return
+
+        snapshot = self.config.metrics.snapshot()
+        existing = set(self.tree_metrics.get_children())
+        for phase, entry in sorted(snapshot["timings"].items()):
+            values = (phase, entry["count"], entry["mean_ms"], entry["p50_ms"], entry["p99_ms"], entry["max_ms"])
+            if phase in existing:
+                self.tree_metrics.item(phase, values=values)
+                existing.discard(phase)
+            else:
+                self.tree_metrics.insert("", END, iid=phase, values=values)
+        for phase in existing:
+            self.tree_metrics.delete(phase)
+
+        values = dict(snapshot["counters"], **snapshot["gauges"])
+        self.label_counters.config(text="  ".join(f"{name}={int(value)}" for name, value in sorted(values.items()))
+                                   or "暂无数据")
+        self.window.after(1000, self._refresh_metrics)
+
+    def _export_metrics(self) -> None:
+        """导出运行指标"""
+        file_path = filedialog.asksaveasfilename(
+            title="保存运行指标",
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json"), ("Prometheus 文本", "*.prom"), ("所有文件", "*.*")]
+        )
+
+        if file_path:
+            try:
+                self.config.metrics.dump(file_path)
+                messagebox.showinfo("成功", f"运行指标已导出到：\n{file_path}")
+            except Exception as e:
+                messagebox.showerror("错误", f"运行指标导出失败：{str(e)}")
+
     def _load_log(self) -> None:
         """加载日志"""
         self.text_log.delete(1.0, tk.END)
-        for message in self.config.global_log:
-            self.text_log.insert(tk.END, message + "\n")
+        messages = self.config.global_log.snapshot()
+        if messages:
+            self.text_log.insert(tk.END, "\n".join(messages) + "\n")
         self.text_log.see(tk.END)
 
     def _clear_log(self) -> None:
@@ -101,7 +255,7 @@ class SettingsWindow:
         if file_path:
             try:
                 with open(file_path, "w", encoding="utf-8") as f:
-                    f.write("\n".join(self.config.global_log))
+                    f.write("\n".join(self.config.global_log.snapshot()))
                 messagebox.showinfo("成功", f"日志已导出到：\n{file_path}")
             except Exception as e:
                 messagebox.showerror("错误", f"日志导出失败：{str(e)}")
\ No newline at end of file
@@ -0,0 +1,238 @@
+# http_client.py - 共享HTTP会话层
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+# 屏蔽SSL警告
+try:
+    import urllib3
+
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+except ImportError:
+    pass
+
+
+class _ConnectionStats:
+    """连接计数（线程安全）"""
+
+    def __init__(self, metrics=None):
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.requests = 0
+        self.metrics = metrics
+
+    def add(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+def _counting_pool(base: type, stats: _ConnectionStats) -> type:
+    """生成会统计新建连接数与请求数的连接池类"""
+
+    class CountingPool(base):
+        def _new_conn(self):
+            stats.add("opened")
+            conn = super()._new_conn()
+            if stats.metrics is not None:
+                connect = conn.connect
+
+                def timed_connect():
+                    with stats.metrics.timer("connect"):
+                        connect()
+
+                conn.connect = timed_connect
+            return conn
+
+        def _make_request(self, conn, method, url, *args, **kwargs):
+            stats.add("requests")
+            return super()._make_request(conn, method, url, *args, **kwargs)
+
+    return CountingPool
+
+
+class _PooledAdapter(HTTPAdapter):
+    """使用计数连接池的适配器"""
+
+    def __init__(self, stats: _ConnectionStats, **kwargs):
+        self._stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool(HTTPConnectionPool, self._stats),
+            "https": _counting_pool(HTTPSConnectionPool, self._stats),
+        }
+
+
+class HttpClient:
+    """共享HTTP客户端
+
+    所有线程共用同一个连接池（长连接复用），每个线程持有独立的 Session
+    以避免共享 Cookie 等可变状态。设置 cache 后，指定 cache_kind 的请求会先查询响应缓存。
+    设置 throttle（按URL返回自适应限速器的函数）后，每次实际发出的请求都先经过限速，
+    并把延迟与状态码反馈给限速器；缓存命中不占用请求预算。
+    """
+
+    # 写入缓存时保留的响应头
+    CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+    def __init__(self, headers: Dict[str, str], pool_size: int = 10,
+                 timeout: Tuple[float, float] = (10, 30), retries: int = 2,
+                 backoff: float = 0.5, verify: bool = False, cache=None,
+                 throttle: Optional[Callable] = None, metrics=None):
+        self.headers = dict(headers)
+        self.cache = cache
+        self.throttle = throttle
+        self.metrics = metrics
+        self.timeout = timeout
+        self.verify = verify
+        self._stats = _ConnectionStats(metrics)
+        self._local = threading.local()
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            backoff_factor=backoff,
+            # 429/503 不在连接层重试：交给 AdaptiveThrottle 降速，由下载器的重试队列按退避重试
+            status_forcelist=(500, 502, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False
+        )
+        self._adapter = _PooledAdapter(
+            self._stats,
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry,
+            pool_block=True
+        )
+
+    def _session(self) -> requests.Session:
+        """获取当前线程的会话"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            session.verify = self.verify
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            self._local.session = session
+        return session
+
+    def get(self, url: str, params: Optional[Dict] = None,
+            timeout: Optional[Tuple[float, float]] = None,
+            cache_kind: Optional[str] = None) -> requests.Response:
+        """发送GET请求
+
+        cache_kind 指定缓存类型（如 "search"、"chapter"）时启用响应缓存：
+        有效期内直接返回缓存，过期则带 ETag/Last-Modified 条件请求，304时沿用缓存。
+        """
+        cache = self.cache
+        if cache is None or cache_kind is None:
+            return self._send(url, params, None, timeout)
+
+        key = cache.make_key(url, params)
+        entry = cache.lookup(key)
+        request_headers = {}
+        if entry is not None:
+            if cache.is_fresh(entry):
+                cache.count("hits")
+                self._count("cache_hits")
+                return self._cached_response(entry)
+            if entry["etag"]:
+                request_headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                request_headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self._send(url, params, request_headers, timeout)
+        if response.status_code == 304 and entry is not None:
+            cache.touch(key)
+            cache.count("revalidated")
+            self._count("cache_revalidated")
+            return self._cached_response(entry)
+
+        cache.count("misses")
+        self._count("cache_misses")
+        if response.status_code == 200:
+            headers = {name: response.headers[name] for name in self.CACHED_HEADERS
+                       if name in response.headers}
+            cache.store(key, cache_kind, response.url, headers, response.content)
+        return response
+
+    def _send(self, url: str, params: Optional[Dict], headers: Optional[Dict],
+              timeout: Optional[Tuple[float, float]]) -> requests.Response:
+        """经限速后发出请求，并把结果反馈给限速器"""
+        throttle = self.throttle(url) if self.throttle else None
+        if throttle is not None:
+            throttle.acquire()
+
+        started = time.monotonic()
+        try:
+            # stream=True 时收到响应头即返回，便于分别统计首字节时间与读取响应体的时间
+            response = self._session().get(url, params=params, headers=headers,
+                                           timeout=timeout or self.timeout, stream=True)
+            headers_at = time.monotonic()
+            content = response.content
+        except requests.RequestException:
+            if throttle is not None:
+                throttle.record(time.monotonic() - started, error=True)
+            self._count("request_errors")
+            raise
+
+        finished = time.monotonic()
+        if throttle is not None:
+            throttle.record(finished - started, response.status_code)
+        if self.metrics is not None:
+            self.metrics.observe("ttfb", headers_at - started)
+            self.metrics.observe("body", finished - headers_at)
+            self.metrics.add("requests")
+            self.metrics.add("bytes", len(content))
+            retries = getattr(response.raw, "retries", None)
+            if retries is not None and retries.history:
+                self.metrics.add("retries", len(retries.history))
+            if response.status_code >= 400:
+                self.metrics.add("http_errors")
+        return response
+
+    def _count(self, name: str) -> None:
+        """累加运行指标计数（未设置 metrics 时忽略）"""
+        if self.metrics is not None:
+            self.metrics.add(name)
+
+    def discard_cached(self, url: str, params: Optional[Dict] = None) -> None:
+        """从缓存中删除某个响应（内容无效时调用）"""
+        if self.cache is not None:
+            self.cache.discard(self.cache.make_key(url, params))
+
+    @staticmethod
+    def _cached_response(entry: Dict) -> requests.Response:
+        """由缓存条目构造响应对象"""
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = entry["url"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response._content = bytes(entry["body"])
+        response.from_cache = True
+        return response
+
+    def stats(self) -> Dict[str, int]:
+        """连接统计：新建连接数、复用连接数、请求数"""
+        opened = self._stats.opened
+        total = self._stats.requests
+        return {
+            "opened": opened,
+            "reused": max(0, total - opened),
+            "requests": total
+        }
+
+    def close(self) -> None:
+        """关闭连接池"""
+        self._adapter.close()
@@ -0,0 +1,122 @@
+# job_control.py - 任务控制（取消、暂停与恢复）
+import threading
+from typing import Callable, Optional
+
+
+class JobCancelled(Exception):
+    """任务已被取消（由检查点抛出）"""
+
+
+class JobControl:
+    """任务控制令牌（协作式）
+
+    爬取、下载循环在每页/每章之间调用 checkpoint()：暂停时在此阻塞直到恢复，已取消时抛出 JobCancelled。
+    取消只在检查点生效，正在写入的章节与清单保存不会被打断。
+    """
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已请求取消"""
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self) -> bool:
+        """是否处于暂停状态"""
+        return not self._resumed.is_set()
+
+    def cancel(self) -> None:
+        """请求取消（同时唤醒暂停中的任务）"""
+        self._cancelled.set()
+        self._resumed.set()
+
+    def pause(self) -> None:
+        """暂停：任务在下一个检查点处等待"""
+        if not self.cancelled:
+            self._resumed.clear()
+
+    def resume(self) -> None:
+        """恢复暂停的任务"""
+        self._resumed.set()
+
+    def checkpoint(self) -> None:
+        """检查点：暂停时阻塞，已取消时抛出 JobCancelled"""
+        self._resumed.wait()
+        if self.cancelled:
+            raise JobCancelled()
+
+    def sleep(self, seconds: float) -> None:
+        """可被取消打断的等待，结束后经过一次检查点"""
+        if self._cancelled.wait(seconds):
+            raise JobCancelled()
+        self.checkpoint()
+
+
+class BackgroundJob:
+    """后台任务：在守护线程中执行 target(control)，可取消、暂停/恢复并等待结束"""
+
+    STATE_RUNNING = "运行中"
+    STATE_PAUSED = "已暂停"
+    STATE_CANCELLING = "取消中"
+    STATE_DONE = "已完成"
+    STATE_CANCELLED = "已取消"
+    STATE_FAILED = "失败"
+
+    def __init__(self, target: Callable[[JobControl], object], name: str = ""):
+        self.control = JobControl()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self._target = target
+        self._finished = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name or None, daemon=True)
+
+    def start(self) -> "BackgroundJob":
+        """启动任务"""
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        try:
+            self.result = self._target(self.control)
+        except JobCancelled:
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            self._finished.set()
+
+    @property
+    def running(self) -> bool:
+        """任务是否仍在执行"""
+        return self._thread.is_alive() and not self._finished.is_set()
+
+    @property
+    def state(self) -> str:
+        """任务状态"""
+        if self._finished.is_set():
+            if self.error is not None:
+                return self.STATE_FAILED
+            return self.STATE_CANCELLED if self.control.cancelled else self.STATE_DONE
+        if self.control.cancelled:
+            return self.STATE_CANCELLING
+        return self.STATE_PAUSED if self.control.paused else self.STATE_RUNNING
+
+    def cancel(self) -> None:
+        """请求取消"""
+        self.control.cancel()
+
+    def pause(self) -> None:
+        """暂停"""
+        self.control.pause()
+
+    def resume(self) -> None:
+        """恢复"""
+        self.control.resume()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """等待任务结束，返回是否已结束"""
+        return self._finished.wait(timeout)
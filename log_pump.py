@@ -0,0 +1,147 @@
+# log_pump.py - 线程安全的日志缓冲与界面日志泵
+import threading
+from collections import deque
+from typing import Deque, Iterator, List, Tuple
+
+
+class LogRing:
+    """定长环形日志缓冲（线程安全），超出容量时丢弃最旧的消息"""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._items: Deque[str] = deque(maxlen=self.capacity)
+        self._lock = threading.Lock()
+        self.discarded = 0
+
+    def append(self, message: str) -> None:
+        """追加一条消息"""
+        with self._lock:
+            if len(self._items) == self.capacity:
+                self.discarded += 1
+            self._items.append(message)
+
+    def snapshot(self) -> List[str]:
+        """当前全部消息的副本"""
+        with self._lock:
+            return list(self._items)
+
+    def clear(self) -> None:
+        """清空缓冲"""
+        with self._lock:
+            self._items.clear()
+            self.discarded = 0
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.snapshot())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+
+class LogPump:
+    """工作线程与Tk文本控件之间的日志泵
+
+    工作线程调用 post() 只把消息放入队列；Tk 主循环每隔 interval_ms 通过 after() 取出一批，
+    合并为一次 insert/see 写入控件。排队消息超过 max_pending 时丢弃低优先级消息（如逐章成功日志），
+    并在控件中提示省略条数；控件内容超过 max_lines 行时删除最早的行。
+    """
+
+    def __init__(self, widget, interval_ms: int = 100, max_pending: int = 2000,
+                 max_batch: int = 500, max_lines: int = 5000):
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.max_lines = max_lines
+        self.dropped = 0
+        self._pending: Deque[Tuple[str, bool]] = deque()
+        self._low_count = 0
+        self._unreported = 0
+        self._lock = threading.Lock()
+        self._running = False
+
+    def post(self, message: str, low_priority: bool = False) -> None:
+        """投递一条消息（任意线程可调用）"""
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                if low_priority or not self._drop_low():
+                    self.dropped += 1
+                    self._unreported += 1
+                    if not low_priority:
+                        # 全是高优先级消息时仍保留新消息，丢弃最旧的一条
+                        self._pending.popleft()
+                        self._pending.append((message, low_priority))
+                    return
+            self._pending.append((message, low_priority))
+            if low_priority:
+                self._low_count += 1
+
+    def _drop_low(self) -> bool:
+        """丢弃最旧的一条低优先级消息（需持有锁），返回是否丢弃成功"""
+        if not self._low_count:
+            return False
+        for index, (_, low) in enumerate(self._pending):
+            if low:
+                del self._pending[index]
+                self._low_count -= 1
+                self.dropped += 1
+                self._unreported += 1
+                return True
+        return False
+
+    def start(self) -> "LogPump":
+        """开始在Tk主循环中定时刷新（需在主线程调用）"""
+        if not self._running:
+            self._running = True
+            self.widget.after(self.interval_ms, self._drain)
+        return self
+
+    def stop(self) -> None:
+        """停止刷新"""
+        self._running = False
+
+    def _take_batch(self) -> List[str]:
+        """取出一批待显示的消息"""
+        with self._lock:
+            count = min(len(self._pending), self.max_batch)
+            batch = []
+            for _ in range(count):
+                message, low = self._pending.popleft()
+                if low:
+                    self._low_count -= 1
+                batch.append(message)
+            if self._unreported:
+                batch.append(f"⚠️ 日志过多，已省略{self._unreported}条")
+                self._unreported = 0
+        return batch
+
+    def flush(self) -> None:
+        """立即把排队消息写入控件（需在主线程调用）"""
+        batch = self._take_batch()
+        if not batch:
+            return
+        self.widget.insert("end", "\n".join(batch) + "\n")
+        if self.max_lines:
+            excess = int(self.widget.index("end-1c").split(".")[0]) - 1 - self.max_lines
+            if excess > 0:
+                self.widget.delete("1.0", f"{excess + 1}.0")
+        self.widget.see("end")
+
+    def _drain(self) -> None:
+        """定时任务：写入一批消息后重新排期，控件销毁时停止"""
+        if not self._running:
+            return
+        try:
+            if not self.widget.winfo_exists():
+                self._running = False
+                return
+            self.flush()
+        except Exception:
+            # 窗口关闭过程中控件可能已不可用
+            self._running = False
+            return
+        self.widget.after(self.interval_ms, self._drain)
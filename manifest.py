@@ -0,0 +1,124 @@
+# manifest.py - 章节下载清单（断点续传）
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+
+class ChapterManifest:
+    """保存目录下的章节清单
+
+    记录已写入章节的标题、文件名（或单文件章节库名）、大小与内容哈希，以及失败章节的原因，
+    续传时据此只下载缺失或失败的章节。
+    多个下载进程可共用同一保存目录（各自下载不同章节）：保存时若清单文件已被其他进程改写，先合并其记录。
+    """
+
+    FILE_NAME = ".manifest.json"
+    SAVE_EVERY = 20  # 每记录N次自动落盘一次
+
+    def __init__(self, save_dir: str, novel_id: str = ""):
+        self.path = os.path.join(save_dir, self.FILE_NAME)
+        self.save_dir = save_dir
+        self.novel_id = novel_id
+        self.chapters: Dict[str, Dict] = {}
+        self.failed: Dict[str, str] = {}
+        self._dirty = 0
+        self._mtime: Optional[int] = None
+        self._lock = threading.Lock()
+        self.load()
+
+    def _stat(self) -> Optional[int]:
+        """清单文件的修改时间（纳秒，不存在时为None）"""
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _read(self) -> Optional[Dict]:
+        """读取清单文件内容（不存在、损坏或属于其他小说时为None）"""
+        self._mtime = self._stat()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.novel_id and data.get("novel_id") not in ("", self.novel_id):
+            return None
+        return data
+
+    def load(self) -> None:
+        """读取清单文件（不存在或损坏时视为空清单）"""
+        data = self._read()
+        if data is None:
+            return
+        self.chapters = data.get("chapters", {})
+        self.failed = data.get("failed", {})
+
+    def save(self) -> None:
+        """原子写入清单文件"""
+        with self._lock:
+            if self._stat() != self._mtime:
+                self._merge(self._read())
+            data = {"novel_id": self.novel_id, "chapters": self.chapters, "failed": self.failed}
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+            self._mtime = self._stat()
+            self._dirty = 0
+
+    def _merge(self, data: Optional[Dict]) -> None:
+        """合并其他进程写入的记录（需持有锁）：本进程的记录优先，已写入的章节不再视为失败"""
+        if not data:
+            return
+        for chapter_id, entry in data.get("chapters", {}).items():
+            self.chapters.setdefault(chapter_id, entry)
+        for chapter_id, error in data.get("failed", {}).items():
+            self.failed.setdefault(chapter_id, error)
+        for chapter_id in [cid for cid in self.failed if cid in self.chapters]:
+            del self.failed[chapter_id]
+
+    def _touch(self) -> bool:
+        """累计修改次数（需持有锁），返回是否需要落盘"""
+        self._dirty += 1
+        return self._dirty >= self.SAVE_EVERY
+
+    def is_done(self, chapter_id: int, store=None) -> bool:
+        """章节是否已完整写入（文件存在且大小一致）；指定 store 时由存储后端校验"""
+        entry = self.chapters.get(str(chapter_id))
+        if not entry:
+            return False
+        if store is not None:
+            return store.verify(chapter_id, entry)
+        try:
+            return os.path.getsize(os.path.join(self.save_dir, entry["file"])) == entry["size"]
+        except OSError:
+            return False
+
+    def record_success(self, chapter_id: int, title: str, file_name: str, data: bytes) -> None:
+        """记录写入成功的章节"""
+        with self._lock:
+            self.chapters[str(chapter_id)] = {
+                "title": title,
+                "file": file_name,
+                "size": len(data),
+                "sha256": hashlib.sha256(data).hexdigest()
+            }
+            self.failed.pop(str(chapter_id), None)
+            need_save = self._touch()
+        if need_save:
+            self.save()
+
+    def record_failure(self, chapter_id: int, error: str) -> None:
+        """记录下载失败的章节"""
+        with self._lock:
+            if str(chapter_id) not in self.chapters:
+                self.failed[str(chapter_id)] = error
+            need_save = self._touch()
+        if need_save:
+            self.save()
+
+    def get(self, chapter_id: int) -> Optional[Dict]:
+        """获取章节记录"""
+        return self.chapters.get(str(chapter_id))
@@ -0,0 +1,139 @@
+# metrics.py - 运行指标（分阶段耗时与计数）
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict
+
+
+class _Timing:
+    """单个阶段的耗时统计：次数、总和、最大值，以及最近样本（用于估算分位数）"""
+
+    SAMPLES = 2048
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=self.SAMPLES)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Metrics:
+    """运行指标（线程安全）
+
+    耗时阶段：connect（建立连接）、ttfb（发出请求到收到响应头）、body（读取响应体）、
+    decode（字符集解码）、parse（页面解析）、write（章节写入）；
+    计数：requests、retries、bytes、cache_hits、cache_misses、pages、chapters、failures 等；
+    当前值（gauge）：write_queue_depth（待写入章节数）等。
+    """
+
+    PREFIX = "novel"
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings: Dict[str, _Timing] = {}
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self.started_at = time.time()
+
+    def observe(self, phase: str, seconds: float) -> None:
+        """记录一次阶段耗时（秒）"""
+        with self._lock:
+            timing = self._timings.get(phase)
+            if timing is None:
+                timing = self._timings[phase] = _Timing()
+            timing.observe(seconds)
+
+    @contextmanager
+    def timer(self, phase: str):
+        """以上下文管理器形式记录阶段耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - started)
+
+    def add(self, name: str, value: float = 1) -> None:
+        """累加计数"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def adjust(self, name: str, delta: float) -> None:
+        """调整当前值（可增可减）"""
+        with self._lock:
+            self._gauges[name] = self._gauges.get(name, 0) + delta
+
+    def reset(self) -> None:
+        """清空全部指标（当前值保留）"""
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+            self.started_at = time.time()
+
+    def snapshot(self) -> Dict:
+        """指标快照：{"uptime", "counters", "gauges", "timings": {阶段: {count, total_s, mean_ms, max_ms, p50_ms, p90_ms, p99_ms}}}"""
+        with self._lock:
+            timings = {}
+            for phase, timing in self._timings.items():
+                entry = {
+                    "count": timing.count,
+                    "total_s": round(timing.total, 4),
+                    "mean_ms": round(timing.total / timing.count * 1000, 3) if timing.count else 0.0,
+                    "max_ms": round(timing.max * 1000, 3)
+                }
+                for q in self.QUANTILES:
+                    entry[f"p{int(q * 100)}_ms"] = round(timing.quantile(q) * 1000, 3)
+                timings[phase] = entry
+            return {
+                "uptime": round(time.time() - self.started_at, 1),
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings": timings
+            }
+
+    def to_json(self) -> str:
+        """导出为JSON文本"""
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式（计数为 counter，当前值为 gauge，耗时为 summary）"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = f"{self.PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        for name, value in sorted(snapshot["gauges"].items()):
+            metric = f"{self.PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+
+        metric = f"{self.PREFIX}_phase_seconds"
+        if snapshot["timings"]:
+            lines.append(f"# TYPE {metric} summary")
+        for phase, entry in sorted(snapshot["timings"].items()):
+            for q in self.QUANTILES:
+                lines.append(f'{metric}{{phase="{phase}",quantile="{q}"}} {round(entry[f"p{int(q * 100)}_ms"] / 1000, 6)}')
+            lines.append(f'{metric}_sum{{phase="{phase}"}} {entry["total_s"]}')
+            lines.append(f'{metric}_count{{phase="{phase}"}} {entry["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        """写入文件：.prom / .txt 为 Prometheus 文本格式，其他为JSON"""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
@@ -0,0 +1,132 @@
+# novel_record.py - 小说记录（搜索结果）与列式小说列表
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from utils import Utils
+
+
+class NovelRecord:
+    """一本小说的搜索结果：整数 novelid 与名称，链接由 novelid 推导（不单独保存）
+
+    字典形式 {"名称", "链接", "novelid"} 只用于JSON输入输出（from_dict / to_dict / to_json）。
+    """
+
+    __slots__ = ("novelid", "name")
+
+    def __init__(self, novelid: int, name: str):
+        self.novelid = int(novelid)
+        self.name = name
+
+    @property
+    def link(self) -> str:
+        """小说目录页链接"""
+        from config import ConfigManager  # config 导入了本模块，延迟导入
+        return f"{ConfigManager.CHAPTER_URL}?novelid={self.novelid}"
+
+    @classmethod
+    def from_link(cls, name: str, link: str) -> Optional["NovelRecord"]:
+        """由名称和小说链接创建（链接中没有 novelid 时返回None）"""
+        novel_id = Utils.extract_novel_id(link)
+        return cls(int(novel_id), name) if novel_id else None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> Optional["NovelRecord"]:
+        """由旧格式字典 {"名称", "链接", "novelid"} 创建（无法得到数字 novelid 时返回None）"""
+        novel_id = str(data.get("novelid") or Utils.extract_novel_id(data.get("链接", "")))
+        if not novel_id.isdigit():
+            return None
+        return cls(int(novel_id), data.get("名称") or novel_id)
+
+    def to_dict(self) -> Dict:
+        """转换为旧格式字典（JSON输出用）"""
+        return {"名称": self.name, "链接": self.link, "novelid": str(self.novelid)}
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, NovelRecord) and (self.novelid, self.name) == (other.novelid, other.name)
+
+    def __hash__(self) -> int:
+        return hash(self.novelid)
+
+    def __repr__(self) -> str:
+        return f"NovelRecord({self.novelid}, {self.name!r})"
+
+
+class NovelList:
+    """小说列表（列式存储）
+
+    novelid 按顺序保存在 array('q') 中，另有 novelid→名称 的字典兼作去重与按ID查找的索引，
+    add() 按 novelid 去重，按ID查找与判断是否存在均为 O(1)；
+    按位置读取或遍历时才临时创建 NovelRecord，数十万条目录也不为每本保存一个对象
+    （benchmark.py 的 memory 阶段与同样带ID索引的字典、NovelRecord 列表对比内存占用）。
+    """
+
+    def __init__(self, novels: Iterable[NovelRecord] = ()):
+        self._ids = array("q")
+        self._names: Dict[int, str] = {}
+        self.extend(novels)
+
+    def add(self, novel: NovelRecord) -> bool:
+        """追加一本小说，已存在时不追加，返回是否已追加"""
+        if novel.novelid in self._names:
+            return False
+        self._names[novel.novelid] = novel.name
+        self._ids.append(novel.novelid)
+        return True
+
+    def extend(self, novels: Iterable[NovelRecord]) -> List[NovelRecord]:
+        """追加多本小说，返回实际追加的（去重后）"""
+        return [novel for novel in novels if self.add(novel)]
+
+    def truncate(self, size: int) -> None:
+        """只保留前 size 本"""
+        for novel_id in self._ids[size:]:
+            del self._names[novel_id]
+        del self._ids[size:]
+
+    def clear(self) -> None:
+        """清空列表"""
+        self.truncate(0)
+
+    def find(self, novel_id: Union[int, str]) -> Optional[NovelRecord]:
+        """按 novelid 查找"""
+        novel_id = int(novel_id)
+        name = self._names.get(novel_id)
+        return None if name is None else NovelRecord(novel_id, name)
+
+    def ids(self) -> array:
+        """全部 novelid（按列表顺序）"""
+        return array("q", self._ids)
+
+    def to_dicts(self) -> List[Dict]:
+        """转换为旧格式字典列表（JSON输出用）"""
+        return [record.to_dict() for record in self]
+
+    def __contains__(self, novel) -> bool:
+        if isinstance(novel, NovelRecord):
+            return novel.novelid in self._names
+        return str(novel).isdigit() and int(novel) in self._names
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return NovelList(NovelRecord(novel_id, self._names[novel_id]) for novel_id in self._ids[position])
+        novel_id = self._ids[position]
+        return NovelRecord(novel_id, self._names[novel_id])
+
+    def __iter__(self) -> Iterator[NovelRecord]:
+        for novel_id in self._ids:
+            yield NovelRecord(novel_id, self._names[novel_id])
+
+    def __repr__(self) -> str:
+        return f"NovelList({len(self)}本)"
+
+
+def to_json(value):
+    """json.dumps 的 default 钩子：把 NovelRecord / NovelList 转换为旧格式字典"""
+    if isinstance(value, NovelRecord):
+        return value.to_dict()
+    if isinstance(value, NovelList):
+        return value.to_dicts()
+    raise TypeError(f"无法序列化为JSON：{type(value).__name__}")
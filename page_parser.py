@@ -0,0 +1,236 @@
+# page_parser.py - 页面解析层
+import re
+import urllib.parse
+from typing import List, Optional, Tuple
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml.html
+
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+
+# get_text 不计入的元素（与 BeautifulSoup 行为一致）
+_SKIP_TEXT_TAGS = {"script", "style", "template"}
+
+_NOVELBODY_XPATH = "//div[contains(concat(' ', normalize-space(@class), ' '), ' novelbody ')]"
+_TITLE_XPATH = "//h3[contains(concat(' ', normalize-space(@class), ' '), ' title ')]"
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_XML_DECL_RE = re.compile(r"^\s*<\?xml[^>]*\?>")
+_CHARSET_RE = re.compile(r"charset=([\w-]+)", re.I)
+_CHAPTER_ID_RE = re.compile(r"[?&]chapterid=(\d+)")
+_NOVEL_ID_RE = re.compile(r"[?&]novelid=(\d+)")
+
+
+class PageParser:
+    """页面解析器
+
+    backend 可选：
+    - "lxml"：lxml 直接建树，只做定点查找（默认，需安装lxml）
+    - "strainer"：BeautifulSoup + SoupStrainer，只构建目标标签
+    - "html.parser"：完整 BeautifulSoup 树（原实现，作为对照）
+    """
+
+    BACKENDS = ("lxml", "strainer", "html.parser")
+
+    # 同一字符集家族统一按 gb18030 解码（gbk/gb2312 的超集）
+    GB_CHARSETS = {"gbk", "gb2312", "gb18030", "gb_2312-80", "x-gbk"}
+
+    def __init__(self, backend: str = "lxml", charset: str = "gb18030"):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"未知的解析后端：{backend}")
+        if backend == "lxml" and not HAS_LXML:
+            backend = "html.parser"
+        self.backend = backend
+        self.charset = charset
+
+    def decode(self, content: bytes, content_type: str = "") -> str:
+        """按已知字符集解码（不做字符集探测）"""
+        charset = self.charset
+        match = _CHARSET_RE.search(content_type or "")
+        if match:
+            declared = match.group(1).lower()
+            charset = self.charset if declared in self.GB_CHARSETS else declared
+        try:
+            return content.decode(charset, errors="replace")
+        except LookupError:
+            return content.decode(self.charset, errors="replace")
+
+    def _soup_builder(self) -> str:
+        """BeautifulSoup 使用的底层解析器"""
+        return "lxml" if HAS_LXML and self.backend == "strainer" else "html.parser"
+
+    def _soup(self, html: str, parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+        """BeautifulSoup 建树（与 lxml 后端一样先去掉XML声明，避免按HTML解析XML的警告）"""
+        return BeautifulSoup(_XML_DECL_RE.sub("", html, count=1), self._soup_builder(), parse_only=parse_only)
+
+    # ---------- 章节页 ----------
+
+    def parse_chapter(self, html: str) -> Optional[Tuple[Optional[str], str]]:
+        """解析章节页，返回（h2标题，正文），页面无h2时标题为None；无正文时返回None"""
+        if self.backend == "lxml":
+            return self._parse_chapter_lxml(html)
+
+        if self.backend == "strainer":
+            body_soup = self._soup(html, SoupStrainer("div", class_=_has_class("novelbody")))
+            novel_body = body_soup.find("div", class_="novelbody")
+            if not novel_body:
+                return None
+            title_soup = self._soup(html, SoupStrainer("h2"))
+            h2_tag = title_soup.find("h2")
+        else:
+            soup = self._soup(html)
+            novel_body = soup.find("div", class_="novelbody")
+            if not novel_body:
+                return None
+            h2_tag = soup.find("h2")
+
+        title = h2_tag.get_text(strip=True) if h2_tag else None
+        return title, novel_body.get_text(separator="\n", strip=True)
+
+    def _parse_chapter_lxml(self, html: str) -> Optional[Tuple[Optional[str], str]]:
+        """lxml 解析章节页"""
+        doc = _lxml_document(html)
+        if doc is None:
+            return None
+        bodies = doc.xpath(_NOVELBODY_XPATH)
+        if not bodies:
+            return None
+        h2_tag = doc.find(".//h2")
+        title = "".join(_iter_strings(h2_tag)) if h2_tag is not None else None
+        return title, "\n".join(_iter_strings(bodies[0]))
+
+    # ---------- 搜索页 ----------
+
+    def parse_search(self, html: str, base_url: str) -> Tuple[List[Tuple[str, str]], int]:
+        """解析搜索页，返回（[(小说名称, 链接)], 总页数或0）"""
+        items = []
+        if self.backend == "lxml":
+            doc = _lxml_document(html)
+            for h3_tag in (doc.xpath(_TITLE_XPATH) if doc is not None else []):
+                for a_tag in h3_tag.iter("a"):
+                    if a_tag.get("href") is not None:
+                        items.append(("".join(_iter_strings(a_tag)), a_tag.get("href")))
+                        break
+        else:
+            if self.backend == "strainer":
+                soup = self._soup(html, SoupStrainer("h3", class_=_has_class("title")))
+            else:
+                soup = self._soup(html)
+            for h3_tag in soup.find_all("h3", class_="title"):
+                a_tag = h3_tag.find("a", href=True)
+                if a_tag:
+                    items.append((a_tag.get_text(strip=True), a_tag["href"]))
+
+        results = []
+        for name, href in items:
+            href = href.strip()
+            if not href.startswith("http"):
+                href = urllib.parse.urljoin(base_url, href)
+            results.append((name, href))
+        return results, parse_page_count(html, len(results))
+
+    # ---------- 目录页 ----------
+
+    def parse_toc(self, html: str, novel_id: str = "") -> List[Tuple[int, str]]:
+        """解析目录页，返回按章节号排序的 [(章节号, 标题)]
+
+        普通章节的链接在 href 中，VIP章节的链接在 rel 属性中；指定 novel_id 时忽略其他小说的链接。
+        """
+        links = []
+        if self.backend == "lxml":
+            doc = _lxml_document(html)
+            for a_tag in (doc.iter("a") if doc is not None else []):
+                links.append((a_tag.get("href") or a_tag.get("rel") or "", "".join(_iter_strings(a_tag))))
+        else:
+            only = SoupStrainer("a") if self.backend == "strainer" else None
+            soup = self._soup(html, only)
+            for a_tag in soup.find_all("a"):
+                link = a_tag.get("href") or a_tag.get("rel") or ""
+                if isinstance(link, list):
+                    link = " ".join(link)
+                links.append((link, a_tag.get_text(strip=True)))
+
+        chapters = {}
+        for link, title in links:
+            match = _CHAPTER_ID_RE.search(link)
+            if not match:
+                continue
+            if novel_id:
+                novel_match = _NOVEL_ID_RE.search(link)
+                if novel_match and novel_match.group(1) != str(novel_id):
+                    continue
+            chapters.setdefault(int(match.group(1)), title)
+        return sorted(chapters.items())
+
+
+def _has_class(name: str):
+    """SoupStrainer 的class匹配函数（兼容class值为字符串或列表）"""
+    def match(value) -> bool:
+        if not value:
+            return False
+        values = value if isinstance(value, list) else value.split()
+        return name in values
+    return match
+
+
+def _lxml_document(html: str):
+    """lxml 建树（去掉XML声明；空文档返回None）"""
+    html = _XML_DECL_RE.sub("", html, count=1)
+    if not html.strip():
+        return None
+    return lxml.html.document_fromstring(html)
+
+
+def _iter_strings(element):
+    """按 BeautifulSoup get_text(strip=True) 的规则、按文档顺序遍历去空白后的文本片段
+
+    子元素的 tail 在其全部后代的文本之后产出（element.iter() 会让 tail 先于后代文本）。
+    """
+    if isinstance(element.tag, str) and element.tag not in _SKIP_TEXT_TAGS and element.text:
+        text = element.text.strip()
+        if text:
+            yield text
+    for child in element:
+        yield from _iter_strings(child)
+        if child.tail:
+            tail = child.tail.strip()
+            if tail:
+                yield tail
+
+
+def parse_page_count(html: str, page_size: int) -> int:
+    """从搜索页中解析总页数：优先"共N页"，其次按结果总数换算，最后取分页链接中的最大页码"""
+    text = _TAG_RE.sub(" ", html)
+    match = re.search(r"共\s*(\d+)\s*页", text)
+    if match:
+        return int(match.group(1))
+
+    match = re.search(r"共(?:有|找到)?\s*(\d+)\s*(?:条|个|部|篇)", text)
+    if match and page_size > 0:
+        return -(-int(match.group(1)) // page_size)
+
+    pages = [int(m) for m in re.findall(r"""href=["'][^"']*[?&](?:amp;)?p=(\d+)""", html)]
+    return max(pages) if pages else 0
+
+
+def compare_backends(html: str, kind: str, base_url: str = "", novel_id: str = "") -> List[str]:
+    """用各后端解析同一页面（kind 为 chapter / search / toc），返回与 html.parser 结果不一致的后端列表"""
+    def parse(parser: PageParser):
+        if kind == "chapter":
+            return parser.parse_chapter(html)
+        if kind == "toc":
+            return parser.parse_toc(html, novel_id)
+        return parser.parse_search(html, base_url)
+
+    expected = parse(PageParser("html.parser"))
+    mismatched = []
+    for backend in PageParser.BACKENDS:
+        parser = PageParser(backend)
+        if parse(parser) != expected:
+            mismatched.append(parser.backend)
+    return mismatched
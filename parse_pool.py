@@ -0,0 +1,91 @@
+# parse_pool.py - 解析进程池（解码与解析移出网络I/O线程）
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Tuple
+
+# 解析进程内按（后端, 字符集）缓存的解析器
+_PARSERS: Dict[Tuple[str, str], object] = {}
+
+
+def _parse(parser, kind: str, content: bytes, content_type: str, args: tuple):
+    """解码并解析页面，返回（解析结果, 解码耗时, 解析耗时）"""
+    started = time.perf_counter()
+    html = parser.decode(content, content_type)
+    decoded = time.perf_counter()
+    if kind == "chapter":
+        value = parser.parse_chapter(html)
+    elif kind == "search":
+        value = parser.parse_search(html, *args)
+    elif kind == "toc":
+        value = parser.parse_toc(html, *args)
+    else:
+        raise ValueError(f"未知的页面类型：{kind}")
+    return value, decoded - started, time.perf_counter() - decoded
+
+
+def _parse_in_worker(backend: str, charset: str, kind: str, content: bytes, content_type: str, args: tuple):
+    """解析进程的入口（模块级函数，可被子进程导入）"""
+    parser = _PARSERS.get((backend, charset))
+    if parser is None:
+        from page_parser import PageParser
+        parser = _PARSERS[(backend, charset)] = PageParser(backend, charset)
+    return _parse(parser, kind, content, content_type, args)
+
+
+class ParsePool:
+    """HTML解析进程池
+
+    网络I/O线程只负责取回原始字节，通过 submit() 交给子进程解码、解析，主进程只接收提取出的标题与正文；
+    同时在途的解析任务不超过 max_pending 个，超出时 submit() 阻塞提交线程，
+    使抓取速度跟随解析速度（两阶段之间为有界队列）。
+    子进程以 spawn 方式启动，避免在多线程进程（界面、下载线程）中 fork；
+    multiprocessing 在创建进程池时才导入，不使用进程池时不增加启动耗时。
+    """
+
+    def __init__(self, workers: int, backend: str, charset: str, max_pending: int = 0):
+        self.workers = max(1, int(workers))
+        self.backend = backend
+        self.charset = charset
+        self.max_pending = max_pending or self.workers * 4
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=get_context("spawn"))
+
+    def submit(self, kind: str, content: bytes, content_type: str = "", *args) -> Future:
+        """提交一个解析任务（kind 为 chapter / search / toc），返回结果为（解析结果, 解码耗时, 解析耗时）的Future"""
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(_parse_in_worker, self.backend, self.charset,
+                                           kind, content, content_type, args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def close(self) -> None:
+        """关闭进程池（取消排队中的任务）"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def submit_parse(pool, parser, kind: str, content: bytes, content_type: str = "", *args) -> Future:
+    """提交解析任务：有进程池时交给子进程，否则在当前线程用 parser 解析并返回已完成的Future"""
+    if pool is not None:
+        return pool.submit(kind, content, content_type, *args)
+    future: Future = Future()
+    try:
+        future.set_result(_parse(parser, kind, content, content_type, args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def parse_result(future: Future, metrics=None):
+    """等待解析完成并返回解析结果，同时把解码、解析耗时记入运行指标"""
+    value, decode_seconds, parse_seconds = future.result()
+    if metrics is not None:
+        metrics.observe("decode", decode_seconds)
+        metrics.observe("parse", parse_seconds)
+    return value
@@ -0,0 +1,79 @@
+# rate_limiter.py - 请求限速
+import threading
+import time
+
+
+class RateLimiter:
+    """令牌桶限速器（线程安全）"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = max(float(rate), 0.01)
+        self.burst = max(int(burst), 1)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        """按时间补充令牌"""
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self) -> None:
+        """获取一个令牌，不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveThrottle(RateLimiter):
+    """自适应限速器
+
+    根据响应反馈调整速率：
+    - 响应正常且延迟低于目标值时，每次提高 max(increase, 当前速率×10%)；
+    - 延迟超过目标值时小幅降低；
+    - 遇到 429/503 或请求异常时减半，且冷却期内只减一次，避免同一批在途请求连续打折。
+    速率始终限制在 [min_rate, max_rate] 之间。
+    """
+
+    BACKOFF_STATUS = (429, 503)
+
+    def __init__(self, rate: float, min_rate: float = 0.2, max_rate: float = 10.0,
+                 target_latency: float = 2.0, increase: float = 0.1, burst: int = 1):
+        super().__init__(rate, burst)
+        self.min_rate = max(0.01, min_rate)
+        self.max_rate = max(self.min_rate, max_rate)
+        self.rate = min(max(self.rate, self.min_rate), self.max_rate)
+        self.target_latency = target_latency
+        self.increase = increase
+        self._cooldown_until = 0.0
+
+    @property
+    def current_rate(self) -> float:
+        """当前速率（次/秒）"""
+        return self.rate
+
+    def record(self, latency: float, status: int = 200, error: bool = False) -> None:
+        """记录一次请求结果并调整速率"""
+        with self._lock:
+            now = time.monotonic()
+            if error or status in self.BACKOFF_STATUS:
+                if now >= self._cooldown_until:
+                    self._set_rate(self.rate * 0.5)
+                    self._cooldown_until = now + max(1.0, 1.0 / self.rate)
+            elif latency > self.target_latency:
+                if now >= self._cooldown_until:
+                    self._set_rate(self.rate * 0.9)
+                    self._cooldown_until = now + 1.0 / self.rate
+            elif now >= self._cooldown_until:
+                self._set_rate(self.rate + max(self.increase, self.rate * 0.1))
+
+    def _set_rate(self, rate: float) -> None:
+        """设置速率（需持有锁），先按旧速率结算令牌"""
+        self._refill(time.monotonic())
+        self.rate = min(max(rate, self.min_rate), self.max_rate)
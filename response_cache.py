@@ -0,0 +1,142 @@
+# response_cache.py - 磁盘HTTP响应缓存
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from typing import Dict, Optional
+
+
+class ResponseCache:
+    """持久化响应缓存（SQLite）
+
+    以 URL + 参数为键，按类型设置有效期；过期后若有 ETag/Last-Modified 则发送条件请求重新验证，
+    总大小超过上限时按最近访问时间淘汰（LRU）。
+    """
+
+    DB_NAME = "responses.db"
+    DEFAULT_TTLS = {
+        "search": 3600,  # 搜索页1小时
+        "toc": 600,  # 目录页10分钟
+        "chapter": 30 * 86400  # 章节页30天
+    }
+    DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+    def __init__(self, cache_dir: str, ttls: Optional[Dict[str, float]] = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.ttls = dict(self.DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.max_bytes = max_bytes
+        self.counters = {"hits": 0, "misses": 0, "revalidated": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, self.DB_NAME), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, kind TEXT, url TEXT, headers TEXT, body BLOB,"
+            " etag TEXT, last_modified TEXT, stored_at REAL, accessed_at REAL, size INTEGER)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses (accessed_at)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(url: str, params: Optional[Dict] = None) -> str:
+        """由URL和参数生成缓存键（参数顺序无关）"""
+        if params:
+            query = urllib.parse.urlencode(sorted((str(k), str(v)) for k, v in params.items()))
+            url = f"{url}{'&' if '?' in url else '?'}{query}"
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def count(self, name: str) -> None:
+        """累加计数"""
+        with self._lock:
+            self.counters[name] += 1
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """查询缓存条目（不判断是否过期），命中时更新访问时间"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT kind, url, headers, body, etag, last_modified, stored_at FROM responses WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+        kind, url, headers, body, etag, last_modified, stored_at = row
+        return {
+            "kind": kind,
+            "url": url,
+            "headers": json.loads(headers),
+            "body": body,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": stored_at
+        }
+
+    def is_fresh(self, entry: Dict) -> bool:
+        """条目是否仍在有效期内"""
+        return time.time() - entry["stored_at"] < self.ttls.get(entry["kind"], 0)
+
+    def store(self, key: str, kind: str, url: str, headers: Dict[str, str], body: bytes) -> None:
+        """写入缓存条目并按需淘汰"""
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, url, json.dumps(headers), sqlite3.Binary(body),
+                 headers.get("ETag"), headers.get("Last-Modified"), now, now, len(body))
+            )
+            self._total_bytes += len(body) - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+
+    def touch(self, key: str) -> None:
+        """重新验证通过后刷新存储时间"""
+        with self._lock:
+            self._conn.execute("UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+    def discard(self, key: str) -> None:
+        """删除缓存条目（例如内容无效的页面）"""
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= row[0]
+                self._conn.commit()
+
+    def _evict(self) -> None:
+        """超过大小上限时按最近访问时间淘汰（需持有锁）"""
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_bytes -= size
+                self.counters["evictions"] += 1
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self) -> Dict[str, int]:
+        """命中/未命中等计数及当前占用"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats["bytes"] = self._total_bytes
+        return stats
+
+    def close(self) -> None:
+        """关闭数据库"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,307 @@
+# subscriptions.py - 追更：关注列表与新章节轮询
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from downloader import NovelDownloader
+from job_control import BackgroundJob, JobCancelled, JobControl
+from manifest import ChapterManifest
+from utils import LogTarget
+
+
+class FollowList:
+    """关注列表（SQLite）
+
+    以 novelid 为键记录关注的小说：已知最新章节号、最早缺失章节号，以及轮询计划
+    （当前轮询间隔、下次检查时间、两次更新间隔的估计值），按下次检查时间建立索引，
+    关注数千本时也只需读取到期的记录。
+    """
+
+    DB_NAME = "follows.db"
+    FIELDS = ("novelid", "name", "last_chapter", "first_missing", "interval", "next_check",
+              "last_checked", "last_update", "update_gap", "checks", "updates", "errors", "added_at")
+
+    def __init__(self, follow_dir: str):
+        os.makedirs(follow_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(follow_dir, self.DB_NAME), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS follows ("
+            " novelid TEXT PRIMARY KEY, name TEXT, last_chapter INTEGER, first_missing INTEGER,"
+            " interval REAL, next_check REAL, last_checked REAL, last_update REAL, update_gap REAL,"
+            " checks INTEGER, updates INTEGER, errors INTEGER, added_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS follows_next_check ON follows (next_check)")
+        self._conn.commit()
+
+    def _row(self, row) -> Dict:
+        return dict(zip(self.FIELDS, row))
+
+    def add(self, novel_id: str, name: str, last_chapter: int = 0, first_missing: int = 0,
+            interval: float = 0.0) -> bool:
+        """关注小说（立即到期，下次轮询时检查），已关注时只更新名称，返回是否为新关注"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM follows WHERE novelid = ?", (novel_id,)).fetchone()
+            if row is None:
+                self._conn.execute(
+                    f"INSERT INTO follows ({', '.join(self.FIELDS)}) VALUES ({', '.join('?' * len(self.FIELDS))})",
+                    (novel_id, name, last_chapter, first_missing, interval, now, 0.0, 0.0, 0.0, 0, 0, 0, now)
+                )
+            else:
+                self._conn.execute("UPDATE follows SET name = ? WHERE novelid = ?", (name, novel_id))
+            self._conn.commit()
+        return row is None
+
+    def remove(self, novel_id: str) -> bool:
+        """取消关注，返回是否存在该关注"""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM follows WHERE novelid = ?", (novel_id,))
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def get(self, novel_id: str) -> Optional[Dict]:
+        """单本关注记录（未关注时为None）"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(self.FIELDS)} FROM follows WHERE novelid = ?",
+                                     (novel_id,)).fetchone()
+        return None if row is None else self._row(row)
+
+    def entries(self) -> List[Dict]:
+        """全部关注记录（按下次检查时间排序）"""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(self.FIELDS)} FROM follows ORDER BY next_check").fetchall()
+        return [self._row(row) for row in rows]
+
+    def due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[Dict]:
+        """已到检查时间的关注记录（最早到期的在前）"""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self.FIELDS)} FROM follows WHERE next_check <= ? ORDER BY next_check LIMIT ?",
+                (now, -1 if limit is None else limit)
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def next_due(self) -> Optional[float]:
+        """最早的下次检查时间（没有关注时为None）"""
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(next_check) FROM follows").fetchone()
+        return row[0]
+
+    def update(self, novel_id: str, **fields) -> None:
+        """更新关注记录的字段"""
+        names = [name for name in fields if name in self.FIELDS and name != "novelid"]
+        if not names:
+            return
+        with self._lock:
+            self._conn.execute(f"UPDATE follows SET {', '.join(f'{name} = ?' for name in names)} WHERE novelid = ?",
+                               [fields[name] for name in names] + [novel_id])
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        """关注统计"""
+        with self._lock:
+            count, due = self._conn.execute(
+                "SELECT COUNT(*), SUM(next_check <= ?) FROM follows", (time.time(),)
+            ).fetchone()
+        return {"follows": count, "due": due or 0}
+
+    def close(self) -> None:
+        """关闭数据库"""
+        with self._lock:
+            self._conn.close()
+
+
+class SubscriptionWatcher:
+    """追更轮询
+
+    对到期的关注小说读取目录页，比较最新章节号与已知值：有新章节时只下载尾部新增的章节
+    （以及之前缺失的章节，断点续传跳过已下载的）到原保存目录；无更新时只花一次目录请求。
+    轮询间隔按每本书实际的更新频率自适应：发现更新时按两次更新间隔的估计值（指数平均）
+    缩短到其 1/4，无更新时每次放大1.5倍，目录读取失败时翻倍，均限制在
+    config.poll_min_interval ~ config.poll_max_interval 之间，并加 ±10% 抖动错开大量小说的检查时间。
+    最小间隔大于目录页缓存有效期，因此检查时总是重新获取（或向服务器验证）目录，
+    随后的下载直接复用缓存中的这份目录。
+    """
+
+    UPDATE_FRACTION = 0.25  # 有更新时：间隔 = 更新间隔估计值 × 该比例
+    IDLE_BACKOFF = 1.5  # 无更新时间隔放大倍数
+    ERROR_BACKOFF = 2.0  # 目录读取失败时间隔放大倍数
+    GAP_WEIGHT = 0.5  # 更新间隔指数平均中新样本的权重
+    JITTER = 0.1
+    IDLE_WAKE = 60.0  # 空闲时最长等待（秒），以便及时检查新加入的关注
+
+    def __init__(self, config, utils, log_widget: Optional[LogTarget] = None):
+        self.config = config
+        self.utils = utils
+        self.log_widget = log_widget
+        self.downloader = NovelDownloader(config, utils)
+        self._job: Optional[BackgroundJob] = None
+
+    @property
+    def follows(self) -> FollowList:
+        """保存路径下的关注列表"""
+        return self.config.follows
+
+    def follow(self, novel_id: str, name: str) -> Dict:
+        """关注小说：已下载过的从清单中最大的章节号之后开始追更，否则首次检查时下载全书"""
+        if not novel_id:
+            raise ValueError("小说ID为空，无法关注！")
+        name = name or novel_id
+        save_dir = os.path.join(self.config.save_path, self.utils.safe_filename(name))
+        last_chapter = 0
+        first_missing = 0
+        if os.path.isdir(save_dir):
+            manifest = ChapterManifest(save_dir, novel_id)
+            last_chapter = max((int(cid) for cid in manifest.chapters), default=0)
+            first_missing = min((int(cid) for cid in manifest.failed), default=0)
+        added = self.follows.add(novel_id, name, last_chapter, first_missing, self.config.poll_interval)
+        if added:
+            self.utils.log_message(f"➕ 已关注《{name}》（已有至第{last_chapter}章）", self.config, self.log_widget)
+        return self.follows.get(novel_id)
+
+    def unfollow(self, novel_id: str) -> bool:
+        """取消关注"""
+        return self.follows.remove(novel_id)
+
+    def _next_interval(self, entry: Dict, outcome: str) -> float:
+        """按检查结果（updated / idle / error）计算新的轮询间隔"""
+        low, high = self.config.poll_min_interval, self.config.poll_max_interval
+        interval = entry["interval"] or self.config.poll_interval
+        if outcome == "updated" and entry["update_gap"]:
+            interval = entry["update_gap"] * self.UPDATE_FRACTION
+        elif outcome == "idle":
+            interval *= self.IDLE_BACKOFF
+            if entry["update_gap"]:
+                # 超过一个更新周期仍无更新时不再继续拉长，避免错过规律更新的书
+                interval = min(interval, max(entry["update_gap"], low))
+        elif outcome == "error":
+            interval *= self.ERROR_BACKOFF
+        return min(high, max(low, interval))
+
+    def check(self, entry: Dict, control: Optional[JobControl] = None) -> Dict:
+        """检查一本关注的小说，有新章节时下载，返回检查结果"""
+        novel_id, name = entry["novelid"], entry["name"]
+        now = time.time()
+        fields = {"last_checked": now, "checks": entry["checks"] + 1}
+        result = {"novel_id": novel_id, "novel_name": name, "latest": entry["last_chapter"],
+                  "new": 0, "downloaded": 0, "missing": [], "outcome": "idle"}
+        self.config.metrics.add("follow_checks")
+
+        index = self.downloader.fetch_chapter_index(novel_id)
+        if not index:
+            result["outcome"] = "error"
+            fields["errors"] = entry["errors"] + 1
+            self.utils.log_message(f"⚠️ 《{name}》目录读取失败，稍后再试", self.config, self.log_widget)
+        else:
+            latest = index[-1]["chapter_id"]
+            result["latest"] = latest
+            if latest > entry["last_chapter"]:
+                # 之前缺失的章节（锁章等）只在有更新时顺带重试，无更新的轮询不产生章节请求
+                start = min(cid for cid in (entry["first_missing"], entry["last_chapter"] + 1) if cid > 0)
+                result["new"] = max(0, latest - entry["last_chapter"])
+                summary = self.downloader.download_novel_chapters(
+                    novel_id, name, start, 0, self.log_widget, resume=True, control=control
+                )
+                result["downloaded"] = summary["downloaded"]
+                result["missing"] = summary["missing"]
+                fields["last_chapter"] = latest
+                fields["first_missing"] = summary["missing"][0]["chapter_id"] if summary["missing"] else 0
+                if summary["cancelled"]:
+                    # 取消时保持原记录，下次检查从同一位置续传
+                    result["outcome"] = "cancelled"
+                    fields = {"last_checked": now}
+
+            if result["new"] and result["outcome"] != "cancelled":
+                result["outcome"] = "updated"
+                fields["updates"] = entry["updates"] + 1
+                fields["last_update"] = now
+                if entry["last_update"] and entry["last_chapter"]:
+                    gap = now - entry["last_update"]
+                    fields["update_gap"] = (gap if not entry["update_gap"] else
+                                            self.GAP_WEIGHT * gap + (1 - self.GAP_WEIGHT) * entry["update_gap"])
+                self.config.metrics.add("follow_updates")
+                self.utils.log_message(f"✅ 《{name}》更新{result['new']}章（至第{latest}章），"
+                                       f"下载{result['downloaded']}章", self.config, self.log_widget)
+
+        if result["outcome"] != "cancelled":
+            interval = self._next_interval(dict(entry, **fields), result["outcome"])
+            fields["interval"] = interval
+            fields["next_check"] = now + interval * random.uniform(1 - self.JITTER, 1 + self.JITTER)
+            result["next_check"] = fields["next_check"]
+        self.follows.update(novel_id, **fields)
+        return result
+
+    def _check_failed(self, entry: Dict, error: Exception) -> Dict:
+        """检查过程中出现异常：记录错误并按失败退避推迟这本书的下次检查，不影响其他关注"""
+        novel_id, name = entry["novelid"], entry["name"]
+        now = time.time()
+        self.utils.log_message(f"❌ 《{name}》检查失败：{error}", self.config, self.log_widget)
+        interval = self._next_interval(entry, "error")
+        result = {"novel_id": novel_id, "novel_name": name, "latest": entry["last_chapter"],
+                  "new": 0, "downloaded": 0, "missing": [], "outcome": "error", "error": str(error),
+                  "next_check": now + interval * random.uniform(1 - self.JITTER, 1 + self.JITTER)}
+        try:
+            self.follows.update(novel_id, last_checked=now, checks=entry["checks"] + 1,
+                                errors=entry["errors"] + 1, interval=interval, next_check=result["next_check"])
+        except sqlite3.Error as e:
+            self.utils.log_message(f"⚠️ 关注记录更新失败：{e}", self.config, self.log_widget)
+        return result
+
+    def poll_due(self, control: Optional[JobControl] = None, limit: Optional[int] = None) -> List[Dict]:
+        """检查全部已到期的关注小说（最早到期的在前），返回各本的检查结果
+
+        单本小说检查出错（如写入失败）只记为该本失败并推迟其下次检查，其余小说照常检查。
+        """
+        results = []
+        for entry in self.follows.due(limit=limit):
+            if control is not None:
+                control.checkpoint()
+            try:
+                results.append(self.check(entry, control))
+            except JobCancelled:
+                raise
+            except Exception as e:
+                results.append(self._check_failed(entry, e))
+        return results
+
+    def run(self, control: JobControl) -> None:
+        """持续轮询直到取消：检查到期的小说后休眠到下一本到期（最长 IDLE_WAKE 秒）"""
+        self.utils.log_message("✅ 追更轮询已启动", self.config, self.log_widget)
+        while True:
+            try:
+                self.poll_due(control)
+                next_due = self.follows.next_due()
+            except sqlite3.Error as e:
+                # 关注列表暂时无法读取（如数据库被锁）：稍后重试，不结束轮询
+                self.utils.log_message(f"⚠️ 读取关注列表失败：{e}", self.config, self.log_widget)
+                next_due = None
+            wait = self.IDLE_WAKE if next_due is None else next_due - time.time()
+            control.sleep(min(self.IDLE_WAKE, max(0.0, wait)))
+
+    def start(self) -> BackgroundJob:
+        """在后台线程中启动轮询（已在运行时返回当前任务）"""
+        if self._job is None or not self._job.running:
+            self._job = BackgroundJob(self.run, name="subscription-watcher").start()
+        return self._job
+
+    @property
+    def running(self) -> bool:
+        """后台轮询是否在运行"""
+        return self._job is not None and self._job.running
+
+    def stop(self, timeout: Optional[float] = None) -> bool:
+        """停止后台轮询（正在下载的章节写完后停止），返回是否已结束"""
+        if self._job is None:
+            return True
+        self._job.cancel()
+        finished = self._job.join(timeout)
+        if finished:
+            self.utils.log_message("⚠️ 追更轮询已停止", self.config, self.log_widget)
+        return finished
@@ -0,0 +1,32 @@
+# test_chapter_store.py - 章节存储转换测试
+import os
+
+import pytest
+
+from chapter_store import FileChapterStore, PackedChapterStore, convert_store, detect_store_kind
+
+
+def test_convert_files_to_packed_and_back(tmp_path):
+    save_dir = str(tmp_path)
+    store = FileChapterStore(save_dir)
+    for chapter_id in (1, 2, 3):
+        store.write(chapter_id, f"第{chapter_id}章", f"正文{chapter_id}")
+    store.close()
+
+    result = convert_store(save_dir, PackedChapterStore.KIND, remove_source=True)
+    assert result["target"]["chapters"] == 3
+    assert detect_store_kind(save_dir) == PackedChapterStore.KIND
+
+    convert_store(save_dir, FileChapterStore.KIND, remove_source=True)
+    assert detect_store_kind(save_dir) == FileChapterStore.KIND
+    store = FileChapterStore(save_dir)
+    assert store.read(2) == ("第2章", "正文2")
+    store.close()
+
+
+def test_convert_without_source_does_not_create_store(tmp_path):
+    save_dir = str(tmp_path)
+    with pytest.raises(ValueError):
+        convert_store(save_dir, FileChapterStore.KIND)
+    assert not os.path.exists(os.path.join(save_dir, PackedChapterStore.DB_NAME))
+    assert detect_store_kind(save_dir) == ""
@@ -0,0 +1,91 @@
+# test_chapter_writer.py - 章节写入阶段测试
+import threading
+
+from chapter_store import FileChapterStore
+from chapter_writer import ChapterWriter
+from manifest import ChapterManifest
+
+
+def _chapter(chapter_id: int) -> dict:
+    return {"chapter_id": chapter_id, "ok": True, "title": f"第{chapter_id}章", "content": "正文", "error": ""}
+
+
+class _FailingStore(FileChapterStore):
+    """指定章节所在的批次写入失败"""
+
+    def __init__(self, save_dir: str, fail_ids):
+        super().__init__(save_dir)
+        self.fail_ids = set(fail_ids)
+
+    def _write_batch(self, chapters):
+        if any(chapter_id in self.fail_ids for chapter_id, _, _ in chapters):
+            raise OSError("磁盘已满")
+        return super()._write_batch(chapters)
+
+
+class _FailingManifest(ChapterManifest):
+    """记录指定章节时抛出 OSError（模拟清单保存失败）"""
+
+    def __init__(self, save_dir: str, fail_ids):
+        super().__init__(save_dir, "1")
+        self.fail_ids = set(fail_ids)
+
+    def record_success(self, chapter_id, title, file_name, data):
+        if chapter_id in self.fail_ids:
+            raise OSError("清单保存失败")
+        super().record_success(chapter_id, title, file_name, data)
+
+
+def _flush(writer: ChapterWriter, timeout: float = 5.0) -> bool:
+    """在独立线程中 flush，返回是否在超时前完成"""
+    thread = threading.Thread(target=writer.flush, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+def test_writes_and_records_chapters(tmp_path):
+    store = FileChapterStore(str(tmp_path))
+    manifest = ChapterManifest(str(tmp_path), "1")
+    writer = ChapterWriter(store, manifest, batch_size=4)
+    for chapter_id in range(1, 11):
+        writer.put(_chapter(chapter_id))
+    writer.close()
+
+    assert writer.take_errors() == []
+    assert writer.stats()["written"] == 10
+    assert sorted(store.chapter_ids()) == list(range(1, 11))
+    assert all(manifest.is_done(chapter_id, store) for chapter_id in range(1, 11))
+
+
+def test_store_failure_is_reported_as_retryable(tmp_path):
+    writer = ChapterWriter(_FailingStore(str(tmp_path), {3}), batch_size=1)
+    for chapter_id in range(1, 6):
+        writer.put(_chapter(chapter_id))
+    assert _flush(writer)
+
+    errors = writer.take_errors()
+    assert [error["chapter_id"] for error in errors] == [3]
+    assert errors[0]["retryable"] and not errors[0]["ok"]
+    assert "磁盘已满" in errors[0]["error"]
+    assert writer.take_errors() == []
+    writer.close()
+    assert writer.stats()["written"] == 4
+
+
+def test_manifest_failure_does_not_wedge_writer(tmp_path):
+    store = FileChapterStore(str(tmp_path))
+    writer = ChapterWriter(store, _FailingManifest(str(tmp_path), {2}), queue_size=2, batch_size=1)
+    for chapter_id in range(1, 4):
+        writer.put(_chapter(chapter_id))
+    assert _flush(writer)
+
+    errors = writer.take_errors()
+    assert [error["chapter_id"] for error in errors] == [2]
+    assert errors[0]["retryable"]
+
+    # 出错之后写入线程仍在工作：队列满时 put() 不会永久阻塞
+    for chapter_id in range(4, 10):
+        writer.put(_chapter(chapter_id))
+    writer.close()
+    assert writer.stats()["written"] == 8
@@ -0,0 +1,33 @@
+# test_config.py - 设置文件读取测试
+import json
+
+from chapter_store import STORE_KINDS
+from config import ConfigManager
+from page_parser import PageParser
+
+
+def test_settings_choices_match_backends():
+    assert ConfigManager.SETTINGS_CHOICES["parser_backend"] == PageParser.BACKENDS
+    assert ConfigManager.SETTINGS_CHOICES["storage_backend"] == tuple(STORE_KINDS)
+
+
+def test_load_settings_rejects_out_of_range_values(tmp_path):
+    path = tmp_path / "settings.json"
+    path.write_text(json.dumps({
+        "download_workers": 0, "crawl_workers": 3, "host_rate": 0, "retries": 0,
+        "rate_floor": 5, "rate_ceiling": 1, "host_rate_overrides": {"a": 0, "b": 2},
+        "parser_backend": "bogus", "storage_backend": "packed", "lease_seconds": -1
+    }), encoding="utf-8")
+    config = ConfigManager()
+    assert config.load_settings(str(path))
+
+    assert config.download_workers == ConfigManager.DEFAULT_DOWNLOAD_WORKERS
+    assert config.crawl_workers == 3
+    assert config.host_rate == ConfigManager.DEFAULT_HOST_RATE
+    assert config.retries == 0
+    assert (config.rate_floor, config.rate_ceiling) == (ConfigManager.DEFAULT_RATE_FLOOR,
+                                                         ConfigManager.DEFAULT_RATE_CEILING)
+    assert config.host_rate_overrides == {"b": 2.0}
+    assert config.parser_backend == "lxml"
+    assert config.storage_backend == "packed"
+    assert config.lease_seconds == ConfigManager.DEFAULT_LEASE_SECONDS
@@ -0,0 +1,54 @@
+# test_download_queue.py - 章节请求名额加权公平分配测试
+import threading
+import time
+
+from download_queue import FairSlots
+
+
+def _contend(slots: FairSlots, weights, grants: int) -> list:
+    """各任务用一个线程不断申请名额，返回前 grants 次名额依次分配给的任务"""
+    order = []
+    # 先占住名额，等所有任务都在等待后再放开，分配顺序只取决于虚拟时间
+    slots.acquire(0, 1)
+
+    def worker(job_id, weight):
+        while True:
+            with slots.slot(job_id, weight):
+                if len(order) >= grants:
+                    break
+                order.append(job_id)
+                time.sleep(0.001)
+        slots.forget(job_id)
+
+    threads = [threading.Thread(target=worker, args=(job_id, weight), daemon=True)
+               for job_id, weight in weights.items()]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    slots.forget(0)
+    slots.release()
+    for thread in threads:
+        thread.join(10)
+        assert not thread.is_alive()
+    return order
+
+
+def test_slots_are_shared_by_weight():
+    order = _contend(FairSlots(1), {1: 3, 2: 1}, 40)
+    assert abs(order.count(1) - 30) <= 2
+    assert abs(order.count(2) - 10) <= 2
+    # 低优先级任务也按比例穿插获得名额，不会排到最后
+    assert 2 in order[:5]
+
+
+def test_new_job_is_not_starved_and_does_not_preempt():
+    slots = FairSlots(1)
+    # 大任务先独占名额很久，积累了较大的虚拟时间
+    for _ in range(50):
+        with slots.slot(1, 1):
+            pass
+
+    order = _contend(slots, {1: 1, 2: 1}, 20)
+    # 新任务从当前最小虚拟时间开始：与大任务轮流获得名额，而不是连续抢占50次
+    assert order.count(1) == order.count(2) == 10
+    assert all(previous != current for previous, current in zip(order, order[1:]))
@@ -0,0 +1,70 @@
+# test_downloader.py - 章节重试队列测试
+import downloader
+from config import ConfigManager
+from downloader import NovelDownloader
+from job_control import JobControl
+from utils import Utils
+
+
+class _ScriptedDownloader(NovelDownloader):
+    """按脚本返回章节结果，不发请求：outcomes[章节ID] 依次为每次尝试的状态码（200 表示成功）"""
+
+    def __init__(self, config, outcomes):
+        super().__init__(config, Utils())
+        self.outcomes = outcomes
+        self.requests = []
+
+    def _request_chapter(self, novel_id, chapter_id, gate=None):
+        self.requests.append(chapter_id)
+        script = self.outcomes.get(chapter_id, [200])
+        status = script.pop(0) if len(script) > 1 else script[0]
+        result = {"chapter_id": chapter_id, "ok": status == 200, "title": f"第{chapter_id}章",
+                  "content": "正文", "error": "", "retryable": status in self.RETRY_STATUS}
+        if status != 200:
+            result["error"] = f"下载失败（状态码：{status}）"
+        return result
+
+
+class _RecordingControl(JobControl):
+    """记录退避等待时长，不真正等待"""
+
+    def __init__(self):
+        super().__init__()
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append(round(seconds, 3))
+        self.checkpoint()
+
+
+def _download(tmp_path, monkeypatch, outcomes, attempts):
+    monkeypatch.setattr(downloader.random, "uniform", lambda low, high: 1.0)
+    config = ConfigManager()
+    config.set_save_path(str(tmp_path))
+    config.set_retry_options(attempts, backoff=1.0, backoff_max=2.5)
+    novel_downloader = _ScriptedDownloader(config, outcomes)
+    control = _RecordingControl()
+    summary = novel_downloader.download_novel_chapters("1", "书", 1, 0, lambda message: None, workers=1,
+                                                       control=control, chapter_ids=sorted(outcomes))
+    return novel_downloader, control, summary
+
+
+def test_transient_failures_are_retried_with_backoff(tmp_path, monkeypatch):
+    outcomes = {1: [200], 2: [503, 503, 200], 3: [503], 4: [404]}
+    novel_downloader, control, summary = _download(tmp_path, monkeypatch, outcomes, attempts=4)
+
+    # 第N轮等待 1 * 2^(N-1) 秒，不超过上限2.5秒
+    assert control.sleeps == [1.0, 2.0, 2.5]
+    # 404不重试；503的章节最多尝试4次；第2章第3次成功后不再请求
+    assert novel_downloader.requests.count(4) == 1
+    assert novel_downloader.requests.count(3) == 4
+    assert novel_downloader.requests.count(2) == 3
+    assert summary["downloaded"] == 2 and summary["retried"] == 1
+    assert [(item["chapter_id"], item["attempts"]) for item in summary["missing"]] == [(3, 4), (4, 1)]
+
+
+def test_single_attempt_disables_retry(tmp_path, monkeypatch):
+    novel_downloader, control, summary = _download(tmp_path, monkeypatch, {1: [503, 200]}, attempts=1)
+    assert control.sleeps == []
+    assert novel_downloader.requests == [1]
+    assert summary["failed"] == 1
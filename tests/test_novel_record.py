@@ -0,0 +1,48 @@
+# test_novel_record.py - 小说记录与列式小说列表测试
+import json
+
+from novel_record import NovelList, NovelRecord, to_json
+
+
+def _novels(*ids) -> NovelList:
+    return NovelList(NovelRecord(novel_id, f"书{novel_id}") for novel_id in ids)
+
+
+def test_add_dedupes_by_novelid():
+    novels = _novels(3, 1)
+    assert not novels.add(NovelRecord(3, "改名"))
+    assert novels.extend([NovelRecord(1, "书1"), NovelRecord(2, "书2")]) == [NovelRecord(2, "书2")]
+    assert list(novels.ids()) == [3, 1, 2]
+    assert novels.find(3).name == "书3"
+    assert novels.find("2") == NovelRecord(2, "书2")
+    assert novels.find(4) is None
+    assert NovelRecord(1, "任意") in novels and "1" in novels and "abc" not in novels
+
+
+def test_indexing_and_slicing():
+    novels = _novels(*range(1, 6))
+    assert novels[0] == NovelRecord(1, "书1")
+    assert novels[-1].novelid == 5
+    head = novels[1:3]
+    assert isinstance(head, NovelList)
+    assert [novel.novelid for novel in head] == [2, 3]
+    assert 4 not in head and len(novels) == 5
+
+
+def test_truncate_forgets_dropped_novels():
+    novels = _novels(*range(1, 6))
+    novels.truncate(2)
+    assert [novel.novelid for novel in novels] == [1, 2]
+    assert 3 not in novels and novels.find(5) is None
+    # 截掉的小说可重新加入
+    assert novels.add(NovelRecord(5, "书5"))
+    assert list(novels.ids()) == [1, 2, 5]
+    novels.clear()
+    assert len(novels) == 0 and not novels.find(1)
+
+
+def test_json_round_trip():
+    novels = _novels(7, 8)
+    data = json.loads(json.dumps({"novels": novels, "first": novels[0]}, default=to_json))
+    assert data["first"]["novelid"] == "7"
+    assert [NovelRecord.from_dict(item) for item in data["novels"]] == list(novels)
@@ -0,0 +1,104 @@
+# test_page_parser.py - 各解析后端输出一致性测试
+import pytest
+
+from page_parser import PageParser, compare_backends, parse_page_count
+
+BASE_URL = "https://www.jjwxc.net/search.php"
+
+SEARCH_HTML = """<?xml version="1.0" encoding="gb2312"?>
+<html><head><meta http-equiv="Content-Type" content="text/html; charset=gb2312"><title>搜索</title></head>
+<body>
+<div class="page">共 3 页 <a href="search.php?kw=x&amp;p=2">下一页</a></div>
+<div id="search_result">
+  <h3 class="title"><a href="onebook.php?novelid=101" target="_blank"> 第一本 <font color="red">书</font></a></h3>
+  <div class="info">作者：甲</div>
+  <h3 class="title red"><a href="https://www.jjwxc.net/onebook.php?novelid=102">第二本&amp;书</a></h3>
+  <h3 class="title"><span>无链接</span></h3>
+  <h3 class="subtitle"><a href="onebook.php?novelid=999">不是结果</a></h3>
+  <h3 class="title"><a name="anchor">锚点</a><a href=" onebook.php?novelid=103 ">第三本</a></h3>
+</div>
+<script>var title = "<h3 class='title'>";</script>
+</body></html>
+"""
+
+TOC_HTML = """<html><body>
+<table id="oneboolt">
+  <tr itemprop="chapter"><td>1</td><td><a itemprop="url" href="http://www.jjwxc.net/onebook.php?novelid=101&amp;chapterid=1">第1章 开始</a></td></tr>
+  <tr itemprop="chapter"><td>3</td><td><a itemprop="url" href="http://www.jjwxc.net/onebook.php?novelid=101&amp;chapterid=3"> 第3章 <span>继续</span> </a></td></tr>
+  <tr itemprop="chapter"><td>2</td><td><a itemprop="url" href="http://www.jjwxc.net/onebook.php?novelid=101&amp;chapterid=2">第2章 顺序</a></td></tr>
+  <tr itemprop="chapter"><td>4</td><td><a id="vip_4" style="cursor:pointer" rel="http://my.jjwxc.net/onebook_vip.php?novelid=101&amp;chapterid=4">第4章 VIP</a></td></tr>
+  <tr itemprop="chapter"><td>2</td><td><a href="http://www.jjwxc.net/onebook.php?novelid=101&amp;chapterid=2">重复的链接</a></td></tr>
+</table>
+<div class="recommend"><a href="http://www.jjwxc.net/onebook.php?novelid=202&amp;chapterid=9">其他小说</a></div>
+<a href="http://www.jjwxc.net/onebook.php?novelid=101">不是章节</a>
+</body></html>
+"""
+
+CHAPTER_HTML = """<html><head><style>.novelbody { color: red; }</style></head><body>
+<h2> 第3章 继续 </h2>
+<div class="noveltext novelbody" style="font-size: 16px">
+  <div style="clear:both"></div>
+  第一段&nbsp;正文<br>
+  第二段 &amp; 更多<br/>
+  <!-- 注释不计入 -->
+  <font color="#E9FAFF">隐藏字符</font>
+  <script>document.write("脚本不计入");</script>
+  <div class="readsmall">作者有话要说：<br>谢谢</div>
+  最后一段
+</div>
+</body></html>
+"""
+
+CHAPTER_WITHOUT_BODY_HTML = "<html><body><h2>第9章</h2><div class='note'>该章节已被锁定</div></body></html>"
+
+
+@pytest.fixture(params=PageParser.BACKENDS)
+def parser(request):
+    return PageParser(request.param)
+
+
+def test_search_backends_identical():
+    assert compare_backends(SEARCH_HTML, "search", BASE_URL) == []
+
+
+def test_toc_backends_identical():
+    assert compare_backends(TOC_HTML, "toc", novel_id="101") == []
+    assert compare_backends(TOC_HTML, "toc") == []
+
+
+def test_chapter_backends_identical():
+    assert compare_backends(CHAPTER_HTML, "chapter") == []
+    assert compare_backends(CHAPTER_WITHOUT_BODY_HTML, "chapter") == []
+
+
+def test_parse_search(parser):
+    results, pages = parser.parse_search(SEARCH_HTML, BASE_URL)
+    assert results == [
+        ("第一本书", "https://www.jjwxc.net/onebook.php?novelid=101"),
+        ("第二本&书", "https://www.jjwxc.net/onebook.php?novelid=102"),
+        ("第三本", "https://www.jjwxc.net/onebook.php?novelid=103"),
+    ]
+    assert pages == 3
+
+
+def test_parse_toc(parser):
+    assert parser.parse_toc(TOC_HTML, "101") == [
+        (1, "第1章 开始"), (2, "第2章 顺序"), (3, "第3章继续"), (4, "第4章 VIP")
+    ]
+    assert (9, "其他小说") in parser.parse_toc(TOC_HTML)
+
+
+def test_parse_chapter(parser):
+    title, content = parser.parse_chapter(CHAPTER_HTML)
+    assert title == "第3章 继续"
+    assert content.split("\n") == [
+        "第一段\xa0正文", "第二段 & 更多", "隐藏字符", "作者有话要说：", "谢谢", "最后一段"
+    ]
+    assert parser.parse_chapter(CHAPTER_WITHOUT_BODY_HTML) is None
+
+
+def test_parse_page_count():
+    assert parse_page_count("<div>共<b>12</b>页</div>", 25) == 12
+    assert parse_page_count("<div>共找到 51 条结果</div>", 25) == 3
+    assert parse_page_count('<a href="search.php?kw=x&amp;p=7">7</a>', 25) == 7
+    assert parse_page_count("<div>没有结果</div>", 25) == 0
@@ -0,0 +1,81 @@
+# test_work_queue.py - 工作队列租约与完成状态测试
+import time
+
+import pytest
+
+from novel_record import NovelRecord
+from work_queue import WorkQueue
+
+LEASE = 0.2
+
+
+@pytest.fixture
+def queue(tmp_path):
+    work_queue = WorkQueue(str(tmp_path), lease_seconds=LEASE, max_attempts=2)
+    yield work_queue
+    work_queue.close()
+
+
+def _plan(queue: WorkQueue, chapter_ids) -> None:
+    queue.enqueue(NovelRecord(1, "书"))
+    novel = queue.claim_novel("planner")
+    assert novel["novelid"] == "1"
+    assert queue.plan_novel("1", "planner", list(chapter_ids))
+
+
+def _novel_state(queue: WorkQueue) -> str:
+    return queue.status()["novels"][0]["state"]
+
+
+def test_chapters_are_claimed_in_contiguous_batches(queue):
+    _plan(queue, range(1, 8))
+    first = queue.claim_chapters("a", 3)
+    second = queue.claim_chapters("b", 3)
+    assert first["chapter_ids"] == [1, 2, 3]
+    assert second["chapter_ids"] == [4, 5, 6]
+
+    assert not queue.complete_chapters("1", "a", [1, 2, 3])
+    assert queue.claim_chapters("a", 3)["chapter_ids"] == [7]
+    assert not queue.complete_chapters("1", "a", [7])
+    # 只有完成最后一批的进程得到True
+    assert queue.complete_chapters("1", "b", [4, 5], {6: "目录中无此章节"})
+    assert _novel_state(queue) == WorkQueue.NOVEL_DONE
+    assert [(f["chapter_id"], f["error"]) for f in queue.failures("1")] == [(6, "目录中无此章节")]
+
+
+def test_expired_lease_is_reclaimed_and_stale_results_are_ignored(queue):
+    _plan(queue, range(1, 4))
+    assert queue.claim_chapters("crashed", 10)["chapter_ids"] == [1, 2, 3]
+    assert queue.claim_chapters("other", 10) is None
+
+    time.sleep(LEASE * 2)
+    assert queue.claim_chapters("other", 10)["chapter_ids"] == [1, 2, 3]
+    # 原持有者的租约已被接手，它提交的结果不生效
+    assert not queue.complete_chapters("1", "crashed", [1, 2, 3])
+    assert queue.complete_chapters("1", "other", [1, 2, 3])
+
+
+def test_heartbeat_keeps_lease(queue):
+    _plan(queue, range(1, 3))
+    queue.register_worker("a")
+    assert queue.claim_chapters("a", 10)["chapter_ids"] == [1, 2]
+    for _ in range(4):
+        time.sleep(LEASE / 2)
+        queue.heartbeat("a")
+    assert queue.claim_chapters("b", 10) is None
+
+
+def test_novel_finishes_when_last_leases_expire(queue):
+    _plan(queue, range(1, 3))
+    for worker_id in ("a", "b"):
+        assert queue.claim_chapters(worker_id, 10)["chapter_ids"] == [1, 2]
+        time.sleep(LEASE * 2)
+
+    # 两次租约都过期（达到尝试上限）：章节标记为失败，整本书转为完成并交给领取方收尾
+    assert queue.claim_chapters("c", 10) is None
+    assert _novel_state(queue) == WorkQueue.NOVEL_DONE
+    assert [failure["error"] for failure in queue.failures("1")] == ["租约多次过期"] * 2
+    finished = queue.take_finished()
+    assert [novel["novelid"] for novel in finished] == ["1"]
+    assert queue.take_finished() == []
+    assert queue.pending() == 0
@@ -1,8 +1,10 @@
 # utils.py - 工具函数类
 import re
-import tkinter as tk
-from tkinter import scrolledtext, messagebox
-from typing import Optional
+from typing import Any, Optional
+
+# 日志输出目标：日志泵（有 post 方法，见 log_pump.LogPump）、Tk文本控件（有 insert/see 方法，仅限主线程）
+# 或接收日志字符串的回调函数
+LogTarget = Any
 
 
 class Utils:
@@ -19,14 +21,13 @@ class Utils:
 
     @staticmethod
     def encode_keyword(keyword: str) -> str:
-        """GB2312编码"""
+        """GB2312编码（无法编码时抛出 ValueError）"""
         try:
             gb2312_bytes = keyword.encode('gb2312')
-            encoded_parts = [f"%{b:02X}" for b in gb2312_bytes]
-            return ''.join(encoded_parts)
-        except Exception as e:
-            messagebox.showerror("编码错误", f"关键词编码失败：{str(e)}")
-            return ""
+        except UnicodeEncodeError as e:
+            raise ValueError(f"关键词编码失败：{str(e)}") from e
+        encoded_parts = [f"%{b:02X}" for b in gb2312_bytes]
+        return ''.join(encoded_parts)
 
     @staticmethod
     def safe_filename(filename: str) -> str:
@@ -34,12 +35,19 @@ class Utils:
         return re.sub(r'[\\/:*?"<>|]', '_', filename)
 
     @staticmethod
-    def log_message(message: str, config, log_widget: Optional[scrolledtext.ScrolledText] = None) -> None:
-        """记录日志消息"""
+    def log_message(message: str, config, log_widget: Optional[LogTarget] = None,
+                    low_priority: bool = False) -> None:
+        """记录日志消息（low_priority 的消息在界面日志积压时可被丢弃）"""
         config.global_log.append(message)
-        if log_widget:
-            log_widget.insert(tk.END, message + "\n")
-            log_widget.see(tk.END)
+        if log_widget is None:
+            return
+        if hasattr(log_widget, "post"):
+            log_widget.post(message, low_priority)
+        elif hasattr(log_widget, "insert"):
+            log_widget.insert("end", message + "\n")
+            log_widget.see("end")
+        else:
+            log_widget(message)
 
     @staticmethod
     def center_window(window) -> None:
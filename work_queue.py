@@ -0,0 +1,549 @@
+# work_queue.py - 多进程共享的下载任务队列（SQLite）
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+from chapter_store import open_store
+from downloader import NovelDownloader
+from exporter import BookExporter
+from job_control import JobCancelled, JobControl
+from novel_record import NovelRecord
+from utils import LogTarget
+
+
+class WorkQueue:
+    """磁盘上的下载任务队列（SQLite，可被同一台机器上的多个进程共用）
+
+    每本小说是一个任务：先由某个工作进程领取并读取目录，拆分为逐章的工作项，之后各工作进程
+    按批领取同一本书中连续的若干章。领取时加租约（lease_until），工作进程定期发送心跳延长租约；
+    进程崩溃后租约过期，其工作项可被其他进程重新领取，过期次数达到上限的工作项标记为失败。
+    领取在 BEGIN IMMEDIATE 事务中进行，同一工作项不会被两个进程同时领取。
+    """
+
+    DB_NAME = "queue.db"
+
+    # 小说任务状态
+    NOVEL_QUEUED = "queued"  # 等待读取目录
+    NOVEL_PLANNING = "planning"  # 已被领取，正在读取目录
+    NOVEL_RUNNING = "running"  # 已拆分为章节工作项
+    NOVEL_DONE = "done"  # 全部章节已完成（可能有失败章节）
+    NOVEL_FAILED = "failed"  # 目录读取多次失败
+
+    # 章节工作项状态
+    CHAPTER_QUEUED = "queued"
+    CHAPTER_LEASED = "leased"
+    CHAPTER_DONE = "done"
+    CHAPTER_FAILED = "failed"
+
+    NOVEL_FIELDS = ("novelid", "name", "start_chapter", "end_chapter", "export_format", "priority", "state",
+                    "owner", "lease_until", "attempts", "error", "planned", "enqueued_at", "updated_at")
+    WORKER_FIELDS = ("worker_id", "host", "pid", "started_at", "heartbeat_at", "state",
+                     "downloaded", "failed", "current")
+
+    def __init__(self, queue_dir: str, lease_seconds: float = 60.0, max_attempts: int = 3):
+        os.makedirs(queue_dir, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._finished: List[Dict] = []
+        self._committed_finished: List[Dict] = []
+        # 自动提交模式，事务由 _transaction 显式开启
+        self._conn = sqlite3.connect(os.path.join(queue_dir, self.DB_NAME), timeout=30,
+                                     isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._transaction():
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS novels ("
+                " novelid TEXT PRIMARY KEY, name TEXT, start_chapter INTEGER, end_chapter INTEGER,"
+                " export_format TEXT, priority INTEGER, state TEXT, owner TEXT, lease_until REAL,"
+                " attempts INTEGER, error TEXT, planned INTEGER, enqueued_at REAL, updated_at REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chapters ("
+                " novelid TEXT, chapter_id INTEGER, state TEXT, owner TEXT, lease_until REAL,"
+                " attempts INTEGER, error TEXT, updated_at REAL, PRIMARY KEY (novelid, chapter_id))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS chapters_state ON chapters (state, lease_until)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS workers ("
+                " worker_id TEXT PRIMARY KEY, host TEXT, pid INTEGER, started_at REAL, heartbeat_at REAL,"
+                " state TEXT, downloaded INTEGER, failed INTEGER, current TEXT)"
+            )
+
+    @contextmanager
+    def _transaction(self):
+        """写事务（BEGIN IMMEDIATE：开始时即取得写锁，其他进程的写事务等待）"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                self._committed_finished = []
+                raise
+            self._conn.execute("COMMIT")
+            # 事务提交后，其中完成的小说才交给 take_finished()
+            self._finished.extend(self._committed_finished)
+            self._committed_finished = []
+
+    def _query(self, sql: str, params: Iterable = ()) -> List:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchall()
+
+    def enqueue(self, novel: NovelRecord, start_chapter: int = 1, end_chapter: int = 0,
+                priority: int = 5, export_format: str = "") -> bool:
+        """加入队列；已完成或失败的任务重新排队（已下载的章节会跳过），
+        仍在进行中的任务保持不变，返回是否已排队"""
+        novel_id = str(novel.novelid)
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT state FROM novels WHERE novelid = ?", (novel_id,)).fetchone()
+            if row is not None and row[0] not in (self.NOVEL_DONE, self.NOVEL_FAILED):
+                return False
+            conn.execute("DELETE FROM chapters WHERE novelid = ?", (novel_id,))
+            conn.execute(
+                f"INSERT OR REPLACE INTO novels ({', '.join(self.NOVEL_FIELDS)})"
+                f" VALUES ({', '.join('?' * len(self.NOVEL_FIELDS))})",
+                (novel_id, novel.name, max(1, start_chapter), end_chapter, export_format,
+                 priority, self.NOVEL_QUEUED, None, 0.0, 0, "", 0, now, now)
+            )
+        return True
+
+    def remove(self, novel_id: str) -> bool:
+        """从队列中移除小说及其章节工作项（正在下载的进程写完当前批次后不再领取）"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM chapters WHERE novelid = ?", (novel_id,))
+            cursor = conn.execute("DELETE FROM novels WHERE novelid = ?", (novel_id,))
+        return cursor.rowcount > 0
+
+    def _expire(self, conn, now: float) -> None:
+        """租约过期且已达尝试上限的工作项标记为失败（需在事务中）；
+        因此全部章节都已结束的小说转为完成，交给 take_finished() 的调用者收尾"""
+        conn.execute(
+            "UPDATE novels SET state = ?, owner = NULL, error = ?, updated_at = ?"
+            " WHERE state = ? AND lease_until < ? AND attempts >= ?",
+            (self.NOVEL_FAILED, "租约多次过期", now, self.NOVEL_PLANNING, now, self.max_attempts)
+        )
+        expired = "state = ? AND lease_until < ? AND attempts >= ?"
+        params = (self.CHAPTER_LEASED, now, self.max_attempts)
+        novel_ids = [row[0] for row in conn.execute(f"SELECT DISTINCT novelid FROM chapters WHERE {expired}", params)]
+        if not novel_ids:
+            return
+        conn.execute(
+            f"UPDATE chapters SET state = ?, owner = NULL, error = ?, updated_at = ? WHERE {expired}",
+            (self.CHAPTER_FAILED, "租约多次过期", now) + params
+        )
+        for novel_id in novel_ids:
+            if self._mark_done(conn, novel_id, now):
+                self._committed_finished.append(dict(zip(self.NOVEL_FIELDS, conn.execute(
+                    f"SELECT {', '.join(self.NOVEL_FIELDS)} FROM novels WHERE novelid = ?", (novel_id,)
+                ).fetchone())))
+
+    def _mark_done(self, conn, novel_id: str, now: float) -> bool:
+        """没有等待或正在下载的章节时把小说标记为完成（需在事务中），返回是否由本次调用完成"""
+        cursor = conn.execute(
+            "UPDATE novels SET state = ?, updated_at = ? WHERE novelid = ? AND state = ?"
+            " AND NOT EXISTS (SELECT 1 FROM chapters WHERE novelid = ? AND state IN (?, ?))",
+            (self.NOVEL_DONE, now, novel_id, self.NOVEL_RUNNING, novel_id, self.CHAPTER_QUEUED, self.CHAPTER_LEASED)
+        )
+        return cursor.rowcount > 0
+
+    def take_finished(self) -> List[Dict]:
+        """取回因章节租约过期而完成的小说（需由调用者收尾：记录结果、导出）"""
+        with self._lock:
+            finished, self._finished = self._finished, []
+        return finished
+
+    def claim_novel(self, worker_id: str) -> Optional[Dict]:
+        """领取一本等待读取目录的小说（包括租约已过期的），没有时返回None"""
+        now = time.time()
+        with self._transaction() as conn:
+            self._expire(conn, now)
+            row = conn.execute(
+                f"SELECT {', '.join(self.NOVEL_FIELDS)} FROM novels"
+                " WHERE state = ? OR (state = ? AND lease_until < ?)"
+                " ORDER BY priority DESC, enqueued_at LIMIT 1",
+                (self.NOVEL_QUEUED, self.NOVEL_PLANNING, now)
+            ).fetchone()
+            if row is None:
+                return None
+            novel = dict(zip(self.NOVEL_FIELDS, row))
+            conn.execute(
+                "UPDATE novels SET state = ?, owner = ?, lease_until = ?, attempts = attempts + 1, updated_at = ?"
+                " WHERE novelid = ?",
+                (self.NOVEL_PLANNING, worker_id, now + self.lease_seconds, now, novel["novelid"])
+            )
+        return novel
+
+    def plan_novel(self, novel_id: str, worker_id: str, chapter_ids: List[int], skipped: int = 0) -> bool:
+        """登记小说的章节工作项（skipped 为已下载而跳过的章节数），没有需要下载的章节时直接完成；
+        租约已被其他进程接手时不做修改，返回是否已登记"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT owner, state FROM novels WHERE novelid = ?", (novel_id,)).fetchone()
+            if row is None or row[0] != worker_id or row[1] != self.NOVEL_PLANNING:
+                return False
+            conn.executemany(
+                "INSERT OR IGNORE INTO chapters (novelid, chapter_id, state, owner, lease_until, attempts, error,"
+                " updated_at) VALUES (?, ?, ?, NULL, 0, 0, '', ?)",
+                [(novel_id, chapter_id, self.CHAPTER_QUEUED, now) for chapter_id in chapter_ids]
+            )
+            conn.execute(
+                "UPDATE novels SET state = ?, owner = NULL, lease_until = 0, error = '', planned = ?, updated_at = ?"
+                " WHERE novelid = ?",
+                (self.NOVEL_RUNNING if chapter_ids else self.NOVEL_DONE, len(chapter_ids) + skipped, now, novel_id)
+            )
+        return True
+
+    def release_novel(self, novel_id: str, worker_id: str, error: str) -> None:
+        """读取目录失败：未达尝试上限时重新排队，否则标记为失败"""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE novels SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END,"
+                " owner = NULL, lease_until = 0, error = ?, updated_at = ? WHERE novelid = ? AND owner = ?",
+                (self.max_attempts, self.NOVEL_FAILED, self.NOVEL_QUEUED, error, time.time(), novel_id, worker_id)
+            )
+
+    def claim_chapters(self, worker_id: str, limit: int) -> Optional[Dict]:
+        """领取一批章节：优先级最高的小说中从第一个可领取章节起连续的最多 limit 章（中间不夹杂其他进程
+        正在下载或已完成的章节，便于按章节范围下载），返回 {"novel": 小说任务, "chapter_ids": [...]}，没有时返回None"""
+        now = time.time()
+        claimable = "(c.state = ? OR (c.state = ? AND c.lease_until < ?))"
+        with self._transaction() as conn:
+            self._expire(conn, now)
+            row = conn.execute(
+                f"SELECT c.novelid, c.chapter_id FROM chapters c JOIN novels n ON n.novelid = c.novelid"
+                f" WHERE n.state = ? AND {claimable}"
+                f" ORDER BY n.priority DESC, n.enqueued_at, c.chapter_id LIMIT 1",
+                (self.NOVEL_RUNNING, self.CHAPTER_QUEUED, self.CHAPTER_LEASED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            novel_id, first_id = row
+            rows = conn.execute(
+                f"SELECT c.chapter_id, {claimable} FROM chapters c"
+                f" WHERE c.novelid = ? AND c.chapter_id >= ? ORDER BY c.chapter_id LIMIT ?",
+                (self.CHAPTER_QUEUED, self.CHAPTER_LEASED, now, novel_id, first_id, limit)
+            ).fetchall()
+            chapter_ids = []
+            for chapter_id, available in rows:
+                if not available:
+                    break
+                chapter_ids.append(chapter_id)
+            conn.executemany(
+                "UPDATE chapters SET state = ?, owner = ?, lease_until = ?, attempts = attempts + 1, updated_at = ?"
+                " WHERE novelid = ? AND chapter_id = ?",
+                [(self.CHAPTER_LEASED, worker_id, now + self.lease_seconds, now, novel_id, chapter_id)
+                 for chapter_id in chapter_ids]
+            )
+            novel = dict(zip(self.NOVEL_FIELDS, conn.execute(
+                f"SELECT {', '.join(self.NOVEL_FIELDS)} FROM novels WHERE novelid = ?", (novel_id,)
+            ).fetchone()))
+        return {"novel": novel, "chapter_ids": chapter_ids}
+
+    def complete_chapters(self, novel_id: str, worker_id: str, done: Iterable[int],
+                          failed: Optional[Dict[int, str]] = None) -> bool:
+        """提交一批章节的结果（只更新仍由该进程持有租约的章节）；
+        本次提交使整本书完成时返回True（每本书只有一个进程会得到True，由它负责导出等收尾）"""
+        now = time.time()
+        failed = failed or {}
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE chapters SET state = ?, owner = NULL, error = '', updated_at = ?"
+                " WHERE novelid = ? AND chapter_id = ? AND owner = ? AND state = ?",
+                [(self.CHAPTER_DONE, now, novel_id, chapter_id, worker_id, self.CHAPTER_LEASED) for chapter_id in done]
+            )
+            conn.executemany(
+                "UPDATE chapters SET state = ?, owner = NULL, error = ?, updated_at = ?"
+                " WHERE novelid = ? AND chapter_id = ? AND owner = ? AND state = ?",
+                [(self.CHAPTER_FAILED, error, now, novel_id, chapter_id, worker_id, self.CHAPTER_LEASED)
+                 for chapter_id, error in failed.items()]
+            )
+            return self._mark_done(conn, novel_id, now)
+
+    def release(self, worker_id: str) -> int:
+        """归还该进程持有的全部工作项（取消或退出时），不计入尝试次数，返回归还的章节数"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE novels SET state = ?, owner = NULL, lease_until = 0, attempts = MAX(attempts - 1, 0),"
+                " updated_at = ? WHERE owner = ? AND state = ?",
+                (self.NOVEL_QUEUED, now, worker_id, self.NOVEL_PLANNING)
+            )
+            cursor = conn.execute(
+                "UPDATE chapters SET state = ?, owner = NULL, lease_until = 0, attempts = MAX(attempts - 1, 0),"
+                " updated_at = ? WHERE owner = ? AND state = ?",
+                (self.CHAPTER_QUEUED, now, worker_id, self.CHAPTER_LEASED)
+            )
+        return cursor.rowcount
+
+    def retry_failed(self, novel_id: Optional[str] = None) -> int:
+        """失败的章节重新排队（尝试次数清零），返回重新排队的章节数"""
+        now = time.time()
+        scope, params = ("", ()) if novel_id is None else (" AND novelid = ?", (novel_id,))
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE chapters SET state = ?, attempts = 0, error = '', updated_at = ? WHERE state = ?{scope}",
+                (self.CHAPTER_QUEUED, now, self.CHAPTER_FAILED) + params
+            )
+            conn.execute(
+                f"UPDATE novels SET state = ?, updated_at = ? WHERE state = ?"
+                f" AND EXISTS (SELECT 1 FROM chapters c WHERE c.novelid = novels.novelid AND c.state = ?){scope}",
+                (self.NOVEL_RUNNING, now, self.NOVEL_DONE, self.CHAPTER_QUEUED) + params
+            )
+            conn.execute(
+                f"UPDATE novels SET state = ?, attempts = 0, error = '', updated_at = ? WHERE state = ?{scope}",
+                (self.NOVEL_QUEUED, now, self.NOVEL_FAILED) + params
+            )
+        return cursor.rowcount
+
+    def register_worker(self, worker_id: str) -> None:
+        """登记工作进程"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO workers ({', '.join(self.WORKER_FIELDS)})"
+                f" VALUES ({', '.join('?' * len(self.WORKER_FIELDS))})",
+                (worker_id, socket.gethostname(), os.getpid(), now, now, "running", 0, 0, "")
+            )
+
+    def heartbeat(self, worker_id: str, state: Optional[str] = None, current: Optional[str] = None,
+                  downloaded: int = 0, failed: int = 0) -> int:
+        """心跳：延长该进程持有的全部租约并更新进程状态（downloaded / failed 为增量），返回持有的章节数"""
+        now = time.time()
+        lease_until = now + self.lease_seconds
+        with self._transaction() as conn:
+            conn.execute("UPDATE novels SET lease_until = ? WHERE owner = ? AND state = ?",
+                         (lease_until, worker_id, self.NOVEL_PLANNING))
+            cursor = conn.execute("UPDATE chapters SET lease_until = ? WHERE owner = ? AND state = ?",
+                                  (lease_until, worker_id, self.CHAPTER_LEASED))
+            conn.execute(
+                "UPDATE workers SET heartbeat_at = ?, state = COALESCE(?, state), current = COALESCE(?, current),"
+                " downloaded = downloaded + ?, failed = failed + ? WHERE worker_id = ?",
+                (now, state, current, downloaded, failed, worker_id)
+            )
+        return cursor.rowcount
+
+    def pending(self) -> int:
+        """尚未完成的工作项数（等待读取目录的小说与未完成的章节）"""
+        rows = self._query(
+            "SELECT (SELECT COUNT(*) FROM novels WHERE state IN (?, ?))"
+            " + (SELECT COUNT(*) FROM chapters WHERE state IN (?, ?))",
+            (self.NOVEL_QUEUED, self.NOVEL_PLANNING, self.CHAPTER_QUEUED, self.CHAPTER_LEASED)
+        )
+        return rows[0][0]
+
+    def failures(self, novel_id: str) -> List[Dict]:
+        """小说中失败的章节及原因"""
+        rows = self._query("SELECT chapter_id, error, attempts FROM chapters WHERE novelid = ? AND state = ?"
+                           " ORDER BY chapter_id", (novel_id, self.CHAPTER_FAILED))
+        return [{"chapter_id": chapter_id, "error": error, "attempts": attempts} for chapter_id, error, attempts in rows]
+
+    def status(self) -> Dict:
+        """汇总所有工作进程的进度：各小说的章节状态计数，以及各工作进程的心跳与下载数
+        （心跳超过租约时长的进程视为已失联）"""
+        now = time.time()
+        counts: Dict[str, Dict[str, int]] = {}
+        for novel_id, state, count in self._query(
+                "SELECT novelid, state, COUNT(*) FROM chapters GROUP BY novelid, state"):
+            counts.setdefault(novel_id, {})[state] = count
+
+        novels = []
+        for row in self._query(f"SELECT {', '.join(self.NOVEL_FIELDS)} FROM novels"
+                               " ORDER BY priority DESC, enqueued_at"):
+            novel = dict(zip(self.NOVEL_FIELDS, row))
+            by_state = counts.get(novel["novelid"], {})
+            novels.append({
+                "novelid": novel["novelid"],
+                "name": novel["name"],
+                "state": novel["state"],
+                "planned": novel["planned"],
+                "queued": by_state.get(self.CHAPTER_QUEUED, 0),
+                "leased": by_state.get(self.CHAPTER_LEASED, 0),
+                "done": by_state.get(self.CHAPTER_DONE, 0),
+                "failed": by_state.get(self.CHAPTER_FAILED, 0),
+                "error": novel["error"]
+            })
+
+        workers = []
+        for row in self._query(f"SELECT {', '.join(self.WORKER_FIELDS)} FROM workers ORDER BY started_at"):
+            worker = dict(zip(self.WORKER_FIELDS, row))
+            worker["alive"] = worker["state"] != "stopped" and now - worker["heartbeat_at"] <= self.lease_seconds
+            workers.append(worker)
+
+        totals = {key: sum(novel[key] for novel in novels) for key in ("queued", "leased", "done", "failed")}
+        totals["novels"] = len(novels)
+        totals["novels_done"] = sum(1 for novel in novels if novel["state"] == self.NOVEL_DONE)
+        totals["workers_alive"] = sum(1 for worker in workers if worker["alive"])
+        return {"totals": totals, "novels": novels, "workers": workers}
+
+    def close(self) -> None:
+        """关闭数据库"""
+        with self._lock:
+            self._conn.close()
+
+
+class QueueWorker:
+    """队列工作进程：从 WorkQueue 领取任务，用 NovelDownloader 下载
+
+    循环：先领取等待读取目录的小说并拆分为章节工作项，否则领取一批连续章节，
+    以断点续传方式下载该章节范围（多个进程写入同一保存目录的不同章节），提交结果后继续领取；
+    后台心跳线程每隔租约时长的 1/3 延长租约。取消时写完当前章节，归还未完成的工作项。
+    同一进程内可运行多个 QueueWorker（各自的 worker_id 不同）。
+    """
+
+    IDLE_POLL = 2.0  # 队列暂时为空（其他进程仍在下载）时的轮询间隔（秒）
+
+    def __init__(self, config, utils, queue: WorkQueue, worker_id: str = "",
+                 log_widget: Optional[LogTarget] = None, batch_size: Optional[int] = None):
+        self.config = config
+        self.utils = utils
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self.log_widget = log_widget
+        self.batch_size = batch_size or config.queue_batch_size
+        self.downloader = NovelDownloader(config, utils)
+        self.downloaded = 0
+        self.failed = 0
+        self._reported = (0, 0)
+        self._report_lock = threading.Lock()
+        self._stop_heartbeat = threading.Event()
+
+    def _save_dir(self, novel: Dict) -> str:
+        return os.path.join(self.config.save_path, self.utils.safe_filename(novel["name"]))
+
+    def _heartbeat(self, state: Optional[str] = None, current: Optional[str] = None) -> None:
+        """发送一次心跳（附带自上次心跳以来新增的下载数）"""
+        # 心跳线程与工作线程都会发送心跳：增量的计算与提交需互斥，否则同一批下载数会被重复或遗漏上报
+        with self._report_lock:
+            downloaded, failed = self.downloaded - self._reported[0], self.failed - self._reported[1]
+            self._reported = (self.downloaded, self.failed)
+            self.queue.heartbeat(self.worker_id, state, current, downloaded, failed)
+
+    def _heartbeat_loop(self) -> None:
+        while not self._stop_heartbeat.wait(self.queue.lease_seconds / 3):
+            try:
+                self._heartbeat()
+            except sqlite3.Error:
+                pass
+
+    def run(self, control: Optional[JobControl] = None, exit_when_idle: bool = True) -> Dict:
+        """持续领取并下载，队列全部完成（exit_when_idle）或被取消时返回本进程的下载统计"""
+        control = control or JobControl()
+        self.queue.register_worker(self.worker_id)
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name=f"heartbeat-{self.worker_id}", daemon=True)
+        heartbeat.start()
+        self.utils.log_message(f"✅ 工作进程 {self.worker_id} 已启动", self.config, self.log_widget)
+        cancelled = False
+        try:
+            while True:
+                control.checkpoint()
+                for novel in self.queue.take_finished():
+                    self._finish(novel)
+                novel = self.queue.claim_novel(self.worker_id)
+                if novel is not None:
+                    self._plan(novel)
+                    continue
+                batch = self.queue.claim_chapters(self.worker_id, self.batch_size)
+                if batch is not None:
+                    self._download(batch, control)
+                    continue
+                for novel in self.queue.take_finished():
+                    self._finish(novel)
+                if exit_when_idle and self.queue.pending() == 0:
+                    break
+                self._heartbeat("idle", "")
+                control.sleep(self.IDLE_POLL)
+        except JobCancelled:
+            cancelled = True
+        finally:
+            self._stop_heartbeat.set()
+            heartbeat.join()
+            released = self.queue.release(self.worker_id)
+            self._heartbeat("stopped", "")
+            if released:
+                self.utils.log_message(f"⚠️ 已归还{released}个未完成的章节", self.config, self.log_widget)
+        self.utils.log_message(f"工作进程 {self.worker_id} 结束：下载{self.downloaded}章，失败{self.failed}章",
+                               self.config, self.log_widget)
+        return {"worker_id": self.worker_id, "downloaded": self.downloaded, "failed": self.failed,
+                "cancelled": cancelled}
+
+    def _plan(self, novel: Dict) -> None:
+        """读取目录，把范围内尚未下载的章节登记为工作项"""
+        novel_id = novel["novelid"]
+        self._heartbeat("planning", novel_id)
+        index = self.downloader.fetch_chapter_index(novel_id)
+        if index:
+            chapter_ids = [item["chapter_id"] for item in index]
+        elif novel["end_chapter"] > 0:
+            chapter_ids = list(range(novel["start_chapter"], novel["end_chapter"] + 1))
+        else:
+            self.queue.release_novel(novel_id, self.worker_id, "目录读取失败")
+            self.utils.log_message(f"⚠️ 《{novel['name']}》目录读取失败，稍后重试", self.config, self.log_widget)
+            return
+        chapter_ids = [cid for cid in chapter_ids if cid >= novel["start_chapter"]
+                       and (novel["end_chapter"] <= 0 or cid <= novel["end_chapter"])]
+
+        save_dir = self._save_dir(novel)
+        store = open_store(self.config.storage_backend, save_dir)
+        try:
+            stored = set(store.chapter_ids())
+        finally:
+            store.close()
+        pending = [cid for cid in chapter_ids if cid not in stored]
+        if self.queue.plan_novel(novel_id, self.worker_id, pending, len(chapter_ids) - len(pending)):
+            self.utils.log_message(f"➕ 《{novel['name']}》已拆分为{len(pending)}个章节工作项"
+                                   f"（已下载{len(chapter_ids) - len(pending)}章）", self.config, self.log_widget)
+            if not pending:
+                self._finish(novel)
+
+    def _download(self, batch: Dict, control: JobControl) -> None:
+        """下载领取的章节范围并提交结果；未完成的章节（取消时）归还队列"""
+        novel, chapter_ids = batch["novel"], batch["chapter_ids"]
+        novel_id = novel["novelid"]
+        self._heartbeat("downloading", f"{novel_id}:{chapter_ids[0]}-{chapter_ids[-1]}")
+        # 章节已在拆分时按目录确定，不再为每批重新读取目录页
+        summary = self.downloader.download_novel_chapters(
+            novel_id, novel["name"], chapter_ids[0], chapter_ids[-1], self.log_widget,
+            resume=True, control=control, chapter_ids=chapter_ids
+        )
+
+        # 以存储本身判断哪些章节已落盘（写入是原子的，断点续传跳过的章节同样算完成）；
+        # 不读回清单：同一本书的多个工作进程并发保存清单时，清单中的记录可能互相覆盖
+        store = open_store(self.config.storage_backend, summary["save_dir"])
+        try:
+            stored = set(store.chapter_ids())
+        finally:
+            store.close()
+        done = [cid for cid in chapter_ids if cid in stored]
+        errors = {item["chapter_id"]: item["error"] for item in summary["missing"]}
+        failed = {cid: errors.get(cid, "未能写入") for cid in chapter_ids
+                  if cid not in stored and (cid in errors or not summary["cancelled"])}
+
+        self.downloaded += summary["downloaded"]
+        self.failed += len(failed)
+        finished = self.queue.complete_chapters(novel_id, self.worker_id, done, failed)
+        if summary["cancelled"]:
+            raise JobCancelled()
+        if finished:
+            self._finish(novel)
+
+    def _finish(self, novel: Dict) -> None:
+        """整本书的全部工作项已完成：记录结果，按需导出"""
+        failures = self.queue.failures(novel["novelid"])
+        if failures:
+            self.utils.log_message(f"⚠️ 《{novel['name']}》队列任务完成，{len(failures)}章失败",
+                                   self.config, self.log_widget)
+        else:
+            self.utils.log_message(f"✅ 《{novel['name']}》队列任务完成", self.config, self.log_widget)
+        if novel["export_format"]:
+            exporter = BookExporter(self._save_dir(novel), self.utils.safe_filename(novel["name"]),
+                                    novel["novelid"], store_kind=self.config.storage_backend)
+            result = exporter.export(novel["export_format"])
+            self.utils.log_message(f"✅ 《{novel['name']}》已导出{novel['export_format'].upper()}：{result['path']}",
+                                   self.config, self.log_widget)